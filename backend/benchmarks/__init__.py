@@ -0,0 +1,14 @@
+"""
+負荷・同時実行ベンチマーク
+
+    python -m benchmarks datagen --products 500 --users 200 --ledger-rows 1000000
+    python -m benchmarks storm --threads 16 --stock 500 --attempts 1000
+    python -m benchmarks import --rows 10000 --rows 100000
+    python -m benchmarks compare results/a.json results/b.json
+
+DB は config.settings と同じ PostgreSQL（POSTGRES_* 環境変数）を使う。
+BENCH_SQLITE=/tmp/bench.sqlite3 を付けると SQLite で動かす（マイグレーションは datagen が行う）。
+結果は benchmarks/results/ に git のコミットハッシュ付きの JSON で保存する。
+
+HTTP 経由の計測は benchmarks/http_bench.py（Django 不要）。
+"""
@@ -0,0 +1,116 @@
+"""
+python -m benchmarks <datagen|storm|import|startup|compare> ...（backend/ で実行）
+"""
+import argparse
+import json
+import os
+import sys
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    datagen = sub.add_parser("datagen", help="合成データ（利用者・商品・取引履歴）を作る")
+    datagen.add_argument("--users", type=int, default=200)
+    datagen.add_argument("--products", type=int, default=500)
+    datagen.add_argument("--ledger-rows", type=int, default=100_000)
+    datagen.add_argument("--days", type=int, default=365, help="取引履歴を何日分に散らすか")
+    datagen.add_argument("--batch-size", type=int, default=5000)
+    datagen.add_argument("--seed", type=int, default=0)
+
+    storm = sub.add_parser("storm", help="1商品への購入集中")
+    storm.add_argument("--threads", type=int, default=16)
+    storm.add_argument("--stock", type=int, default=500, help="開始時の在庫数")
+    storm.add_argument("--attempts", type=int, default=1000, help="購入の試行回数（在庫数より多くする）")
+    storm.add_argument("--url", help="指定すると HTTP (POST /api/purchases) で購入する")
+
+    importer = sub.add_parser("import", help="CSV一括入荷")
+    importer.add_argument("--rows", type=int, action="append", help="CSV の行数（複数指定可）")
+    importer.add_argument("--dry-run", action="store_true")
+    importer.add_argument("--merge", action="store_true")
+    importer.add_argument("--keep", action="store_true", help="取り込んだ入荷を残す（既定はロールバック）")
+
+    startup = sub.add_parser("startup", help="起動時間とメモリ（設定ごとに別プロセスで計測）")
+    startup.add_argument(
+        "--settings", action="append",
+        help="DJANGO_SETTINGS_MODULE（複数指定可。既定は config.settings と config.settings_kiosk）",
+    )
+    startup.add_argument("--runs", type=int, default=5)
+
+    for command in (datagen, storm, importer, startup):
+        command.add_argument("--output", help="結果 JSON の保存先（既定は benchmarks/results/）")
+
+    compare = sub.add_parser("compare", help="結果 JSON を並べて表示する")
+    compare.add_argument("paths", nargs="+")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "compare":
+        from benchmarks.results import compare as compare_results
+
+        print(compare_results(args.paths))
+        return
+
+    _setup_django()
+    from benchmarks import results
+
+    if args.command == "datagen":
+        from benchmarks.datagen import generate
+
+        result = generate(
+            users=args.users,
+            products=args.products,
+            ledger_rows=args.ledger_rows,
+            days=args.days,
+            batch_size=args.batch_size,
+            seed=args.seed,
+            log=_log,
+        )
+    elif args.command == "storm":
+        from benchmarks.storm import purchase_storm
+
+        result = purchase_storm(threads=args.threads, stock=args.stock, attempts=args.attempts, url=args.url)
+    elif args.command == "startup":
+        from benchmarks.startup import DEFAULT_SETTINGS, startup_benchmark
+
+        result = startup_benchmark(settings_modules=args.settings or DEFAULT_SETTINGS, runs=args.runs, log=_log)
+    else:
+        from benchmarks.import_bench import import_benchmark
+
+        result = import_benchmark(
+            rows_list=args.rows or [10_000],
+            dry_run=args.dry_run,
+            merge=args.merge,
+            keep=args.keep,
+            log=_log,
+        )
+
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    path = results.save(args.command, result, args.output)
+    _log(f"saved: {path}")
+
+    if args.command == "storm" and (result["oversold"] or not result["balance_consistent"]):
+        sys.exit(1)
+
+
+def _setup_django():
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "benchmarks.settings")
+    import django
+
+    django.setup()
+
+    from django.conf import settings
+
+    if getattr(settings, "BENCH_SQLITE", None):
+        from django.core.management import call_command
+
+        call_command("migrate", verbosity=0)
+
+
+def _log(message):
+    print(message, file=sys.stderr, flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+ベンチマーク用の合成データ（利用者・商品・取引履歴）
+
+利用者は student_id が "bench-u"、商品は jan_code が "99" で始まるものを作る。
+何度実行しても利用者・商品は増えない（取引履歴は実行するたびに追加される）。
+"""
+import datetime
+import random
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.utils import timezone
+
+from store.models import Product, StockTransaction, User
+from store.services.stock import apply_deltas
+
+USER_PREFIX = "bench-u"
+JAN_PREFIX = "99"
+RESTOCK_RATIO = 0.1  # 取引のうち入荷の割合（残りは1点購入）
+
+
+def bench_jan_code(index: int) -> str:
+    return f"{JAN_PREFIX}{index:011d}"
+
+
+def bench_users():
+    return User.objects.filter(student_id__startswith=USER_PREFIX)
+
+
+def bench_products():
+    return Product.objects.filter(jan_code__startswith=JAN_PREFIX)
+
+
+def generate(*, users: int, products: int, ledger_rows: int, days: int = 365,
+             batch_size: int = 5000, seed: int = 0, log=print) -> dict:
+    rng = random.Random(seed)
+    started = time.perf_counter()
+
+    User.objects.bulk_create(
+        [User(student_id=f"{USER_PREFIX}{i:06d}", name=f"ベンチ利用者{i}") for i in range(users)],
+        ignore_conflicts=True,
+        batch_size=1000,
+    )
+    Product.objects.bulk_create(
+        [
+            Product(jan_code=bench_jan_code(i), name=f"ベンチ商品{i}", price=rng.randrange(80, 300, 10))
+            for i in range(products)
+        ],
+        ignore_conflicts=True,
+        batch_size=1000,
+    )
+    user_ids = list(bench_users().values_list("id", flat=True))
+    product_prices = dict(bench_products().values_list("id", "price"))
+    product_ids = list(product_prices)
+    log(f"users={len(user_ids)} products={len(product_ids)}")
+
+    insert_started = time.perf_counter()
+    end = timezone.now()
+    step = datetime.timedelta(days=days) / max(ledger_rows, 1)
+    created_at = end - datetime.timedelta(days=days)
+    deltas = defaultdict(int)
+    inserted = 0
+
+    with _explicit_created_at():
+        while inserted < ledger_rows:
+            batch = []
+            for _ in range(min(batch_size, ledger_rows - inserted)):
+                product_id = rng.choice(product_ids)
+                created_at += step
+                if rng.random() < RESTOCK_RATIO:
+                    quantity = rng.randint(12, 48)
+                    batch.append(
+                        StockTransaction(
+                            product_id=product_id,
+                            transaction_type="RESTOCK",
+                            delta=quantity,
+                            unit_cost=int(product_prices[product_id] * 0.7),
+                            created_at=created_at,
+                        )
+                    )
+                else:
+                    batch.append(
+                        StockTransaction(
+                            product_id=product_id,
+                            user_id=rng.choice(user_ids),
+                            transaction_type="PURCHASE",
+                            delta=-1,
+                            unit_price=product_prices[product_id],
+                            created_at=created_at,
+                        )
+                    )
+            with transaction.atomic():
+                StockTransaction.objects.bulk_create(batch, batch_size=batch_size)
+            for tx in batch:
+                deltas[tx.product_id] += tx.delta
+            inserted += len(batch)
+            log(f"ledger rows: {inserted}/{ledger_rows}")
+
+    insert_seconds = time.perf_counter() - insert_started
+    with transaction.atomic():
+        apply_deltas(deltas)
+
+    return {
+        "users": len(user_ids),
+        "products": len(product_ids),
+        "ledger_rows": inserted,
+        "insert_seconds": round(insert_seconds, 2),
+        "insert_rows_per_s": round(inserted / insert_seconds, 1) if insert_seconds else None,
+        "total_seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+@contextmanager
+def _explicit_created_at():
+    """
+    created_at は auto_now_add なので、過去の日時を入れる間だけ無効にする
+    """
+    field = StockTransaction._meta.get_field("created_at")
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
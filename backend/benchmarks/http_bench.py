@@ -0,0 +1,113 @@
+"""
+HTTP 負荷ベンチマーク（外部ライブラリ不要）
+
+起動済みのサーバーに対して、スレッドごとに keep-alive 接続を1本持って GET を投げ続け、
+スループットとレイテンシ（p50/p95/p99）を出す。
+
+    python benchmarks/http_bench.py --url http://127.0.0.1:8000 \
+        --path /api/products --path /api/stock --concurrency 16 --duration 20
+
+--slow-path を付けると、その URL を別スレッドで投げ続けながら測る
+（遅いリクエストが他のリクエストを詰まらせるかの確認用）。
+"""
+import argparse
+import http.client
+import json
+import statistics
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--path", action="append", help="対象パス（複数指定で順番に投げる）")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=20.0, help="計測秒数")
+    parser.add_argument("--warmup", type=float, default=2.0, help="計測前に捨てる秒数")
+    parser.add_argument("--slow-path", help="並行して投げ続ける遅いリクエスト")
+    parser.add_argument("--slow-concurrency", type=int, default=2)
+    args = parser.parse_args()
+
+    paths = args.path or ["/api/products"]
+    target = urlsplit(args.url)
+
+    stop = threading.Event()
+    measuring = threading.Event()
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def worker(worker_paths, record):
+        conn = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=60)
+        i = 0
+        while not stop.is_set():
+            path = worker_paths[i % len(worker_paths)]
+            i += 1
+            start = time.perf_counter()
+            try:
+                conn.request("GET", path)
+                response = conn.getresponse()
+                response.read()
+                ok = response.status < 500
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                conn = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=60)
+                ok = False
+            elapsed = time.perf_counter() - start
+            if record and measuring.is_set():
+                with lock:
+                    if ok:
+                        latencies.append(elapsed)
+                    else:
+                        errors.append(path)
+        conn.close()
+
+    threads = [threading.Thread(target=worker, args=(paths, True)) for _ in range(args.concurrency)]
+    if args.slow_path:
+        threads += [threading.Thread(target=worker, args=([args.slow_path], False)) for _ in range(args.slow_concurrency)]
+    for thread in threads:
+        thread.start()
+
+    time.sleep(args.warmup)
+    measuring.set()
+    started = time.perf_counter()
+    time.sleep(args.duration)
+    measuring.clear()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    print(json.dumps(_summary(latencies, errors, elapsed, args, paths), indent=2))
+
+
+def _summary(latencies, errors, elapsed, args, paths):
+    latencies = sorted(latencies)
+
+    def percentile(p):
+        if not latencies:
+            return None
+        return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000, 2)
+
+    return {
+        "url": args.url,
+        "paths": paths,
+        "slow_path": args.slow_path,
+        "concurrency": args.concurrency,
+        "duration_s": round(elapsed, 2),
+        "requests": len(latencies),
+        "errors": len(errors),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "latency_ms": {
+            "mean": round(statistics.fmean(latencies) * 1000, 2) if latencies else None,
+            "p50": percentile(0.50),
+            "p95": percentile(0.95),
+            "p99": percentile(0.99),
+        },
+    }
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+CSV一括入荷（restock_import）の処理時間とメモリ
+
+datagen の商品（なければ作る）に対する rows 行の CSV を作って import_restock_csv に渡す。
+既定では計測後にロールバックするので、何度実行しても DB は増えない（keep=True で残す）。
+"""
+import csv
+import io
+import random
+import resource
+import tempfile
+import time
+
+from django.db import connection, transaction
+
+from benchmarks.datagen import bench_jan_code, bench_products
+from store.models import Product
+from store.services.restock_import import import_restock_csv
+
+MIN_PRODUCTS = 100
+
+
+class _Rollback(Exception):
+    pass
+
+
+def import_benchmark(*, rows_list, dry_run: bool = False, merge: bool = False, keep: bool = False,
+                     seed: int = 0, log=print) -> dict:
+    jan_codes = _ensure_products()
+    runs = []
+    for rows in rows_list:
+        with tempfile.TemporaryFile() as fileobj:
+            _write_csv(fileobj, rows, jan_codes, random.Random(seed))
+            runs.append(_run(fileobj, rows, dry_run=dry_run, merge=merge, keep=keep))
+        log(f"{rows} rows: {runs[-1]['seconds']}s")
+    return {"dry_run": dry_run, "merge": merge, "products": len(jan_codes), "runs": runs}
+
+
+def _run(fileobj, rows: int, *, dry_run: bool, merge: bool, keep: bool) -> dict:
+    statements = [0]
+
+    def count(execute, sql, params, many, context):
+        statements[0] += 1
+        return execute(sql, params, many, context)
+
+    fileobj.seek(0)
+    rss_before = _max_rss_kb()
+    started = time.perf_counter()
+    try:
+        with connection.execute_wrapper(count), transaction.atomic():
+            result = import_restock_csv(fileobj, dry_run=dry_run, merge=merge)
+            if not keep:
+                raise _Rollback()
+    except _Rollback:
+        pass
+    elapsed = time.perf_counter() - started
+
+    return {
+        "rows": rows,
+        "status": result.status,
+        "created": result.created_count,
+        "seconds": round(elapsed, 3),
+        "rows_per_s": round(rows / elapsed, 1) if elapsed else None,
+        "statements": statements[0],
+        # プロセスの最大 RSS の増分（KB）。行数に比例して増えていないかを見る
+        "max_rss_growth_kb": _max_rss_kb() - rss_before,
+    }
+
+
+def _ensure_products():
+    jan_codes = list(bench_products().values_list("jan_code", flat=True))
+    if len(jan_codes) >= MIN_PRODUCTS:
+        return jan_codes
+    Product.objects.bulk_create(
+        [Product(jan_code=bench_jan_code(i), name=f"ベンチ商品{i}", price=100) for i in range(MIN_PRODUCTS)],
+        ignore_conflicts=True,
+    )
+    return list(bench_products().values_list("jan_code", flat=True))
+
+
+def _write_csv(fileobj, rows: int, jan_codes, rng) -> None:
+    text = io.TextIOWrapper(fileobj, encoding="utf-8", newline="")
+    writer = csv.writer(text)
+    writer.writerow(["jan_code", "quantity", "unit_cost", "name"])
+    for _ in range(rows):
+        writer.writerow([rng.choice(jan_codes), rng.randint(1, 48), rng.randrange(50, 200), ""])
+    text.flush()
+    text.detach()
+
+
+def _max_rss_kb() -> int:
+    # Linux では KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
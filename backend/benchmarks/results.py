@@ -0,0 +1,119 @@
+"""
+計測結果の集計と保存
+"""
+import datetime
+import json
+import platform
+import statistics
+import subprocess
+from pathlib import Path
+from typing import Dict, List, Optional
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+
+def latency_summary(latencies: List[float]) -> Dict[str, Optional[float]]:
+    """
+    秒のリストから mean/p50/p95/p99/max（ミリ秒）を返す
+    """
+    if not latencies:
+        return {"mean": None, "p50": None, "p95": None, "p99": None, "max": None}
+    ordered = sorted(latencies)
+
+    def percentile(p):
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * p))] * 1000, 2)
+
+    return {
+        "mean": round(statistics.fmean(ordered) * 1000, 2),
+        "p50": percentile(0.50),
+        "p95": percentile(0.95),
+        "p99": percentile(0.99),
+        "max": round(ordered[-1] * 1000, 2),
+    }
+
+
+def environment() -> dict:
+    from django.db import connection
+
+    return {
+        "git_commit": _git("rev-parse", "HEAD"),
+        "git_dirty": bool(_git("status", "--porcelain")),
+        "db_vendor": connection.vendor,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "node": platform.node(),
+    }
+
+
+def save(name: str, result: dict, output: Optional[str] = None) -> Path:
+    """
+    {environment, started_at, result} を JSON で保存してパスを返す
+    """
+    env = environment()
+    now = datetime.datetime.now().astimezone()
+    if output:
+        path = Path(output)
+    else:
+        commit = (env["git_commit"] or "nogit")[:8]
+        path = RESULTS_DIR / f"{name}-{now:%Y%m%d-%H%M%S}-{commit}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    payload = {"benchmark": name, "finished_at": now.isoformat(), "environment": env, "result": result}
+    path.write_text(json.dumps(payload, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+    return path
+
+
+def compare(paths: List[str]) -> str:
+    """
+    同じベンチマークの結果 JSON を並べて、数値の項目を表にする
+    """
+    loaded = [json.loads(Path(path).read_text(encoding="utf-8")) for path in paths]
+    columns = [(data["environment"].get("git_commit") or "?")[:8] for data in loaded]
+    flattened = [_flatten(data["result"]) for data in loaded]
+
+    keys = []
+    for values in flattened:
+        keys += [key for key in values if key not in keys]
+
+    width = max([len(key) for key in keys] + [10])
+    lines = [" ".join([f"{'':<{width}}"] + [f"{column:>12}" for column in columns])]
+    for key in keys:
+        cells = [values.get(key) for values in flattened]
+        lines.append(" ".join([f"{key:<{width}}"] + [f"{_cell(cell):>12}" for cell in cells]))
+    return "\n".join(lines)
+
+
+def _flatten(value, prefix: str = "") -> Dict[str, object]:
+    if isinstance(value, dict):
+        flat = {}
+        for key, item in value.items():
+            flat.update(_flatten(item, f"{prefix}{key}."))
+        return flat
+    if isinstance(value, list):
+        flat = {}
+        for index, item in enumerate(value):
+            flat.update(_flatten(item, f"{prefix}{index}."))
+        return flat
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return {prefix.rstrip("."): value}
+    return {}
+
+
+def _cell(value) -> str:
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        return f"{value:.2f}"
+    return str(value)
+
+
+def _git(*args: str) -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", *args],
+            cwd=Path(__file__).resolve().parent,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
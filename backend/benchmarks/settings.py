@@ -0,0 +1,26 @@
+"""
+ベンチマーク用の設定（config.settings + BENCH_SQLITE 指定時は SQLite）
+"""
+import os
+
+BENCH_SQLITE = os.environ.get("BENCH_SQLITE")
+
+if BENCH_SQLITE:
+    for name in ("POSTGRES_DB", "POSTGRES_USER", "POSTGRES_PASSWORD", "POSTGRES_HOST", "POSTGRES_PORT"):
+        os.environ.setdefault(name, "")
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+
+from config.settings import *  # noqa: E402,F401,F403
+
+if BENCH_SQLITE:
+    DATABASES = {
+        "default": {
+            "ENGINE": "store.backends.sqlite_wal",
+            "NAME": BENCH_SQLITE,
+            "OPTIONS": {"timeout": 30},
+        }
+    }
+
+# ベンチマーク中は Discord に送らない
+DISCORD_WEBHOOK_URL = None
+DISCORD_NOTIFY_IN_PROCESS_WORKER = False
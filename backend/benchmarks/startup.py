@@ -0,0 +1,79 @@
+"""
+起動時間とメモリ（config.settings と config.settings_kiosk の比較）
+
+設定ごとに新しい Python プロセスで config.asgi と URL 設定を読み込み（STARTUP_WARMUP ならウォームアップも込み）、
+かかった時間・RSS・読み込んだモジュール数を測る。runs 回の中央値を返す。
+requests と django.contrib.admin は DRF（rest_framework.compat / schemas）も読み込むので、kiosk でも残る。
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_SETTINGS = ("config.settings", "config.settings_kiosk")
+
+# 子プロセスで実行する。最後の行に JSON を出す
+_PROBE = """
+import json, resource, sys, time
+started = time.perf_counter()
+from config.asgi import application
+from django.urls import get_resolver
+get_resolver().url_patterns  # 最初のリクエストで読み込まれるビューも含める
+seconds = time.perf_counter() - started
+rss_kb = None
+try:
+    with open("/proc/self/status") as f:
+        rss_kb = next(int(line.split()[1]) for line in f if line.startswith("VmRSS:"))
+except OSError:
+    pass
+print(json.dumps({
+    "seconds": seconds,
+    "rss_kb": rss_kb,
+    "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    "modules": len(sys.modules),
+    "apps": len(__import__("django.apps").apps.apps.get_app_configs()),
+    "loaded": {name: name in sys.modules for name in ("django.contrib.admin", "django.contrib.auth.models", "requests")},
+}))
+"""
+
+
+def startup_benchmark(*, settings_modules=DEFAULT_SETTINGS, runs: int = 5, log=print) -> dict:
+    results = []
+    for module in settings_modules:
+        samples = [_probe(module) for _ in range(runs)]
+        result = {
+            "settings": module,
+            "runs": runs,
+            "seconds": round(statistics.median(s["seconds"] for s in samples), 3),
+            "rss_mb": _median_mb(s["rss_kb"] for s in samples),
+            "max_rss_mb": _median_mb(s["max_rss_kb"] for s in samples),
+            "modules": samples[-1]["modules"],
+            "apps": samples[-1]["apps"],
+            "loaded": samples[-1]["loaded"],
+        }
+        results.append(result)
+        log(f"{module}: {result['seconds']}s, RSS {result['rss_mb']}MB, {result['modules']} modules")
+    return {"settings": results}
+
+
+def _probe(settings_module: str) -> dict:
+    env = {**os.environ, "DJANGO_SETTINGS_MODULE": settings_module}
+    completed = subprocess.run(
+        [sys.executable, "-c", _PROBE],
+        cwd=BACKEND_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def _median_mb(values):
+    values = [v for v in values if v is not None]
+    if not values:
+        return None
+    return round(statistics.median(values) / 1024, 1)
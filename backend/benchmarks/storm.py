@@ -0,0 +1,156 @@
+"""
+1商品への購入集中（売り越しが起きないかの確認）
+
+在庫を stock 個にした商品に、threads 本のスレッドから合計 attempts 回購入する。
+成功した購入が stock 回を超えたら売り越し（oversold）。
+最後に ProductStock と取引履歴の合計が一致するかも確認する。
+
+url を指定すると POST /api/purchases を叩く（サーバーと同じ DB を見ていること）。
+指定しなければプロセス内で services.purchase.purchase_one を直接呼ぶ。
+"""
+import http.client
+import json
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+from django.db import connection, transaction
+
+from benchmarks.results import latency_summary
+from store.models import Product, ProductStock, StockTransaction, User
+from store.services.ledger import balances_as_of
+from store.services.purchase import purchase_one, PurchaseError
+from store.services.stock import apply_deltas
+
+HOT_JAN_CODE = "9800000000001"
+STORM_STUDENT_ID = "bench-storm"
+
+
+def prepare(stock: int):
+    """
+    購入集中用の商品と利用者を用意し、在庫をちょうど stock にする
+    """
+    user, _ = User.objects.get_or_create(student_id=STORM_STUDENT_ID, defaults={"name": "ベンチ（購入集中）"})
+    product, _ = Product.objects.get_or_create(
+        jan_code=HOT_JAN_CODE,
+        defaults={"name": "ベンチ商品（購入集中）", "price": 100, "alert_threshold": 0},
+    )
+    with transaction.atomic():
+        current = _ledger_balance(product)
+        if current != stock:
+            StockTransaction.objects.create(
+                product=product,
+                transaction_type="CORRECTION",
+                delta=stock - current,
+                description="benchmark: reset stock",
+            )
+            apply_deltas({product.id: stock - current})
+    return user, product
+
+
+def purchase_storm(*, threads: int, stock: int, attempts: int, url: str = None) -> dict:
+    user, product = prepare(stock)
+    attempt_fn = _http_attempt(url) if url else _service_attempt
+
+    outcomes = Counter()
+    errors = Counter()
+    latencies = []
+    lock = threading.Lock()
+    remaining = [attempts]
+    barrier = threading.Barrier(threads + 1)
+
+    def worker():
+        state = {}
+        barrier.wait()
+        try:
+            while True:
+                with lock:
+                    if remaining[0] <= 0:
+                        return
+                    remaining[0] -= 1
+                start = time.perf_counter()
+                outcome, error = attempt_fn(state, user.student_id, product.jan_code)
+                elapsed = time.perf_counter() - start
+                with lock:
+                    outcomes[outcome] += 1
+                    if error:
+                        errors[error] += 1
+                    if outcome == "ok":
+                        latencies.append(elapsed)
+        finally:
+            if "conn" in state:
+                state["conn"].close()
+            connection.close()
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    final_stock = ProductStock.objects.get(pk=product.pk).quantity
+    ledger = _ledger_balance(product)
+    succeeded = outcomes["ok"]
+    return {
+        "mode": "http" if url else "service",
+        "threads": threads,
+        "initial_stock": stock,
+        "attempts": attempts,
+        "succeeded": succeeded,
+        "out_of_stock": outcomes["out_of_stock"],
+        "errors": outcomes["error"],
+        "error_types": dict(errors),
+        "oversold": max(0, succeeded - stock),
+        "final_stock": final_stock,
+        "ledger_balance": ledger,
+        "balance_consistent": final_stock == ledger,
+        "duration_s": round(elapsed, 3),
+        "attempts_per_s": round(attempts / elapsed, 1) if elapsed else None,
+        "purchases_per_s": round(succeeded / elapsed, 1) if elapsed else None,
+        "latency_ms": latency_summary(latencies),
+    }
+
+
+def _service_attempt(state, student_id, jan_code):
+    try:
+        purchase_one(student_id=student_id, jan_code=jan_code)
+    except PurchaseError as e:
+        if e.code == "out_of_stock":
+            return "out_of_stock", None
+        return "error", e.code
+    except Exception as e:  # DB のロック待ちタイムアウトなども数える
+        return "error", type(e).__name__
+    return "ok", None
+
+
+def _http_attempt(url):
+    target = urlsplit(url)
+    body = None
+
+    def attempt(state, student_id, jan_code):
+        nonlocal body
+        body = body or json.dumps({"student_id": student_id, "jan_code": jan_code})
+        if "conn" not in state:
+            state["conn"] = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=60)
+        try:
+            state["conn"].request("POST", "/api/purchases", body, {"Content-Type": "application/json"})
+            response = state["conn"].getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException) as e:
+            state.pop("conn").close()
+            return "error", type(e).__name__
+        if response.status == 200:
+            return "ok", None
+        if response.status == 409:
+            return "out_of_stock", None
+        return "error", f"http_{response.status}"
+
+    return attempt
+
+
+def _ledger_balance(product) -> int:
+    return balances_as_of(product_ids=[product.id]).get(product.id, 0)
@@ -5,12 +5,28 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
+
+本番（docker-compose）は uvicorn で起動する:
+    uvicorn config.asgi:application --host 0.0.0.0 --port 8000 --workers 1
 """
 
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
 application = get_asgi_application()
+
+from store.services.warmup import start_workers, warm_up  # noqa: E402
+
+if getattr(settings, "STARTUP_WARMUP", False):
+    warm_up()
+start_workers()
+
+if settings.DEBUG:
+    # runserver と同じく、DEBUG 時は admin などの静的ファイルも返す
+    from django.contrib.staticfiles.handlers import ASGIStaticFilesHandler
+
+    application = ASGIStaticFilesHandler(application)
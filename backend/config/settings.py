@@ -23,7 +23,28 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # SECURITY WARNING: keep the secret key used in production secret!
 SECRET_KEY = os.environ.get('SECRET_KEY')
 DISCORD_WEBHOOK_URL = os.environ.get('DISCORD_WEBHOOK_URL')
-LOW_STOCK_THRESHOLD = 3
+# Discord 通知 outbox（store.services.notification.outbox）
+DISCORD_NOTIFY_COALESCE_SECONDS = 5  # この秒数内に積まれた通知は1回の Webhook 呼び出しにまとめる
+DISCORD_NOTIFY_MAX_ATTEMPTS = 8
+# True: Web プロセスの起動時（asgi/wsgi）にプロセス内スレッドを起動する / False: run_notification_worker を別プロセスで動かす
+DISCORD_NOTIFY_IN_PROCESS_WORKER = True
+# True: CSV一括入荷の ?async=1 ジョブをプロセス内スレッドで処理する / False: run_import_worker を別プロセスで動かす
+RESTOCK_IMPORT_IN_PROCESS_WORKER = True
+# ?async=1 でアップロードされた CSV の置き場所（run_import_worker を別プロセスで動かす場合も同じ場所を見せる）
+RESTOCK_IMPORT_SPOOL_DIR = BASE_DIR / "var" / "restock_imports"
+# 購入経路の student_id / jan_code → id キャッシュ（store.services.lookup）
+LOOKUP_CACHE_SIZE = 1024
+LOOKUP_CACHE_TTL = 300  # 秒。別プロセスでの変更はシグナルが届かないので期限で捨てる
+# 商品一覧キャッシュ（store.services.catalog）の期限（秒）。別プロセスでの在庫・商品の変更はこの時間以内に反映される
+CATALOG_CACHE_TTL = 10
+# 購入APIの Idempotency-Key を覚えておく時間（期限切れは purge_idempotency_keys で削除）
+IDEMPOTENCY_KEY_TTL_HOURS = 24
+# この時間（ミリ秒）以上かかったリクエストは実行した SQL ごとログに出す（store.services.metrics）
+METRICS_SLOW_REQUEST_MS = 500
+# この日数より古い取引は archive_ledger で LedgerArchive に移す
+LEDGER_RETENTION_DAYS = 400
+# True: asgi/wsgi の読み込み時に DB 接続・カタログ・ルックアップのキャッシュを温める（store.services.warmup）
+STARTUP_WARMUP = False
 
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
@@ -47,6 +68,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # 先頭に置いて、他のミドルウェアも含めた時間を測る
+    "store.middleware.MetricsMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -100,16 +123,32 @@ WSGI_APPLICATION = 'config.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.postgresql",
-        "NAME": os.environ["POSTGRES_DB"],
-        "USER": os.environ["POSTGRES_USER"],
-        "PASSWORD": os.environ["POSTGRES_PASSWORD"],
-        "HOST": os.environ["POSTGRES_HOST"],
-        "PORT": os.environ["POSTGRES_PORT"],
+# SQLITE_PATH を指定すると PostgreSQL の代わりに SQLite（WAL）を使う（Raspberry Pi で DB コンテナを動かさない場合）。
+# 書き込むトランザクションは BEGIN IMMEDIATE で1つずつになる（store.backends.sqlite_wal）
+SQLITE_PATH = os.environ.get("SQLITE_PATH")
+
+if SQLITE_PATH:
+    DATABASES = {
+        "default": {
+            "ENGINE": "store.backends.sqlite_wal",
+            "NAME": SQLITE_PATH,
+            # 他の書き込みが終わるのを待つ秒数（CSV一括入荷の間は購入も待たされる）
+            "OPTIONS": {"timeout": 30},
+            # 並行購入のテストはスレッドごとに接続するので、テスト DB もファイルにする
+            "TEST": {"NAME": f"{SQLITE_PATH}.test"},
+        }
+    }
+else:
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": os.environ["POSTGRES_DB"],
+            "USER": os.environ["POSTGRES_USER"],
+            "PASSWORD": os.environ["POSTGRES_PASSWORD"],
+            "HOST": os.environ["POSTGRES_HOST"],
+            "PORT": os.environ["POSTGRES_PORT"],
+        }
     }
-}
 
 
 # Password validation
@@ -152,3 +191,17 @@ STATIC_URL = 'static/'
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Logging
+# store.* のログ（遅いリクエストなど）をコンソールに出す
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "store": {"handlers": ["console"], "level": "INFO", "propagate": False},
+    },
+}
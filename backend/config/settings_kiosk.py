@@ -0,0 +1,45 @@
+"""
+キオスク（Raspberry Pi）用の省メモリ設定
+
+    DJANGO_SETTINGS_MODULE=config.settings_kiosk uvicorn config.asgi:application ...
+
+config.settings から store の API に要らないもの（admin・セッション・メッセージ・テンプレート・
+DRF のブラウザ表示）を外す。管理画面を使うときは config.settings で別に起動する。
+起動時に DB 接続とキャッシュを温める（STARTUP_WARMUP）。
+"""
+import os
+
+from config.settings import *  # noqa: F401,F403
+from config.settings import ALLOWED_HOSTS, REST_FRAMEWORK
+
+# DEBUG だとリクエストごとの SQL を connection.queries に溜め続ける
+DEBUG = os.environ.get("DJANGO_DEBUG") == "1"
+ALLOWED_HOSTS = ALLOWED_HOSTS + [host for host in os.environ.get("ALLOWED_HOSTS", "").split(",") if host]
+
+INSTALLED_APPS = [
+    "rest_framework",
+    "corsheaders",
+    "store",
+]
+
+MIDDLEWARE = [
+    "store.middleware.MetricsMiddleware",
+    "corsheaders.middleware.CorsMiddleware",
+    "django.middleware.security.SecurityMiddleware",
+    "django.middleware.common.CommonMiddleware",
+    "django.middleware.csrf.CsrfViewMiddleware",
+    "django.middleware.clickjacking.XFrameOptionsMiddleware",
+]
+
+ROOT_URLCONF = "config.urls_kiosk"
+TEMPLATES = []
+
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,
+    "DEFAULT_RENDERER_CLASSES": ["rest_framework.renderers.JSONRenderer"],
+    # django.contrib.auth を入れないので、未認証ユーザーは None にする
+    "UNAUTHENTICATED_USER": None,
+}
+
+# STARTUP_WARMUP=0 で無効（python -m benchmarks startup で温めない場合と比べるときなど）
+STARTUP_WARMUP = os.environ.get("STARTUP_WARMUP", "1") == "1"
@@ -0,0 +1,8 @@
+"""
+キオスク用の URL 設定（config.settings_kiosk）。admin を含めない
+"""
+from django.urls import include, path
+
+urlpatterns = [
+    path('api/', include('store.urls')),
+]
@@ -9,8 +9,15 @@ https://docs.djangoproject.com/en/5.0/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
 application = get_wsgi_application()
+
+from store.services.warmup import start_workers, warm_up  # noqa: E402
+
+if getattr(settings, "STARTUP_WARMUP", False):
+    warm_up()
+start_workers()
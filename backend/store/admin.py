@@ -1,5 +1,30 @@
 from django.contrib import admin
-from .models import Product, User, StockTransaction
+from django.db import transaction
+from django.db.models import F
+from .models import NotificationOutbox, Product, User, StockTransaction
+from .paginator import EstimatedCountPaginator
+from .services import stock_alerts
+from .services.stock import apply_deltas
+
+
+class LowStockFilter(admin.SimpleListFilter):
+    title = "在庫状態"
+    parameter_name = "stock_status"
+
+    def lookups(self, request, model_admin):
+        return (
+            ('low', '通知閾値以下'),
+            ('ok', '十分'),
+        )
+
+    # 判定は SQL 側（商品ごとの alert_threshold と比較）
+    def queryset(self, request, queryset):
+        if self.value() == 'low':
+            return queryset.low_stock()
+        if self.value() == 'ok':
+            return queryset.with_stock().filter(stock_quantity__gt=F('alert_threshold'))
+        return queryset
+
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
@@ -7,11 +32,21 @@ class ProductAdmin(admin.ModelAdmin):
     list_display = ('id', 'name', 'price', 'current_stock_display', 'alert_threshold', 'jan_code')
     search_fields = ('name', 'jan_code')
     list_editable = ('price', 'alert_threshold') # 一覧画面で直接価格編集できるようにする
+    list_filter = (LowStockFilter,)
+
+    # 在庫数は一覧のクエリで一緒に取る（行ごとに集計しない）
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_stock()
 
-    # @propertyをAdminで表示するための設定
+    @admin.display(description="現在在庫", ordering="stock_quantity")
     def current_stock_display(self, obj):
-        return obj.current_stock
-    current_stock_display.short_description = "現在在庫"
+        return obj.stock_quantity
+
+    # 一覧・詳細で通知閾値を変えたら在庫低下を判定し直す（閾値を上げて閾値以下になれば通知）
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if change and "alert_threshold" in form.changed_data:
+            stock_alerts.evaluate({obj.pk: 0}, thresholds={obj.pk: form.initial["alert_threshold"]})
 
 @admin.register(User)
 class UserAdmin(admin.ModelAdmin):
@@ -22,4 +57,35 @@ class UserAdmin(admin.ModelAdmin):
 class StockTransactionAdmin(admin.ModelAdmin):
     list_display = ('created_at', 'product', 'transaction_type', 'delta', 'user')
     list_filter = ('transaction_type', 'created_at') # 右側にフィルタメニューが出る
-    autocomplete_fields = ['product', 'user'] # 商品数が多くなっても検索窓で選べる
\ No newline at end of file
+    list_select_related = ('product', 'user') # __str__ や一覧表示で行ごとにクエリを出さない
+    paginator = EstimatedCountPaginator # 台帳が大きくなっても全件 COUNT しない
+    show_full_result_count = False
+    autocomplete_fields = ['product', 'user'] # 商品数が多くなっても検索窓で選べる
+
+    # 管理画面からの追加・編集・削除も在庫数 (ProductStock) に反映する
+    def save_model(self, request, obj, form, change):
+        deltas = {}
+        if change:
+            old = StockTransaction.objects.get(pk=obj.pk)
+            deltas[old.product_id] = -old.delta
+        super().save_model(request, obj, form, change)
+        deltas[obj.product_id] = deltas.get(obj.product_id, 0) + obj.delta
+        apply_deltas(deltas)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        apply_deltas({obj.product_id: -obj.delta})
+
+    @transaction.atomic
+    def delete_queryset(self, request, queryset):
+        deltas = {}
+        for product_id, delta in queryset.values_list('product_id', 'delta'):
+            deltas[product_id] = deltas.get(product_id, 0) - delta
+        super().delete_queryset(request, queryset)
+        apply_deltas(deltas)
+
+@admin.register(NotificationOutbox)
+class NotificationOutboxAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'status', 'attempts', 'next_attempt_at', 'sent_at', 'content')
+    list_filter = ('status',)
+    readonly_fields = ('created_at', 'sent_at', 'last_error')
@@ -0,0 +1,256 @@
+# store/api/async_views.py
+"""
+読み取りが多いエンドポイントの async ビュー（商品一覧・在庫・取引一覧・在庫変更の SSE）
+
+ASGI（uvicorn）で動かすとスレッドを占有せずに DB の応答を待てるので、
+CSV 取込みや Discord 通知のような遅いリクエストがあっても一覧系は詰まらない。
+WSGI（runserver）でも動く（SSE だけは ASGI が必要）。
+"""
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Q
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.http import parse_etags
+from django.views.decorators.http import require_GET
+from rest_framework import status
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.utils.urls import replace_query_param
+
+from store.api.filters import filter_transactions, parse_datetime_param
+from store.api.pagination import akeyset_page
+from store.api.serializers import StockTransactionSerializer
+from store.models import Product, StockTransaction
+from store.services import catalog, ledger, stock_events
+
+TRANSACTION_PAGE_SIZE = 50
+TRANSACTION_MAX_PAGE_SIZE = 500
+STREAM_HEARTBEAT_SECONDS = 15  # プロキシやブラウザに切られないよう、この間隔でコメント行を送る
+STREAM_RETRY_MS = 3000
+
+
+@require_GET
+async def product_catalog(request):
+    """
+    商品一覧API（名前・価格・画像・在庫）
+    シリアライズ済みJSONをプロセス内にキャッシュし、ETagで304を返す
+    """
+    tag, body = await catalog.aget_catalog()
+    not_modified = _not_modified(request, tag)
+    if not_modified is not None:
+        return not_modified
+    return _catalog_response(tag, body)
+
+
+@require_GET
+async def product_detail(request, jan_code):
+    """
+    バーコード(JAN)から商品を引くAPI
+    """
+    tag, body = await catalog.aget_product(jan_code.strip())
+    not_modified = _not_modified(request, tag)
+    if not_modified is not None:
+        return not_modified
+    if body is None:
+        return JsonResponse({"error": "product_not_found"}, status=status.HTTP_404_NOT_FOUND)
+    return _catalog_response(tag, body)
+
+
+@require_GET
+async def stock_list(request):
+    """
+    在庫一覧API
+    ?low=1 なら在庫が通知閾値以下の商品だけ返す
+    ?as_of=日時 ならその時点の在庫（チェックポイント + それ以降の取引から求める）
+    """
+    low = request.GET.get("low", "").lower() in ("1", "true", "yes")
+    if request.GET.get("as_of"):
+        return await _stock_list_as_of(request, low=low)
+
+    queryset = Product.objects.with_stock()
+    if low:
+        queryset = queryset.low_stock()
+
+    rows = [
+        _stock_row(row)
+        async for row in queryset.order_by("id").values("jan_code", "name", "alert_threshold", "stock_quantity")
+    ]
+    return JsonResponse(rows, safe=False, json_dumps_params={"ensure_ascii": False})
+
+
+async def _stock_list_as_of(request, *, low: bool):
+    as_of = parse_datetime_param(request.GET["as_of"])
+    if as_of is None:
+        return JsonResponse(
+            {"as_of": "as_ofはISO 8601形式の日付または日時で指定してください"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    try:
+        balances = await sync_to_async(ledger.balances_as_of)(as_of)
+    except ledger.LedgerArchivedError:
+        return JsonResponse({"error": "ledger_archived"}, status=status.HTTP_409_CONFLICT)
+
+    # 取引があればその時点で登録済みとみなす（created_at より前の日時で取引を入れた商品もある）
+    products = Product.objects.filter(Q(created_at__lt=as_of) | Q(id__in=list(balances)))
+    rows = []
+    async for row in products.order_by("id").values("id", "jan_code", "name", "alert_threshold"):
+        row["stock_quantity"] = balances.get(row.pop("id"), 0)
+        item = _stock_row(row)
+        if not low or item["is_low"]:
+            rows.append(item)
+    return JsonResponse(rows, safe=False, json_dumps_params={"ensure_ascii": False})
+
+
+@require_GET
+async def stock_detail(request, jan_code):
+    """
+    1商品の在庫API
+    """
+    row = await (
+        Product.objects.with_stock()
+        .filter(jan_code=jan_code.strip())
+        .values("jan_code", "name", "alert_threshold", "stock_quantity")
+        .afirst()
+    )
+    if row is None:
+        return JsonResponse({"error": "product_not_found"}, status=status.HTTP_404_NOT_FOUND)
+    return JsonResponse(_stock_row(row), json_dumps_params={"ensure_ascii": False})
+
+
+@require_GET
+async def transaction_list(request):
+    """
+    取引一覧API
+    ?product= &user= &transaction_type= &created_after= &created_before= など（filters.py）
+    (created_at, id) の降順でキーセットページネーション。レスポンスは {"next": URL or null, "results": [...]}
+    """
+    try:
+        queryset = filter_transactions(StockTransaction.objects.all(), request.GET)
+        rows, next_cursor = await akeyset_page(
+            queryset,
+            request.GET.get("cursor"),
+            _page_size(request),
+        )
+    except ValidationError as e:
+        return JsonResponse(e.detail, status=status.HTTP_400_BAD_REQUEST)
+    except NotFound as e:
+        return JsonResponse({"detail": e.detail}, status=status.HTTP_404_NOT_FOUND)
+
+    next_url = None
+    if next_cursor is not None:
+        next_url = replace_query_param(request.build_absolute_uri(), "cursor", next_cursor)
+    return JsonResponse(
+        {
+            "next": next_url,
+            "results": StockTransactionSerializer(rows, many=True).data,
+        },
+        json_dumps_params={"ensure_ascii": False},
+    )
+
+
+@require_GET
+async def stock_stream(request):
+    """
+    在庫変更の Server-Sent Events
+    event: stock     data: {"jan_code":, "remaining":}  （購入・入荷・取消・取込みのコミットごと）
+    event: snapshot  data: [{"jan_code":, "remaining":}, ...]  （接続時・続きから送れないとき）
+    Last-Event-ID ヘッダ（EventSource が再接続時に付ける）があれば、その続きから送る。
+    配信のために DB は読まない（スナップショットもカタログキャッシュから作る）
+    """
+    if not isinstance(request, ASGIRequest):
+        # WSGI では終わらないレスポンスを返せない
+        return JsonResponse({"error": "asgi_required"}, status=status.HTTP_501_NOT_IMPLEMENTED)
+
+    last_event_id = request.headers.get("Last-Event-ID") or request.GET.get("last_event_id")
+    try:
+        subscriber, backlog, seq = stock_events.subscribe(last_event_id)
+    except stock_events.TooManySubscribers:
+        return JsonResponse({"error": "too_many_subscribers"}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    response = StreamingHttpResponse(
+        _stock_events(subscriber, backlog, seq),
+        content_type="text/event-stream",
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+async def _stock_events(subscriber, backlog, seq):
+    try:
+        yield f"retry: {STREAM_RETRY_MS}\n\n".encode()
+        if backlog is None:
+            yield await _snapshot_event(seq)
+        else:
+            for event in backlog:
+                yield _sse("stock", *event)
+
+        while True:
+            try:
+                event = await asyncio.wait_for(subscriber.queue.get(), STREAM_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield b": ping\n\n"
+                continue
+
+            if subscriber.lagged:
+                # 取りこぼしたので、溜まっている分を捨ててスナップショットから送り直す
+                while not subscriber.queue.empty():
+                    subscriber.queue.get_nowait()
+                subscriber.lagged = False
+                yield await _snapshot_event(stock_events.latest_seq())
+                continue
+            yield _sse("stock", *event)
+    finally:
+        stock_events.unsubscribe(subscriber)
+
+
+async def _snapshot_event(seq: int) -> bytes:
+    _, body = await catalog.aget_catalog()
+    levels = [{"jan_code": item["jan_code"], "remaining": item["stock"]} for item in json.loads(body)]
+    return _sse("snapshot", seq, json.dumps(levels, ensure_ascii=False, separators=(",", ":")))
+
+
+def _sse(event: str, seq: int, data: str) -> bytes:
+    return f"id: {stock_events.event_id(seq)}\nevent: {event}\ndata: {data}\n\n".encode("utf-8")
+
+
+def _page_size(request) -> int:
+    raw = request.GET.get("page_size")
+    if raw and raw.isdigit() and int(raw) > 0:
+        return min(int(raw), TRANSACTION_MAX_PAGE_SIZE)
+    return TRANSACTION_PAGE_SIZE
+
+
+def _stock_row(row: dict) -> dict:
+    return {
+        "jan_code": row["jan_code"],
+        "name": row["name"],
+        "stock": row["stock_quantity"],
+        "alert_threshold": row["alert_threshold"],
+        "is_low": row["stock_quantity"] <= row["alert_threshold"],
+    }
+
+
+def _catalog_response(tag, body):
+    response = HttpResponse(body, content_type="application/json")
+    response["ETag"] = tag
+    # ブラウザに毎回再検証させる（一致すれば 304 で本文なし）
+    response["Cache-Control"] = "no-cache"
+    return response
+
+
+def _not_modified(request, tag):
+    """
+    If-None-Match が現在の ETag と一致すれば 304 を返す
+    """
+    if_none_match = request.headers.get("If-None-Match")
+    if not if_none_match:
+        return None
+    if if_none_match.strip() == "*" or tag in parse_etags(if_none_match):
+        response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        response["ETag"] = tag
+        response["Cache-Control"] = "no-cache"
+        return response
+    return None
@@ -0,0 +1,90 @@
+# store/api/filters.py
+from __future__ import annotations
+
+import datetime
+from typing import Mapping, Optional
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+
+from store.models import StockTransaction
+
+TRANSACTION_TYPES = {value for value, _ in StockTransaction.TYPE_CHOICES}
+
+
+def filter_transactions(queryset, params: Mapping[str, str]):
+    """
+    取引一覧・エクスポート共通の絞り込み。
+    いずれも (列, created_at, id) の複合インデックスに乗る条件だけを使う。
+
+    - product: 商品ID / jan_code: JANコード
+    - user: 利用者ID / student_id: 学生証番号
+    - transaction_type: PURCHASE / RESTOCK / CORRECTION
+    - created_after: この日時以降（日付のみなら 0:00 から）
+    - created_before: この日時より前（日付のみなら 0:00 まで）
+    """
+    errors = {}
+
+    product = params.get("product")
+    if product:
+        if not product.isdigit():
+            errors["product"] = "productは商品IDで指定してください"
+        else:
+            queryset = queryset.filter(product_id=int(product))
+
+    jan_code = (params.get("jan_code") or "").strip()
+    if jan_code:
+        queryset = queryset.filter(product__jan_code=jan_code)
+
+    user = params.get("user")
+    if user:
+        if not user.isdigit():
+            errors["user"] = "userは利用者IDで指定してください"
+        else:
+            queryset = queryset.filter(user_id=int(user))
+
+    student_id = (params.get("student_id") or "").strip()
+    if student_id:
+        queryset = queryset.filter(user__student_id=student_id)
+
+    transaction_type = params.get("transaction_type")
+    if transaction_type:
+        if transaction_type not in TRANSACTION_TYPES:
+            errors["transaction_type"] = f"transaction_typeは {', '.join(sorted(TRANSACTION_TYPES))} のいずれかです"
+        else:
+            queryset = queryset.filter(transaction_type=transaction_type)
+
+    for name, lookup in (("created_after", "created_at__gte"), ("created_before", "created_at__lt")):
+        raw = params.get(name)
+        if not raw:
+            continue
+        value = parse_datetime_param(raw)
+        if value is None:
+            errors[name] = f"{name}はISO 8601形式の日付または日時で指定してください"
+        else:
+            queryset = queryset.filter(**{lookup: value})
+
+    if errors:
+        raise ValidationError(errors)
+    return queryset
+
+
+def parse_datetime_param(raw: str) -> Optional[datetime.datetime]:
+    """
+    '2026-02-01' / '2026-02-01T09:00:00+09:00' を aware な datetime にする
+    """
+    raw = raw.strip()
+    try:
+        value = parse_datetime(raw)
+        if value is None:
+            date = parse_date(raw)
+            if date is None:
+                return None
+            value = datetime.datetime.combine(date, datetime.time.min)
+    except ValueError:
+        return None
+
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return value
@@ -0,0 +1,69 @@
+# store/api/pagination.py
+from __future__ import annotations
+
+import base64
+import binascii
+from typing import Optional, Tuple
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+
+
+def encode_cursor(created_at, pk: int) -> str:
+    raw = f"{created_at.isoformat()}|{pk}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple:
+    """
+    cursor を (created_at, id) に戻す。不正なら NotFound
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        created_raw, pk_raw = raw.rsplit("|", 1)
+        created_at = parse_datetime(created_raw)
+        pk = int(pk_raw)
+    except (ValueError, UnicodeError, binascii.Error):
+        raise NotFound("invalid cursor")
+    if created_at is None:
+        raise NotFound("invalid cursor")
+    return created_at, pk
+
+
+def keyset_page(queryset, cursor: Optional[str], page_size: int):
+    """
+    (created_at, id) の降順で、cursor の次から page_size 件を取る。
+    OFFSET を使わないので、何ページ目でも同じコストで引ける。
+    戻り値は (rows, 次ページの cursor or None)
+    """
+    rows = list(_keyset_queryset(queryset, cursor)[: page_size + 1])
+    return _split_page(rows, page_size)
+
+
+async def akeyset_page(queryset, cursor: Optional[str], page_size: int):
+    """
+    keyset_page の async 版
+    """
+    rows = [row async for row in _keyset_queryset(queryset, cursor)[: page_size + 1]]
+    return _split_page(rows, page_size)
+
+
+def _keyset_queryset(queryset, cursor: Optional[str]):
+    queryset = queryset.order_by("-created_at", "-id")
+    if cursor:
+        created_at, pk = decode_cursor(cursor)
+        # created_at <= X をインデックス条件にし、同時刻の行だけ id で切る
+        queryset = queryset.filter(created_at__lte=created_at).filter(
+            Q(created_at__lt=created_at) | Q(id__lt=pk)
+        )
+    return queryset
+
+
+def _split_page(rows: list, page_size: int):
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    last = rows[-1]
+    return rows, encode_cursor(last.created_at, last.id)
+
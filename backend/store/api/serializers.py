@@ -5,6 +5,64 @@ class PurchaseRequestSerializer(serializers.Serializer):
     student_id = serializers.CharField()
     jan_code = serializers.CharField()
 
+
+class PurchaseReplayItemSerializer(PurchaseRequestSerializer):
+    idempotency_key = serializers.CharField(max_length=255)
+
+
+class PurchaseReplayRequestSerializer(serializers.Serializer):
+    # 1リクエストで反映する上限（長すぎるトランザクションにしない）
+    purchases = PurchaseReplayItemSerializer(many=True, allow_empty=False, max_length=1000)
+
+
+class CheckoutItemSerializer(serializers.Serializer):
+    jan_code = serializers.CharField()
+    qty = serializers.IntegerField(min_value=1, default=1)
+
+
+class CheckoutRequestSerializer(serializers.Serializer):
+    student_id = serializers.CharField()
+    items = CheckoutItemSerializer(many=True, allow_empty=False)
+
+
+class AmendBulkRequestSerializer(serializers.Serializer):
+    """
+    ids / checkout_id / import_id のどれか1つを指定する
+    """
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=1000, required=False,
+    )
+    checkout_id = serializers.UUIDField(required=False)
+    import_id = serializers.UUIDField(required=False)
+
+    def validate(self, attrs):
+        if len(attrs) != 1:
+            raise serializers.ValidationError("specify exactly one of ids, checkout_id, import_id")
+        return attrs
+
+
+class StocktakeItemSerializer(serializers.Serializer):
+    jan_code = serializers.CharField()
+    quantity = serializers.IntegerField(min_value=0)
+
+
+class StocktakeRequestSerializer(serializers.Serializer):
+    items = StocktakeItemSerializer(many=True, allow_empty=False, max_length=5000)
+    # 数えた時刻（省略時は今）。これより前の取引と比べる
+    counted_at = serializers.DateTimeField(required=False)
+    description = serializers.CharField(required=False, allow_blank=True, max_length=200)
+
+    def validate_items(self, items):
+        seen = set()
+        duplicated = []
+        for item in items:
+            if item["jan_code"] in seen:
+                duplicated.append(item["jan_code"])
+            seen.add(item["jan_code"])
+        if duplicated:
+            raise serializers.ValidationError(f"duplicated jan_code: {', '.join(duplicated)}")
+        return items
+
 class ProductRegisterSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
@@ -21,6 +79,11 @@ class ProductRegisterSerializer(serializers.ModelSerializer):
             "created_at",
             "updated_at",
         ]
+        extra_kwargs = {
+            # 重複は DB の unique 制約で検出する（register_product が ValidationError に変換）。
+            # 事前の exists() は1往復増えるうえ、同時登録は結局防げない
+            "jan_code": {"validators": []},
+        }
 
     def validate_jan_code(self, value: str) -> str:
         """
@@ -31,10 +94,6 @@ class ProductRegisterSerializer(serializers.ModelSerializer):
         if not value:
             raise serializers.ValidationError("JANコードは必須です。")
 
-        # 登録API用：既存JANがあれば弾く
-        if Product.objects.filter(jan_code=value).exists():
-            raise serializers.ValidationError("このJANコードの商品は既に登録されています。")
-
         return value
 
     def validate_price(self, value: int) -> int:
@@ -72,8 +131,11 @@ class StockTransactionSerializer(serializers.ModelSerializer):
             "transaction_type",
             "delta",
             "unit_cost",
+            "unit_price",
             "description",
             "amended_of",
+            "checkout_id",
+            "import_id",
             "created_at",
         ]
         read_only_fields = fields
@@ -88,3 +150,11 @@ class RestockRequestSerializer(serializers.Serializer):
     quantity = serializers.IntegerField(min_value=0)
     unit_cost = serializers.IntegerField(required=False, allow_null=True)
     description = serializers.CharField(required=False, allow_blank=True)
+
+
+class SalesStatsRequestSerializer(serializers.Serializer):
+    granularity = serializers.ChoiceField(choices=["day", "week", "month"], default="day")
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    product = serializers.IntegerField(required=False)
+    by_product = serializers.BooleanField(required=False, default=False)
@@ -1,42 +1,265 @@
+
 import csv
 import io
+import json
+import resource
+import zlib
 
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import transaction
-from django.http import JsonResponse
+from django.db.models import Count, F, Min, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils import timezone
 from django.views.decorators.csrf import ensure_csrf_cookie
+from django.views.decorators.http import require_GET
 from rest_framework import mixins, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.generics import GenericAPIView
 from rest_framework.parsers import FormParser, MultiPartParser
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from store.api.filters import filter_transactions
 from store.api.serializers import (
+    AmendBulkRequestSerializer,
+    CheckoutRequestSerializer,
     ProductRegisterSerializer,
+    PurchaseReplayRequestSerializer,
     PurchaseRequestSerializer,
     RestockImportRequestSerializer,
     RestockRequestSerializer,
+    SalesStatsRequestSerializer,
+    StocktakeRequestSerializer,
     StockTransactionSerializer,
 )
-from store.models import Product, StockTransaction
-from store.services.purchase import purchase_one,PurchaseError
+from store.models import DailyProductSales, NotificationOutbox, Product, RestockImportJob, StockTransaction
+from store.services import billing, catalog, idempotency, import_jobs, ledger, lookup, metrics, stock_events
+from store.services.amend import AmendError, amend_transactions
+from store.services.idempotency import IdempotencyError
+from store.services.purchase import checkout, purchase_one, PurchaseError
 from store.services.register.product import register_product
+from store.services.register.product_import import (
+    MAX_ROWS as PRODUCT_IMPORT_MAX_ROWS,
+    read_csv,
+    upsert_products,
+)
+from store.services.restock_import import ImportFormatError, import_restock_csv
+from store.services.sales_rollup import last_run_at as rollup_last_run_at
+from store.services.stock import apply_deltas
+from store.services.stocktake import StocktakeError, take_stock
 
 @ensure_csrf_cookie
 def csrf(request):
     return JsonResponse({"status": "ok"})
 
+# 取引エクスポートの列（values_list でそのまま取る）
+EXPORT_COLUMNS = (
+    ("id", "id"),
+    ("created_at", "created_at"),
+    ("transaction_type", "transaction_type"),
+    ("product_id", "product_id"),
+    ("jan_code", "product__jan_code"),
+    ("product_name", "product__name"),
+    ("user_id", "user_id"),
+    ("student_id", "user__student_id"),
+    ("delta", "delta"),
+    ("unit_cost", "unit_cost"),
+    ("unit_price", "unit_price"),
+    ("description", "description"),
+    ("amended_of", "amended_of_id"),
+    ("checkout_id", "checkout_id"),
+    ("import_id", "import_id"),
+)
+EXPORT_CHUNK_SIZE = 2000  # サーバーサイドカーソルから一度に取る行数
+EXPORT_BUFFER_BYTES = 64 * 1024  # この大きさごとにレスポンスへ書き出す
+
+
+@require_GET
+def transaction_export(request):
+    """
+    取引履歴のエクスポートAPI
+    ?format=csv|ndjson  &gzip=1  と、取引一覧と同じ絞り込み（product, created_after など）
+    QuerySet.iterator() で少しずつ読み、StreamingHttpResponse で流すのでメモリは一定
+    """
+    export_format = request.GET.get("format", "csv")
+    if export_format not in ("csv", "ndjson"):
+        return JsonResponse({"error": "invalid_format"}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        queryset = filter_transactions(StockTransaction.objects.all(), request.GET)
+    except ValidationError as e:
+        return JsonResponse(e.detail, status=status.HTTP_400_BAD_REQUEST)
+
+    rows = (
+        queryset
+        .order_by("created_at", "id")
+        .values_list(*[lookup for _, lookup in EXPORT_COLUMNS])
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+    chunks = _export_csv(rows) if export_format == "csv" else _export_ndjson(rows)
+
+    filename = f"transactions.{export_format}"
+    content_type = "text/csv; charset=utf-8" if export_format == "csv" else "application/x-ndjson"
+    if request.GET.get("gzip", "").lower() in ("1", "true", "yes"):
+        chunks = _gzip(chunks)
+        filename += ".gz"
+        content_type = "application/gzip"
+
+    response = _streaming_response(request, chunks, content_type)
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+def _streaming_response(request, chunks, content_type):
+    """
+    ASGI では同期イテレータは全部 list にしてから送られてしまうので、async イテレータに包む
+    """
+    if isinstance(request, ASGIRequest):
+        chunks = _aiter_chunks(chunks)
+    return StreamingHttpResponse(chunks, content_type=content_type)
+
+
+async def _aiter_chunks(chunks):
+    # 1チャンクずつリクエスト用のスレッドで取り出す（DB 接続も同じスレッドのものを使う）
+    next_chunk = sync_to_async(next)
+    try:
+        while (chunk := await next_chunk(chunks, None)) is not None:
+            yield chunk
+    finally:
+        await sync_to_async(chunks.close)()
+
+
+def _export_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([name for name, _ in EXPORT_COLUMNS])
+    for row in rows:
+        writer.writerow((row[0], row[1].isoformat()) + row[2:])
+        if buffer.tell() >= EXPORT_BUFFER_BYTES:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+
+def _export_ndjson(rows):
+    names = [name for name, _ in EXPORT_COLUMNS]
+    buffer = []
+    size = 0
+    for row in rows:
+        # CSV と同じく created_at は isoformat()（DjangoJSONEncoder はミリ秒に丸める）
+        values = (row[0], row[1].isoformat()) + row[2:]
+        line = json.dumps(dict(zip(names, values)), cls=DjangoJSONEncoder, ensure_ascii=False) + "\n"
+        buffer.append(line)
+        size += len(line)
+        if size >= EXPORT_BUFFER_BYTES:
+            yield "".join(buffer).encode("utf-8")
+            buffer, size = [], 0
+    yield "".join(buffer).encode("utf-8")
+
+
+def _gzip(chunks):
+    compressor = zlib.compressobj(wbits=31)  # 31: gzip 形式
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+@require_GET
+def cache_stats(request):
+    """
+    プロセス内キャッシュのヒット/ミス数
+    """
+    return JsonResponse({"lookup": lookup.stats(), "catalog": {"etag": catalog.etag(), **catalog.stats()}})
+
+
+@require_GET
+def prometheus_metrics(request):
+    """
+    性能メトリクス（Prometheus テキスト形式）
+    リクエストのレイテンシ・SQL 件数・DB 時間と、通知 outbox・キャッシュの状態
+    """
+    outbox = dict(
+        NotificationOutbox.objects.values_list("status").annotate(count=Count("id")).order_by()
+    )
+    oldest_pending = (
+        NotificationOutbox.objects.filter(status="PENDING").aggregate(oldest=Min("created_at"))["oldest"]
+    )
+    lookup_stats = lookup.stats()
+    catalog_stats = catalog.stats()
+
+    extra = []
+    extra += metrics.family(
+        "lab_kiosk_outbox_messages",
+        "Notification outbox rows by status.",
+        [({"status": value}, outbox.get(value, 0)) for value, _ in NotificationOutbox.STATUS_CHOICES],
+    )
+    extra += metrics.family(
+        "lab_kiosk_outbox_oldest_pending_seconds",
+        "Age of the oldest pending notification.",
+        [({}, round((timezone.now() - oldest_pending).total_seconds(), 3) if oldest_pending else 0)],
+    )
+    for name, key in (("hits", "hits"), ("misses", "misses")):
+        extra += metrics.family(
+            f"lab_kiosk_cache_{name}_total",
+            f"In-process cache {name}.",
+            [({"cache": cache}, values[key]) for cache, values in lookup_stats.items()]
+            + [({"cache": "catalog"}, catalog_stats[key])],
+            kind="counter",
+        )
+    extra += metrics.family(
+        "lab_kiosk_cache_entries",
+        "Entries held by in-process caches.",
+        [({"cache": cache}, values["size"]) for cache, values in lookup_stats.items()]
+        + [({"cache": "catalog"}, catalog_stats["products"])],
+    )
+    extra += metrics.family(
+        "lab_kiosk_stock_stream_subscribers",
+        "Open /api/stream/stock connections.",
+        [({}, stock_events.subscriber_count())],
+    )
+    extra += metrics.family(
+        "lab_kiosk_process_max_rss_bytes",
+        "Peak resident set size of this process.",
+        [({}, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024)],
+    )
+    return HttpResponse(metrics.render(extra), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@require_GET
+def billing_statement(request, month):
+    """
+    月次請求明細API  /billing/statements/YYYY-MM
+    全利用者分を CSV で返す。締め済みの月はキャッシュから返す
+    """
+    try:
+        target = billing.parse_month(month)
+    except ValueError:
+        return JsonResponse({"error": "invalid_month"}, status=status.HTTP_400_BAD_REQUEST)
+
+    response = _streaming_response(
+        request,
+        billing.statement_chunks(target),
+        "text/csv; charset=utf-8",
+    )
+    response["Content-Disposition"] = f'attachment; filename="statement-{target:%Y-%m}.csv"'
+    return response
+
+
 class StockTransactionViewSet(
-    mixins.ListModelMixin,
     mixins.RetrieveModelMixin,
     viewsets.GenericViewSet,
 ):
-    queryset = (
-        StockTransaction.objects
-        .select_related("product", "user", "amended_of")
-        .order_by("-created_at")
-    )
+    # 一覧は async ビュー（store/api/async_views.py の transaction_list）
+    queryset = StockTransaction.objects.all()
     serializer_class = StockTransactionSerializer
 
     @action(detail=False, methods=["post"], url_path="restock")
@@ -55,11 +278,10 @@ class StockTransactionViewSet(
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
+        # 商品行はロックしない。在庫数は apply_deltas の UPDATE（在庫行のロック）で加算するので、
+        # 購入（在庫行だけをロック）とロックの順序が逆にならない
+        product = get_object_or_404(Product, jan_code=jan_code)
         with transaction.atomic():
-            product = get_object_or_404(
-                Product.objects.select_for_update(),
-                jan_code=jan_code,
-            )
             tx = StockTransaction.objects.create(
                 product=product,
                 transaction_type="RESTOCK",
@@ -67,40 +289,55 @@ class StockTransactionViewSet(
                 unit_cost=unit_cost,
                 description=description,
             )
+            apply_deltas({product.id: quantity})
 
         return Response(StockTransactionSerializer(tx).data, status=status.HTTP_201_CREATED)
 
     @action(detail=True, methods=["post"], url_path="amend")
     def amend(self, request, pk=None):
-        with transaction.atomic():
-            tx = get_object_or_404(
-                StockTransaction.objects.select_for_update(),
-                pk=pk,
-            )
+        try:
+            pk = int(pk)
+        except (TypeError, ValueError):
+            raise Http404
+        try:
+            (amend,) = amend_transactions(ids=[pk])
+        except AmendError as e:
+            if e.code == "transaction_not_found":
+                raise Http404
+            return Response({"error": e.code}, status=_AMEND_ERROR_STATUS[e.code])
 
-            if tx.transaction_type == "CORRECTION":
-                return Response(
-                    {"error": "cannot_amend_correction"},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
+        serializer = self.get_serializer(amend)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-            if tx.amendments.exists():
-                return Response(
-                    {"error": "already_amended"},
-                    status=status.HTTP_409_CONFLICT,
-                )
+    @action(detail=False, methods=["post"], url_path="amend-bulk")
+    def amend_bulk(self, request):
+        """
+        取引をまとめて取り消す
+        {"ids": [...]} / {"checkout_id": "..."}（カート購入）/ {"import_id": "..."}（CSV一括入荷）
+        1件でも取り消せない取引があれば何も作らず、原因の取引IDを返す
+        """
+        serializer = AmendBulkRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
 
-            amend = StockTransaction.objects.create(
-                product=tx.product,
-                user=tx.user,
-                transaction_type="CORRECTION",
-                delta=-tx.delta,
-                description=f"amend of {tx.id}",
-                amended_of=tx,
-            )
+        try:
+            amends = amend_transactions(**serializer.validated_data)
+        except AmendError as e:
+            return Response({"error": e.code, "ids": e.ids}, status=_AMEND_ERROR_STATUS[e.code])
 
-        serializer = self.get_serializer(amend)
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return Response(
+            {
+                "amended_count": len(amends),
+                "results": self.get_serializer(amends, many=True).data,
+            },
+            status=status.HTTP_201_CREATED,
+        )
+
+
+_AMEND_ERROR_STATUS = {
+    "transaction_not_found": status.HTTP_404_NOT_FOUND,
+    "cannot_amend_correction": status.HTTP_400_BAD_REQUEST,
+    "already_amended": status.HTTP_409_CONFLICT,
+}
 
 class PurchaseView(APIView):
     """
@@ -109,29 +346,157 @@ class PurchaseView(APIView):
     "student_id":,
     "jan_code":
     }
+    Idempotency-Key ヘッダを付けると、同じキーでの再送は処理せずに前回の結果を返す
     """
     def post(self, request):
         serializer = PurchaseRequestSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        return _idempotent_response(
+            request,
+            "purchase",
+            dict(data),
+            lambda: _purchase(data["student_id"], data["jan_code"]),
+        )
+
+
+def _purchase(student_id, jan_code):
+    """
+    1点購入して (ステータスコード, 本文) を返す
+    """
+    try:
+        result = purchase_one(student_id=student_id, jan_code=jan_code)
+    except PurchaseError as e:
+        if e.code in ("user_not_found", "product_not_found"):
+            return status.HTTP_404_NOT_FOUND, {"error": e.code}
+        if e.code == "out_of_stock":
+            return status.HTTP_409_CONFLICT, {"error": e.code}
+        return status.HTTP_500_INTERNAL_SERVER_ERROR, {"error": "unknown"}
+
+    return status.HTTP_200_OK, {'product':result.product.name,'remaining':result.remaining}
+
+
+class PurchaseReplayView(APIView):
+    """
+    オフライン中にキオスクが貯めた購入をまとめて反映するAPI
+    {
+    "purchases": [{"idempotency_key":, "student_id":, "jan_code":}, ...]
+    }
+    1トランザクションで先頭から順に処理し、1件ずつの結果を返す。
+    在庫切れなどで失敗した購入があっても他の購入は反映する。
+    反映済みのキー（オンライン中に届いていた購入）は二重に処理しない。
+    """
+    def post(self, request):
+        serializer = PurchaseReplayRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        results = []
+        with transaction.atomic():
+            for index, item in enumerate(serializer.validated_data["purchases"]):
+                data = {"student_id": item["student_id"], "jan_code": item["jan_code"]}
+                entry = {"index": index, "idempotency_key": item["idempotency_key"]}
+                try:
+                    result = idempotency.run_once(
+                        item["idempotency_key"],
+                        idempotency.fingerprint("purchase", data),
+                        lambda: _purchase(data["student_id"], data["jan_code"]),
+                    )
+                except IdempotencyError as e:
+                    entry.update(status=IDEMPOTENCY_ERROR_STATUS[e.code], body={"error": e.code}, replayed=False)
+                else:
+                    entry.update(status=result.status, body=result.body, replayed=result.replayed)
+                results.append(entry)
 
-        try:
-            result = purchase_one(
-                student_id=serializer.validated_data["student_id"],
-                jan_code=serializer.validated_data["jan_code"],
-            )
-            print({'product':result.product.name,'remaining':result.remaining},flush=True)
-        except PurchaseError as e:
-            if e.code in ("user_not_found", "product_not_found"):
-                return Response({"error": e.code}, status=status.HTTP_404_NOT_FOUND)
-            if e.code == "out_of_stock":
-                return Response({"error": e.code}, status=status.HTTP_409_CONFLICT)
-            return Response({"error": "unknown"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-        
         return Response(
-            {'product':result.product.name,'remaining':result.remaining},
-            # {'ok'},
+            {
+                "applied": sum(1 for entry in results if entry["status"] == status.HTTP_200_OK and not entry["replayed"]),
+                "replayed": sum(1 for entry in results if entry["replayed"]),
+                "failed": sum(1 for entry in results if entry["status"] != status.HTTP_200_OK),
+                "results": results,
+            },
             status=status.HTTP_200_OK,
-        )   
+        )
+
+
+class CheckoutView(APIView):
+    """
+    カート一括購入API
+    {
+    "student_id":,
+    "items": [{"jan_code":, "qty":}, ...]
+    }
+    Idempotency-Key ヘッダは購入APIと同じ
+    """
+    def post(self, request):
+        serializer = CheckoutRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        student_id = serializer.validated_data["student_id"]
+        items = [(item["jan_code"], item["qty"]) for item in serializer.validated_data["items"]]
+
+        return _idempotent_response(
+            request,
+            "checkout",
+            {"student_id": student_id, "items": items},
+            lambda: _checkout(student_id, items),
+        )
+
+
+def _checkout(student_id, items):
+    try:
+        result = checkout(student_id=student_id, items=items)
+    except PurchaseError as e:
+        body = {"error": e.code}
+        if e.jan_code:
+            body["jan_code"] = e.jan_code
+        if e.code in ("user_not_found", "product_not_found"):
+            return status.HTTP_404_NOT_FOUND, body
+        if e.code == "out_of_stock":
+            return status.HTTP_409_CONFLICT, body
+        if e.code == "empty_cart":
+            return status.HTTP_400_BAD_REQUEST, body
+        return status.HTTP_500_INTERNAL_SERVER_ERROR, {"error": "unknown"}
+
+    return status.HTTP_200_OK, {
+        "checkout_id": str(result.checkout_id),
+        "lines": [
+            {
+                "jan_code": line.product.jan_code,
+                "product": line.product.name,
+                "qty": line.quantity,
+                "remaining": line.remaining,
+            }
+            for line in result.lines
+        ],
+    }
+
+
+IDEMPOTENCY_ERROR_STATUS = {
+    "invalid_idempotency_key": status.HTTP_400_BAD_REQUEST,
+    "idempotency_key_reused": status.HTTP_422_UNPROCESSABLE_ENTITY,
+    "idempotency_key_conflict": status.HTTP_409_CONFLICT,
+}
+
+
+def _idempotent_response(request, kind, data, handler):
+    """
+    handler() の (ステータスコード, 本文) を Response にする。
+    Idempotency-Key ヘッダがあれば、同じキーの再送では handler を呼ばずに保存済みの結果を返す
+    """
+    key = request.headers.get("Idempotency-Key")
+    if key is None:
+        code, body = handler()
+        return Response(body, status=code)
+
+    try:
+        result = idempotency.run_once(key.strip(), idempotency.fingerprint(kind, data), handler)
+    except IdempotencyError as e:
+        return Response({"error": e.code}, status=IDEMPOTENCY_ERROR_STATUS[e.code])
+
+    response = Response(result.body, status=result.status)
+    if result.replayed:
+        response["Idempotent-Replayed"] = "true"
+    return response
 
 
 class ProductRegisterView(APIView):
@@ -162,10 +527,114 @@ class ProductRegisterView(APIView):
         return Response(response_serializer.data, status=status.HTTP_201_CREATED)
 
 
+class ProductImportView(APIView):
+    """
+    商品マスタ一括登録・更新API
+    - multipart/form-data の file フィールドに CSV（jan_code,name,price[,image_url,alert_threshold]）
+    - または JSON の配列（{"products": [...]} も可）
+    jan_code が登録済みなら含まれている列だけ更新する。1行でも不正なら何も書き込まない
+    ?dry_run=1 : 検証と 新規 / 更新 / 変更なし の判定だけ返して書き込まない
+    """
+
+    def post(self, request, *args, **kwargs):
+        upload = request.FILES.get("file")
+        try:
+            if upload is not None:
+                records = read_csv(upload.file)
+            else:
+                records = _json_records(request.data)
+        except ImportFormatError as e:
+            return Response({"status": "error", "message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        rows, errors = _validate_product_rows(records)
+        if errors:
+            return Response({"status": "error", "errors": errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        result = upsert_products(rows, dry_run=_query_flag(request, "dry_run"))
+        return Response(result.body(), status=status.HTTP_200_OK)
+
+
+def _json_records(data):
+    if isinstance(data, dict):
+        data = data.get("products")
+    if not isinstance(data, list) or not data:
+        raise ImportFormatError("products must be a non-empty list")
+    if len(data) > PRODUCT_IMPORT_MAX_ROWS:
+        raise ImportFormatError(f"too many rows (max {PRODUCT_IMPORT_MAX_ROWS})")
+    return list(enumerate(data, start=1))
+
+
+def _validate_product_rows(records):
+    """
+    行ごとに ProductRegisterSerializer で検証する（DB は読まない）。
+    ([(行番号, validated_data)], [エラー]) を返す
+    """
+    rows = []
+    errors = []
+    seen = {}
+    for row_index, record in records:
+        if not isinstance(record, dict):
+            errors.append({
+                "row": row_index,
+                "jan_code": None,
+                "errors": {"non_field_errors": ["オブジェクトで指定してください。"]},
+            })
+            continue
+        serializer = ProductRegisterSerializer(data=record)
+        if not serializer.is_valid():
+            errors.append({"row": row_index, "jan_code": record.get("jan_code"), "errors": serializer.errors})
+            continue
+        jan_code = serializer.validated_data["jan_code"]
+        if jan_code in seen:
+            errors.append({
+                "row": row_index,
+                "jan_code": jan_code,
+                "errors": {"jan_code": [f"{seen[jan_code]}行目と同じJANコードです。"]},
+            })
+            continue
+        seen[jan_code] = row_index
+        rows.append((row_index, serializer.validated_data))
+    return rows, errors
+
+
+class StocktakeView(APIView):
+    """
+    棚卸しAPI
+    {"items": [{"jan_code": ..., "quantity": 数えた数}, ...], "counted_at": 省略可, "description": 省略可}
+    counted_at 時点の帳簿上の在庫数との差がある商品だけ CORRECTION を作り、差異の一覧を返す
+    ?dry_run=1 : 差異の一覧だけ返して書き込まない
+    """
+
+    def post(self, request):
+        serializer = StocktakeRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        dry_run = _query_flag(request, "dry_run")
+
+        try:
+            result = take_stock(
+                {item["jan_code"]: item["quantity"] for item in data["items"]},
+                counted_at=data.get("counted_at"),
+                description=data.get("description", ""),
+                dry_run=dry_run,
+            )
+        except StocktakeError as e:
+            if e.code == "product_not_found":
+                return Response({"error": e.code, "jan_codes": e.jan_codes}, status=status.HTTP_404_NOT_FOUND)
+            return Response({"error": e.code}, status=status.HTTP_400_BAD_REQUEST)
+        except ledger.LedgerArchivedError:
+            return Response({"error": "ledger_archived"}, status=status.HTTP_409_CONFLICT)
+
+        return Response(result.body(), status=status.HTTP_200_OK if dry_run else status.HTTP_201_CREATED)
+
+
 class RestockImportView(GenericAPIView):
     """
     CSV一括入荷API
     multipart/form-data で file フィールドに CSV を送る
+    ?dry_run=1 : 検証結果だけ返して書き込まない
+    ?merge=1   : 同じ jan_code の行を1件の入荷にまとめる
+    ?async=1   : CSV を保存してすぐ 202 とジョブIDを返す（進捗・結果は GET /restocks/import/jobs/<id>）
     """
     parser_classes = (MultiPartParser, FormParser)
     serializer_class = RestockImportRequestSerializer
@@ -177,6 +646,13 @@ class RestockImportView(GenericAPIView):
         "application/octet-stream",
     }
 
+    # CSV の処理結果 → HTTP ステータス
+    RESULT_STATUS = {
+        "ok": status.HTTP_200_OK,
+        "invalid": status.HTTP_400_BAD_REQUEST,
+        "unprocessable": status.HTTP_422_UNPROCESSABLE_ENTITY,
+    }
+
     def post(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
@@ -192,187 +668,123 @@ class RestockImportView(GenericAPIView):
                 status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
             )
 
-        try:
-            text = io.TextIOWrapper(upload.file, encoding="utf-8-sig")
-            reader = csv.DictReader(text)
-        except Exception:
-            return Response(
-                {"status": "error", "message": "invalid csv"},
-                status=status.HTTP_400_BAD_REQUEST,
+        if _query_flag(request, "async"):
+            job = import_jobs.enqueue(
+                upload,
+                filename=upload.name or "",
+                dry_run=_query_flag(request, "dry_run"),
+                merge=_query_flag(request, "merge"),
             )
-
-        required_columns = {"jan_code", "quantity"}
-        if reader.fieldnames is None:
-            return Response(
-                {"status": "error", "message": "csv has no header"},
-                status=status.HTTP_400_BAD_REQUEST,
+            location = reverse("restock_import_job", args=[job.pk])
+            response = Response(
+                {"status": "accepted", "job_id": str(job.pk), "status_url": request.build_absolute_uri(location)},
+                status=status.HTTP_202_ACCEPTED,
             )
+            response["Location"] = location
+            return response
 
-        missing = required_columns - set(reader.fieldnames)
-        if missing:
+        try:
+            result = import_restock_csv(
+                upload.file,
+                dry_run=_query_flag(request, "dry_run"),
+                merge=_query_flag(request, "merge"),
+            )
+        except ImportFormatError as e:
             return Response(
-                {"status": "error", "message": f"missing columns: {', '.join(sorted(missing))}"},
+                {"status": "error", "message": str(e)},
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        rows = []
-        errors_400 = []
-        errors_422 = []
-        warnings = []
-        total_rows = 0
-
-        for row_index, row in enumerate(reader, start=2):
-            total_rows += 1
-            jan_code = (row.get("jan_code") or "").strip()
-            quantity_raw = (row.get("quantity") or "").strip()
-            unit_cost_raw = (row.get("unit_cost") or "").strip()
-            name = (row.get("name") or "").strip()
-
-            if not jan_code:
-                errors_400.append(
-                    {
-                        "row": row_index,
-                        "code": "MISSING_JAN",
-                        "jan_code": "",
-                        "field": "jan_code",
-                        "message": "jan_codeは必須です",
-                    }
-                )
-                continue
+        return Response(result.body(), status=self.RESULT_STATUS[result.status])
 
-            try:
-                quantity = int(quantity_raw)
-            except ValueError:
-                errors_400.append(
-                    {
-                        "row": row_index,
-                        "code": "INVALID_QUANTITY_TYPE",
-                        "jan_code": jan_code,
-                        "field": "quantity",
-                        "message": "quantityは整数で指定してください",
-                    }
-                )
-                continue
 
-            if quantity < 0:
-                errors_422.append(
-                    {
-                        "row": row_index,
-                        "code": "INVALID_QUANTITY",
-                        "jan_code": jan_code,
-                        "field": "quantity",
-                        "message": "quantityは0以上の整数で指定してください",
-                    }
-                )
-                continue
+@require_GET
+def restock_import_job(request, job_id):
+    """
+    CSV一括入荷ジョブの進捗・結果API  /restocks/import/jobs/<id>
+    status が DONE になったら result に同期APIと同じ本文（エラーコードも同じ）が入る
+    """
+    job = RestockImportJob.objects.filter(pk=job_id).first()
+    if job is None:
+        return JsonResponse({"error": "job_not_found"}, status=status.HTTP_404_NOT_FOUND)
+    return JsonResponse(import_jobs.status(job), json_dumps_params={"ensure_ascii": False})
 
-            unit_cost = None
-            if unit_cost_raw != "":
-                try:
-                    unit_cost = int(unit_cost_raw)
-                except ValueError:
-                    errors_400.append(
-                        {
-                            "row": row_index,
-                            "code": "INVALID_UNIT_COST_TYPE",
-                            "jan_code": jan_code,
-                            "field": "unit_cost",
-                            "message": "unit_costは整数で指定してください",
-                        }
-                    )
-                    continue
 
-            rows.append(
-                {
-                    "row": row_index,
-                    "jan_code": jan_code,
-                    "quantity": quantity,
-                    "unit_cost": unit_cost,
-                    "name": name,
-                }
-            )
+def _query_flag(request, name: str) -> bool:
+    """
+    ?name=1 / true / yes を True とみなす
+    """
+    return request.query_params.get(name, "").lower() in ("1", "true", "yes")
 
-        if errors_400:
-            return Response(
-                {
-                    "status": "error",
-                    "import": {
-                        "created_count": 0,
-                        "skipped_count": total_rows,
-                    },
-                    "errors": errors_400,
-                },
-                status=status.HTTP_400_BAD_REQUEST,
-            )
 
-        jan_codes = {row["jan_code"] for row in rows}
-        products = Product.objects.filter(jan_code__in=jan_codes)
-        product_map = {product.jan_code: product for product in products}
+class SalesStatsView(APIView):
+    """
+    売上統計API
+    ?granularity=day|week|month &date_from= &date_to= &product= &by_product=1
+    集計済みの DailyProductSales だけを読む（update_sales_rollup コマンドで更新）
+    """
+    PERIODS = {
+        "day": F("date"),
+        "week": TruncWeek("date"),
+        "month": TruncMonth("date"),
+    }
+
+    def get(self, request):
+        serializer = SalesStatsRequestSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+
+        queryset = DailyProductSales.objects.all()
+        if params.get("date_from"):
+            queryset = queryset.filter(date__gte=params["date_from"])
+        if params.get("date_to"):
+            queryset = queryset.filter(date__lte=params["date_to"])
+        if params.get("product"):
+            queryset = queryset.filter(product_id=params["product"])
+
+        keys = ["period"]
+        if params["by_product"]:
+            keys += ["product_id", "product__jan_code", "product__name"]
+
+        rows = (
+            queryset
+            .annotate(period=self.PERIODS[params["granularity"]])
+            .values(*keys)
+            .annotate(
+                units_sold=Sum("units_sold"),
+                revenue=Sum("revenue"),
+                restocked_units=Sum("restocked_units"),
+                restock_cost=Sum("restock_cost"),
+            )
+            .order_by(*keys)
+        )
 
-        unknown_errors = []
+        results = []
         for row in rows:
-            if row["jan_code"] not in product_map:
-                unknown_errors.append(
+            item = {"period": row["period"]}
+            if params["by_product"]:
+                item.update(
                     {
-                        "row": row["row"],
-                        "code": "UNKNOWN_JAN",
-                        "jan_code": row["jan_code"],
-                        "field": "jan_code",
-                        "message": "未登録の商品です。先に商品登録してください",
+                        "product": row["product_id"],
+                        "jan_code": row["product__jan_code"],
+                        "name": row["product__name"],
                     }
                 )
-
-        errors_422.extend(unknown_errors)
-
-        if errors_422:
-            return Response(
+            item.update(
                 {
-                    "status": "error",
-                    "import": {
-                        "created_count": 0,
-                        "skipped_count": total_rows,
-                    },
-                    "errors": errors_422,
-                },
-                status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    "units_sold": row["units_sold"],
+                    "revenue": row["revenue"],
+                    "restocked_units": row["restocked_units"],
+                    "restock_cost": row["restock_cost"],
+                }
             )
-
-        for row in rows:
-            if row["name"]:
-                product = product_map[row["jan_code"]]
-                if row["name"] != product.name:
-                    warnings.append(
-                        {
-                            "row": row["row"],
-                            "code": "NAME_MISMATCH",
-                            "jan_code": row["jan_code"],
-                            "field": "name",
-                            "message": (
-                                f"CSVの商品名とDBの商品名が一致しません（CSV:{row['name']} / DB:{product.name}）"
-                            ),
-                        }
-                    )
-
-        with transaction.atomic():
-            transactions = [
-                StockTransaction(
-                    product=product_map[row["jan_code"]],
-                    transaction_type="RESTOCK",
-                    delta=row["quantity"],
-                    unit_cost=row["unit_cost"],
-                )
-                for row in rows
-            ]
-            StockTransaction.objects.bulk_create(transactions)
+            results.append(item)
 
         return Response(
             {
-                "status": "ok",
-                "import": {
-                    "created_count": len(rows),
-                    "skipped_count": 0,
-                },
-                "warnings": warnings,
+                "granularity": params["granularity"],
+                "rollup_updated_at": rollup_last_run_at(),
+                "results": results,
             },
             status=status.HTTP_200_OK,
         )
@@ -0,0 +1,22 @@
+"""
+SQLite（WAL）用の DB バックエンド（config.settings で SQLITE_PATH を指定したときに使う）
+
+SQLite では select_for_update が何もしないので、在庫行のロックで購入・入荷・取消を並べる
+PostgreSQL と同じ前提が成り立たない。そこで atomic() のトランザクションを BEGIN IMMEDIATE で始め、
+書き込むトランザクションを最初から1つずつにする（読み取りは WAL なので待たない）。
+BEGIN（DEFERRED）のままだと、読んだ後に書こうとした時点で他の書き込みとぶつかり、
+待たずに "database is locked" になる。
+"""
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        # WAL は DB ファイルに記録されるが、新しいファイルでも WAL になるように毎回指定する
+        conn.execute("PRAGMA journal_mode = WAL")
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        # 他の書き込みトランザクションが終わるまでは OPTIONS["timeout"] 秒まで待つ
+        self.cursor().execute("BEGIN IMMEDIATE")
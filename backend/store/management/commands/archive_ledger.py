@@ -0,0 +1,48 @@
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from store.models import StockTransaction
+from store.services import billing, ledger
+from store.services.sales_rollup import update_sales_rollup
+
+
+class Command(BaseCommand):
+    help = "保存期間より古い取引履歴を LedgerArchive に移す（先にロールアップと月次明細を作っておく）"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--keep-days",
+            type=int,
+            default=settings.LEDGER_RETENTION_DAYS,
+            help=f"残す日数（既定 {settings.LEDGER_RETENTION_DAYS}）",
+        )
+        parser.add_argument("--batch-size", type=int, default=ledger.ARCHIVE_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if options["keep_days"] < 1:
+            raise CommandError("--keep-days は 1 以上で指定してください")
+        cutoff = timezone.localtime(timezone.now() - datetime.timedelta(days=options["keep_days"])).replace(
+            hour=0, minute=0, second=0, microsecond=0
+        )
+
+        # 消した後は台帳から作り直せないので、アーカイブ済みでない期間の集計を作り直しておく
+        update_sales_rollup(full=True)
+        oldest = StockTransaction.objects.filter(created_at__lt=cutoff).order_by("created_at").values_list(
+            "created_at", flat=True
+        ).first()
+        if oldest is None:
+            self.stdout.write(f"nothing to archive before {cutoff.isoformat()}")
+            return
+        month = timezone.localtime(oldest).date().replace(day=1)
+        while billing.month_range(month)[0] < cutoff:
+            for _ in billing.statement_chunks(month):
+                pass
+            month = billing.month_range(month)[1].date()
+
+        archives, moved = ledger.archive_before(cutoff, batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(
+            f"archived {moved} transaction(s) before {cutoff.isoformat()} into {archives} archive(s)"
+        ))
@@ -0,0 +1,37 @@
+import datetime
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from store.services import billing
+
+
+class Command(BaseCommand):
+    help = "全利用者の月次請求明細を CSV で出力する（締め済みの月はキャッシュを使う）"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--month", help="対象月 YYYY-MM（省略時は先月）")
+        parser.add_argument("--output", "-o", help="出力先ファイル（省略時は標準出力）")
+        parser.add_argument("--refresh", action="store_true", help="キャッシュを作り直す")
+
+    def handle(self, *args, **options):
+        if options["month"]:
+            try:
+                month = billing.parse_month(options["month"])
+            except ValueError:
+                raise CommandError("--month は YYYY-MM 形式で指定してください")
+        else:
+            this_month = timezone.localdate().replace(day=1)
+            month = (this_month - datetime.timedelta(days=1)).replace(day=1)
+
+        chunks = billing.statement_chunks(month, refresh=options["refresh"])
+        if options["output"]:
+            with open(options["output"], "wb") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+            self.stderr.write(self.style.SUCCESS(f"wrote {options['output']}"))
+        else:
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.flush()
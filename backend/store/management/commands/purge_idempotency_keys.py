@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from store.services.idempotency import purge_expired
+
+
+class Command(BaseCommand):
+    help = "有効期限の切れた Idempotency-Key を削除する（cron で定期実行）"
+
+    def handle(self, *args, **options):
+        deleted = purge_expired()
+        self.stdout.write(self.style.SUCCESS(f"purged idempotency keys: {deleted}"))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from store.services.stock import rebuild_balances
+
+
+class Command(BaseCommand):
+    help = "StockTransaction の履歴から商品ごとの在庫数 (ProductStock) を再計算する"
+
+    def handle(self, *args, **options):
+        changed = rebuild_balances()
+        self.stdout.write(self.style.SUCCESS(f"rebuilt stock balances: {changed} product(s) updated"))
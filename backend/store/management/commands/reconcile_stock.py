@@ -0,0 +1,31 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.services.ledger import LedgerArchivedError
+from store.services.reconcile import CHUNK_SIZE, reconcile
+
+
+class Command(BaseCommand):
+    help = "在庫数 (ProductStock) を取引履歴と突き合わせ、取消の整合性も調べて JSON で出力する（問題があれば終了コード 1）"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=1, help="並列で集計するスレッド数（大きな台帳向け）")
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="並列時に1回で集計する商品数")
+        parser.add_argument("--repair", action="store_true", help="ずれていた在庫数を取引履歴の値に直す")
+        parser.add_argument("--output", "-o", help="レポートの出力先（省略時は標準出力）")
+
+    def handle(self, *args, **options):
+        try:
+            report = reconcile(workers=options["workers"], chunk_size=options["chunk_size"], repair=options["repair"])
+        except LedgerArchivedError:
+            raise CommandError("取引履歴がアーカイブ済みで、在庫の起点になるチェックポイントがありません")
+        text = json.dumps(report, ensure_ascii=False, indent=2, default=str)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as f:
+                f.write(text + "\n")
+        else:
+            self.stdout.write(text)
+        if not report["ok"]:
+            sys.exit(1)
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from store.services.import_jobs import ImportJobWorker
+
+
+class Command(BaseCommand):
+    help = "CSV一括入荷のバックグラウンドジョブ（?async=1）を処理し続けるワーカーを起動する"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="待機中のジョブを1件だけ処理して終了する")
+        parser.add_argument("--poll-interval", type=float, default=5, help="ジョブがない時の確認間隔（秒）")
+
+    def handle(self, *args, **options):
+        worker = ImportJobWorker()
+        if options["once"]:
+            worker.process_once()
+            return
+
+        self.stdout.write("restock import worker started")
+        try:
+            worker.run_forever(poll_interval=options["poll_interval"])
+        except KeyboardInterrupt:
+            worker.stop()
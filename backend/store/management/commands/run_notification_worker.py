@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from store.services.notification.outbox import OutboxWorker
+
+
+class Command(BaseCommand):
+    help = "Discord 通知の outbox を送信し続けるワーカーを起動する"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="送信可能な分を1回だけ処理して終了する")
+        parser.add_argument("--poll-interval", type=float, default=30, help="通知がない時の確認間隔（秒）")
+
+    def handle(self, *args, **options):
+        webhook_url = getattr(settings, "DISCORD_WEBHOOK_URL", None)
+        if not webhook_url:
+            raise CommandError("DISCORD_WEBHOOK_URL is not set")
+
+        worker = OutboxWorker(webhook_url)
+        if options["once"]:
+            worker.process_once()
+            return
+
+        self.stdout.write("notification outbox worker started")
+        try:
+            worker.run_forever(poll_interval=options["poll_interval"])
+        except KeyboardInterrupt:
+            worker.stop()
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from store.services.sales_rollup import update_sales_rollup
+
+
+class Command(BaseCommand):
+    help = "日別・商品別の売上ロールアップ (DailyProductSales) を前回の続きから更新する（cron 用）"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--full", action="store_true", help="全期間を作り直す")
+
+    def handle(self, *args, **options):
+        written = update_sales_rollup(full=options["full"])
+        self.stdout.write(self.style.SUCCESS(f"sales rollup updated: {written} row(s)"))
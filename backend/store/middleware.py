@@ -0,0 +1,48 @@
+# store/middleware.py
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from store.services import metrics
+
+
+class MetricsMiddleware:
+    """
+    ルートごとのレイテンシ・SQL 件数・DB 時間を store.services.metrics に記録する
+    同期・非同期どちらのリクエストでも動く（async ビューを同期に落とさない）
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats, token = metrics.start_request()
+        start = time.perf_counter()
+        response = self.get_response(request)
+        self._finish(request, response, stats, token, start)
+        return response
+
+    async def __acall__(self, request):
+        stats, token = metrics.start_request()
+        start = time.perf_counter()
+        response = await self.get_response(request)
+        self._finish(request, response, stats, token, start)
+        return response
+
+    def _finish(self, request, response, stats, token, start):
+        match = getattr(request, "resolver_match", None)
+        metrics.finish_request(
+            token,
+            stats,
+            method=request.method,
+            route=match.route if match is not None else "unmatched",
+            path=request.path,
+            status=response.status_code,
+            seconds=time.perf_counter() - start,
+        )
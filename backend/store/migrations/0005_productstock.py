@@ -0,0 +1,45 @@
+# Generated by Django 5.0.14 on 2026-10-18 14:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def populate_stock(apps, schema_editor):
+    """
+    既存の StockTransaction から初期在庫数を作る
+    """
+    Product = apps.get_model("store", "Product")
+    ProductStock = apps.get_model("store", "ProductStock")
+    StockTransaction = apps.get_model("store", "StockTransaction")
+
+    totals = {
+        row["product_id"]: row["total"] or 0
+        for row in StockTransaction.objects.values("product_id").annotate(total=Sum("delta")).order_by()
+    }
+    ProductStock.objects.bulk_create(
+        [
+            ProductStock(product_id=product_id, quantity=totals.get(product_id, 0))
+            for product_id in Product.objects.values_list("id", flat=True)
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0004_stocktransaction_unit_cost'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductStock',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stock', serialize=False, to='store.product', verbose_name='商品')),
+                ('quantity', models.IntegerField(default=0, verbose_name='在庫数')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(populate_stock, migrations.RunPython.noop),
+    ]
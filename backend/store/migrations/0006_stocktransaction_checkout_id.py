@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-18 14:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0005_productstock'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stocktransaction',
+            name='checkout_id',
+            field=models.UUIDField(blank=True, db_index=True, help_text='カート購入でまとめて作成された取引に共通のID', null=True, verbose_name='チェックアウトID'),
+        ),
+    ]
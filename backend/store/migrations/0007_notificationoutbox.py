@@ -0,0 +1,31 @@
+# Generated by Django 5.0.14 on 2026-10-18 14:04
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0006_stocktransaction_checkout_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content', models.TextField(verbose_name='本文')),
+                ('username', models.CharField(blank=True, max_length=80, verbose_name='表示名')),
+                ('status', models.CharField(choices=[('PENDING', '送信待ち'), ('SENT', '送信済み'), ('FAILED', '送信失敗')], default='PENDING', max_length=10, verbose_name='状態')),
+                ('attempts', models.IntegerField(default=0, verbose_name='送信試行回数')),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='次回送信日時')),
+                ('last_error', models.TextField(blank=True, verbose_name='最後のエラー')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='作成日時')),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name='送信日時')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='outbox_status_next_idx')],
+            },
+        ),
+    ]
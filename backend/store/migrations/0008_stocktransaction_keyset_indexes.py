@@ -0,0 +1,29 @@
+# Generated by Django 5.0.14 on 2026-10-18 14:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0007_notificationoutbox'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='stocktransaction',
+            index=models.Index(fields=['created_at', 'id'], name='stx_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stocktransaction',
+            index=models.Index(fields=['product', 'created_at', 'id'], name='stx_product_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stocktransaction',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='stx_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stocktransaction',
+            index=models.Index(fields=['transaction_type', 'created_at', 'id'], name='stx_type_created_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.0.14 on 2026-10-18 14:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0008_stocktransaction_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='集計名')),
+                ('last_run_at', models.DateTimeField(blank=True, null=True, verbose_name='最終集計日時')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='stocktransaction',
+            name='unit_price',
+            field=models.IntegerField(blank=True, help_text='購入時点の Product.price', null=True, verbose_name='販売単価'),
+        ),
+        migrations.CreateModel(
+            name='DailyProductSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='日付')),
+                ('units_sold', models.IntegerField(default=0, verbose_name='販売数')),
+                ('revenue', models.IntegerField(default=0, verbose_name='売上')),
+                ('restocked_units', models.IntegerField(default=0, verbose_name='入荷数')),
+                ('restock_cost', models.IntegerField(default=0, verbose_name='仕入額')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='store.product', verbose_name='商品')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='dailyproductsales',
+            constraint=models.UniqueConstraint(fields=('date', 'product'), name='daily_sales_date_product_uniq'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.0.14 on 2026-10-18 14:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0009_sales_rollup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyStatement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='月初日', unique=True, verbose_name='対象月')),
+                ('content', models.TextField(verbose_name='CSV')),
+                ('generated_at', models.DateTimeField(auto_now=True, verbose_name='作成日時')),
+            ],
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.0.14 on 2026-10-18 14:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0010_monthlystatement'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdempotencyKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255, unique=True, verbose_name='キー')),
+                ('fingerprint', models.CharField(max_length=64, verbose_name='リクエストのハッシュ')),
+                ('response_status', models.PositiveSmallIntegerField(verbose_name='ステータスコード')),
+                ('response_body', models.JSONField(verbose_name='レスポンス本文')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='作成日時')),
+                ('expires_at', models.DateTimeField(db_index=True, verbose_name='有効期限')),
+            ],
+        ),
+    ]
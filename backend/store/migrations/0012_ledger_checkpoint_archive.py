@@ -0,0 +1,45 @@
+# Generated by Django 5.0.14 on 2026-10-18 14:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0011_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period_start', models.DateTimeField(verbose_name='最初の取引日時')),
+                ('period_end', models.DateTimeField(verbose_name='最後の取引日時')),
+                ('first_id', models.BigIntegerField(verbose_name='最初の取引ID')),
+                ('last_id', models.BigIntegerField(verbose_name='最後の取引ID')),
+                ('row_count', models.IntegerField(verbose_name='件数')),
+                ('columns', models.JSONField(verbose_name='列名')),
+                ('data', models.BinaryField(verbose_name='NDJSON (zlib)')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='作成日時')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['period_start'], name='ledger_archive_start_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('as_of', models.DateTimeField(verbose_name='時点')),
+                ('quantity', models.IntegerField(verbose_name='在庫数')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='作成日時')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='checkpoints', to='store.product', verbose_name='商品')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='stockcheckpoint',
+            constraint=models.UniqueConstraint(fields=('as_of', 'product'), name='checkpoint_as_of_product_uniq'),
+        ),
+    ]
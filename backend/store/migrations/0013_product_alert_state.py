@@ -0,0 +1,43 @@
+# Generated by Django 5.0.14 on 2026-10-18 14:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import F
+
+
+def populate_alert_state(apps, schema_editor):
+    """
+    すでに閾値以下の商品は通知済みとして始める（移行直後の購入で一斉に通知しない）
+    """
+    Product = apps.get_model("store", "Product")
+    ProductAlertState = apps.get_model("store", "ProductAlertState")
+
+    low = Product.objects.filter(stock__quantity__lte=F("alert_threshold")).values_list("id", flat=True)
+    ProductAlertState.objects.bulk_create(
+        [ProductAlertState(product_id=product_id, is_low=True) for product_id in low],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0012_ledger_checkpoint_archive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductAlertState',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='alert_state', serialize=False, to='store.product', verbose_name='商品')),
+                ('is_low', models.BooleanField(default=False, verbose_name='通知済み（閾値以下）')),
+                ('changed_at', models.DateTimeField(auto_now=True, verbose_name='状態が変わった日時')),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='alert_threshold',
+            field=models.IntegerField(default=3, help_text='在庫がこの数以下になったら通知', verbose_name='通知閾値'),
+        ),
+        migrations.RunPython(populate_alert_state, migrations.RunPython.noop),
+    ]
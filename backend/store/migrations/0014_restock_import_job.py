@@ -0,0 +1,39 @@
+# Generated by Django 5.0.14 on 2026-10-18 14:36
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0013_product_alert_state'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RestockImportJob',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('filename', models.CharField(blank=True, max_length=255, verbose_name='ファイル名')),
+                ('content', models.BinaryField(verbose_name='CSV')),
+                ('dry_run', models.BooleanField(default=False)),
+                ('merge', models.BooleanField(default=False)),
+                ('status', models.CharField(choices=[('PENDING', '待機中'), ('RUNNING', '処理中'), ('DONE', '完了'), ('FAILED', '失敗')], default='PENDING', max_length=10, verbose_name='状態')),
+                ('phase', models.CharField(blank=True, max_length=20, verbose_name='処理段階')),
+                ('rows_processed', models.IntegerField(default=0, verbose_name='処理済み行数')),
+                ('total_rows', models.IntegerField(blank=True, null=True, verbose_name='行数')),
+                ('result_status', models.CharField(blank=True, max_length=20, verbose_name='結果')),
+                ('result', models.JSONField(blank=True, null=True, verbose_name='結果本文')),
+                ('attempts', models.IntegerField(default=0, verbose_name='試行回数')),
+                ('last_error', models.TextField(blank=True, verbose_name='最後のエラー')),
+                ('lease_until', models.DateTimeField(blank=True, null=True, verbose_name='処理中の期限')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='作成日時')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='開始日時')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='終了日時')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'created_at'], name='import_job_status_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.14 on 2026-10-18 14:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0014_restock_import_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stocktransaction',
+            name='import_id',
+            field=models.UUIDField(blank=True, db_index=True, help_text='CSV一括入荷でまとめて作成された取引に共通のID', null=True, verbose_name='一括入荷ID'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.0.14 on 2026-10-18 14:55
+
+from pathlib import Path
+
+from django.conf import settings
+from django.db import migrations
+
+
+def spool_unfinished_jobs(apps, schema_editor):
+    """
+    まだ処理していないジョブの CSV をスプールファイルに書き出してから content 列を消す
+    """
+    RestockImportJob = apps.get_model("store", "RestockImportJob")
+    spool_dir = Path(settings.RESTOCK_IMPORT_SPOOL_DIR)
+    for job_id in RestockImportJob.objects.filter(status__in=["PENDING", "RUNNING"]).values_list("id", flat=True):
+        content = RestockImportJob.objects.filter(pk=job_id).values_list("content", flat=True).get()
+        spool_dir.mkdir(parents=True, exist_ok=True)
+        (spool_dir / f"{job_id}.csv").write_bytes(bytes(content))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0015_stocktransaction_import_id'),
+    ]
+
+    operations = [
+        migrations.RunPython(spool_unfinished_jobs, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='restockimportjob',
+            name='content',
+        ),
+    ]
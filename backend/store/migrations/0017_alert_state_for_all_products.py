@@ -0,0 +1,35 @@
+# Generated by Django 5.0.14 on 2026-10-18 16:10
+
+from django.db import migrations
+from django.db.models.functions import Coalesce
+
+
+def create_missing_alert_states(apps, schema_editor):
+    """
+    0013 で作らなかった（閾値より上だった）商品と、その後に作った商品の状態行を今の在庫で作る（通知はしない）
+    """
+    Product = apps.get_model("store", "Product")
+    ProductAlertState = apps.get_model("store", "ProductAlertState")
+
+    rows = (
+        Product.objects
+        .filter(alert_state__isnull=True)
+        .annotate(quantity=Coalesce("stock__quantity", 0))
+        .values_list("id", "quantity", "alert_threshold")
+    )
+    ProductAlertState.objects.bulk_create(
+        [ProductAlertState(product_id=product_id, is_low=quantity <= threshold) for product_id, quantity, threshold in rows],
+        batch_size=500,
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0016_restock_import_job_spool'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_missing_alert_states, migrations.RunPython.noop),
+    ]
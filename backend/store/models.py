@@ -1,5 +1,8 @@
+import uuid
+
 from django.db import models
-from django.db.models import Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 
 class User(models.Model):
     """
@@ -14,6 +17,20 @@ class User(models.Model):
         return f"{self.name} ({self.student_id})"
 
 
+class ProductQuerySet(models.QuerySet):
+    def with_stock(self):
+        """
+        現在在庫を stock_quantity として JOIN で付ける（商品ごとのクエリを出さない）
+        """
+        return self.annotate(stock_quantity=Coalesce("stock__quantity", 0))
+
+    def low_stock(self):
+        """
+        在庫が通知閾値 (alert_threshold) 以下の商品
+        """
+        return self.with_stock().filter(stock_quantity__lte=models.F("alert_threshold"))
+
+
 class Product(models.Model):
     """
     商品モデル
@@ -22,23 +39,27 @@ class Product(models.Model):
     name = models.CharField("商品名", max_length=200)
     price = models.IntegerField("単価")
     image_url = models.URLField("商品画像URL", blank=True, null=True)
-    alert_threshold = models.IntegerField("通知閾値", default=3, help_text="在庫がこの数を下回ったら通知")
+    alert_threshold = models.IntegerField("通知閾値", default=3, help_text="在庫がこの数以下になったら通知")
     
     updated_at = models.DateTimeField(auto_now=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = ProductQuerySet.as_manager()
+
     def __str__(self):
         return self.name
 
     @property
     def current_stock(self):
         """
-        現在の在庫数を計算して返すプロパティ
-        すべてのトランザクションの delta を合計する
+        現在の在庫数を返すプロパティ
+        ProductStock に保持している合計値を読むだけなので O(1)
         """
-        # aggregateは {'delta__sum': 10} のような辞書を返す
-        result = self.transactions.aggregate(Sum('delta'))
-        return result['delta__sum'] or 0
+        try:
+            return self.stock.quantity
+        except ProductStock.DoesNotExist:
+            # まだ一度も入出庫がない商品
+            return 0
 
 
 class StockTransaction(models.Model):
@@ -66,9 +87,237 @@ class StockTransaction(models.Model):
     transaction_type = models.CharField("変動タイプ", max_length=20, choices=TYPE_CHOICES)
     delta = models.IntegerField("変動数", help_text="購入ならマイナス、入荷ならプラスの値")
     unit_cost = models.IntegerField("仕入単価", null=True, blank=True)
+    unit_price = models.IntegerField("販売単価", null=True, blank=True, help_text="購入時点の Product.price")
     
     description = models.CharField("備考", max_length=200, blank=True)
+    checkout_id = models.UUIDField("チェックアウトID", null=True, blank=True, db_index=True, help_text="カート購入でまとめて作成された取引に共通のID")
+    import_id = models.UUIDField("一括入荷ID", null=True, blank=True, db_index=True, help_text="CSV一括入荷でまとめて作成された取引に共通のID")
     created_at = models.DateTimeField("日時", auto_now_add=True, db_index=True)
 
+    class Meta:
+        # 取引一覧のキーセットページネーション (created_at, id) と絞り込み用
+        indexes = [
+            models.Index(fields=["created_at", "id"], name="stx_created_id_idx"),
+            models.Index(fields=["product", "created_at", "id"], name="stx_product_created_idx"),
+            models.Index(fields=["user", "created_at", "id"], name="stx_user_created_idx"),
+            models.Index(fields=["transaction_type", "created_at", "id"], name="stx_type_created_idx"),
+        ]
+
     def __str__(self):
         return f"{self.product.name}: {self.delta} ({self.get_transaction_type_display()})"
+
+
+class ProductStock(models.Model):
+    """
+    商品ごとの現在在庫数
+    StockTransaction の delta 合計を保持するキャッシュ。
+    トランザクションを作成したら同じDBトランザクション内で
+    store.services.stock.apply_deltas で更新する。
+    """
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="stock",
+        verbose_name="商品",
+    )
+    quantity = models.IntegerField("在庫数", default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.product_id}: {self.quantity}"
+
+
+class ProductAlertState(models.Model):
+    """
+    商品ごとの在庫低下通知の状態
+    在庫が alert_threshold 以下に下がったときに1回だけ通知して is_low にし、
+    閾値を上回ったら（入荷など）解除して次の低下で再び通知する。
+    store.services.stock_alerts.evaluate が在庫更新と同じトランザクションで更新する。
+    """
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="alert_state",
+        verbose_name="商品",
+    )
+    is_low = models.BooleanField("通知済み（閾値以下）", default=False)
+    changed_at = models.DateTimeField("状態が変わった日時", auto_now=True)
+
+    def __str__(self):
+        return f"{self.product_id}: {'low' if self.is_low else 'ok'}"
+
+
+class NotificationOutbox(models.Model):
+    """
+    Discord 通知の送信待ちキュー
+    購入などと同じトランザクションで積み、バックグラウンドのワーカーが送信する。
+    """
+    STATUS_CHOICES = (
+        ('PENDING', '送信待ち'),
+        ('SENT', '送信済み'),
+        ('FAILED', '送信失敗'),  # リトライ上限に達したもの
+    )
+
+    content = models.TextField("本文")
+    username = models.CharField("表示名", max_length=80, blank=True)
+    status = models.CharField("状態", max_length=10, choices=STATUS_CHOICES, default='PENDING')
+    attempts = models.IntegerField("送信試行回数", default=0)
+    next_attempt_at = models.DateTimeField("次回送信日時", default=timezone.now)
+    last_error = models.TextField("最後のエラー", blank=True)
+    created_at = models.DateTimeField("作成日時", auto_now_add=True)
+    sent_at = models.DateTimeField("送信日時", null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"], name="outbox_status_next_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.get_status_display()}: {self.content[:30]}"
+
+
+class DailyProductSales(models.Model):
+    """
+    日別・商品別の売上/入荷の集計（ロールアップ）
+    store.services.sales_rollup で StockTransaction から更新する。
+    """
+    date = models.DateField("日付")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="daily_sales", verbose_name="商品")
+    units_sold = models.IntegerField("販売数", default=0)
+    revenue = models.IntegerField("売上", default=0)
+    restocked_units = models.IntegerField("入荷数", default=0)
+    restock_cost = models.IntegerField("仕入額", default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["date", "product"], name="daily_sales_date_product_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.product_id}: {self.units_sold}"
+
+
+class RollupState(models.Model):
+    """
+    集計処理ごとの進捗（どこまで集計したか）
+    """
+    name = models.CharField("集計名", max_length=50, unique=True)
+    last_run_at = models.DateTimeField("最終集計日時", null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.name}: {self.last_run_at}"
+
+
+class MonthlyStatement(models.Model):
+    """
+    締め済みの月の請求明細CSV（過去月は台帳を読み直さずにこれを返す）
+    """
+    month = models.DateField("対象月", unique=True, help_text="月初日")
+    content = models.TextField("CSV")
+    generated_at = models.DateTimeField("作成日時", auto_now=True)
+
+    def __str__(self):
+        return self.month.strftime("%Y-%m")
+
+
+class IdempotencyKey(models.Model):
+    """
+    Idempotency-Key ヘッダ付きリクエストの処理結果
+    同じキーで再送されたら、処理をやり直さずに保存したレスポンスを返す。
+    """
+    key = models.CharField("キー", max_length=255, unique=True)
+    fingerprint = models.CharField("リクエストのハッシュ", max_length=64)
+    response_status = models.PositiveSmallIntegerField("ステータスコード")
+    response_body = models.JSONField("レスポンス本文")
+    created_at = models.DateTimeField("作成日時", auto_now_add=True)
+    expires_at = models.DateTimeField("有効期限", db_index=True)
+
+    def __str__(self):
+        return f"{self.key}: {self.response_status}"
+
+
+class StockCheckpoint(models.Model):
+    """
+    ある時点での商品ごとの在庫数（その時刻より前の delta の合計）
+    在庫の再計算・過去時点の在庫は「直近のチェックポイント + それ以降の delta」で求める。
+    store.services.ledger.create_checkpoint で全商品分をまとめて作る。
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="checkpoints", verbose_name="商品")
+    as_of = models.DateTimeField("時点")
+    quantity = models.IntegerField("在庫数")
+    created_at = models.DateTimeField("作成日時", auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["as_of", "product"], name="checkpoint_as_of_product_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.as_of:%Y-%m-%d %H:%M} {self.product_id}: {self.quantity}"
+
+
+class LedgerArchive(models.Model):
+    """
+    保存期間を過ぎて StockTransaction から移した取引（NDJSON を zlib 圧縮して保持）
+    DB 内に置くので、pg_dump のバックアップにそのまま含まれる。
+    """
+    period_start = models.DateTimeField("最初の取引日時")
+    period_end = models.DateTimeField("最後の取引日時")
+    first_id = models.BigIntegerField("最初の取引ID")
+    last_id = models.BigIntegerField("最後の取引ID")
+    row_count = models.IntegerField("件数")
+    columns = models.JSONField("列名")
+    data = models.BinaryField("NDJSON (zlib)")
+    created_at = models.DateTimeField("作成日時", auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["period_start"], name="ledger_archive_start_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.period_start:%Y-%m-%d} - {self.period_end:%Y-%m-%d} ({self.row_count})"
+
+
+class RestockImportJob(models.Model):
+    """
+    CSV一括入荷のバックグラウンドジョブ（POST /api/restocks/import?async=1）
+    アップロードされた CSV はスプールファイル（RESTOCK_IMPORT_SPOOL_DIR/<id>.csv）に置き、
+    ワーカー（store.services.import_jobs）がジョブを取り出して処理する。
+    結果 (result) は同期APIのレスポンス本文と同じ形。
+    """
+    STATUS_CHOICES = (
+        ('PENDING', '待機中'),
+        ('RUNNING', '処理中'),
+        ('DONE', '完了'),      # 検証エラーで取り込まなかった場合も含む（result を見る）
+        ('FAILED', '失敗'),    # 例外で中断したもの
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    filename = models.CharField("ファイル名", max_length=255, blank=True)
+    dry_run = models.BooleanField(default=False)
+    merge = models.BooleanField(default=False)
+
+    status = models.CharField("状態", max_length=10, choices=STATUS_CHOICES, default='PENDING')
+    phase = models.CharField("処理段階", max_length=20, blank=True)  # validating / writing
+    rows_processed = models.IntegerField("処理済み行数", default=0)
+    total_rows = models.IntegerField("行数", null=True, blank=True)  # 検証が終わるまでは不明
+    result_status = models.CharField("結果", max_length=20, blank=True)  # ok / invalid / unprocessable
+    result = models.JSONField("結果本文", null=True, blank=True)
+    attempts = models.IntegerField("試行回数", default=0)
+    last_error = models.TextField("最後のエラー", blank=True)
+    lease_until = models.DateTimeField("処理中の期限", null=True, blank=True)  # 過ぎたらワーカーが落ちたとみなす
+
+    created_at = models.DateTimeField("作成日時", auto_now_add=True)
+    started_at = models.DateTimeField("開始日時", null=True, blank=True)
+    finished_at = models.DateTimeField("終了日時", null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "created_at"], name="import_job_status_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.filename or self.id}: {self.get_status_display()}"
@@ -0,0 +1,33 @@
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+# これより少ない行数なら見積もりではなく正確に数える
+ESTIMATE_MIN_ROWS = 10000
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    絞り込みなしの件数を PostgreSQL の統計情報 (pg_class.reltuples) で見積もる Paginator
+    大きな台帳に対する SELECT COUNT(*) の全件スキャンを避ける（管理画面用）
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        query = getattr(queryset, "query", None)
+        if query is not None and not query.where:
+            estimate = _estimated_rows(queryset.db, queryset.model._meta.db_table)
+            if estimate is not None and estimate >= ESTIMATE_MIN_ROWS:
+                return estimate
+        return super().count
+
+
+def _estimated_rows(alias, table):
+    connection = connections[alias]
+    if connection.vendor != "postgresql":
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [table])
+        row = cursor.fetchone()
+    return int(row[0]) if row and row[0] is not None else None
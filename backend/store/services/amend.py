@@ -0,0 +1,89 @@
+# store/services/amend.py
+"""
+取引の取消（CORRECTION で打ち消す）
+
+POST /api/transactions/<id>/amend（1件）と POST /api/transactions/amend-bulk
+（取引IDの並び / checkout_id / import_id でまとめて）の両方から使う。
+
+- 取消対象の行を主キー順にロックして読む（1クエリ）
+- 取消済みかどうかは amended_of のインデックスで1クエリで確かめる（ロック後に読むので、同時の取消とも重ならない）
+- 1件でも取り消せないものがあれば全体を失敗にし、CORRECTION は bulk_create でまとめて作る
+"""
+from __future__ import annotations
+
+import uuid
+from typing import Iterable, List, Optional
+
+from django.db import transaction
+
+from store.models import StockTransaction
+from store.services.stock import apply_transactions
+
+
+class AmendError(Exception):
+    """
+    API層はこれを捕まえてHTTPのエラーに変換する。ids は原因になった取引ID
+    """
+    def __init__(self, error_code: str, *, ids: Optional[List[int]] = None):
+        self.code = error_code
+        self.ids = ids or []
+        super().__init__(error_code)
+
+
+@transaction.atomic
+def amend_transactions(
+    *,
+    ids: Optional[Iterable[int]] = None,
+    checkout_id: Optional[uuid.UUID] = None,
+    import_id: Optional[uuid.UUID] = None,
+) -> List[StockTransaction]:
+    """
+    ids / checkout_id / import_id のどれか1つで指定した取引を取り消し、作成した CORRECTION を返す
+    """
+    targets = StockTransaction.objects.select_for_update().order_by("id")
+    if ids is not None:
+        ids = sorted(set(ids))
+        targets = targets.filter(id__in=ids)
+    elif checkout_id is not None:
+        targets = targets.filter(checkout_id=checkout_id)
+    elif import_id is not None:
+        targets = targets.filter(import_id=import_id)
+    else:
+        raise ValueError("ids, checkout_id or import_id is required")
+
+    targets = list(targets)
+    if not targets:
+        raise AmendError("transaction_not_found", ids=ids)
+    if ids is not None and len(targets) != len(ids):
+        found = {tx.id for tx in targets}
+        raise AmendError("transaction_not_found", ids=[pk for pk in ids if pk not in found])
+
+    corrections = [tx.id for tx in targets if tx.transaction_type == "CORRECTION"]
+    if corrections:
+        raise AmendError("cannot_amend_correction", ids=corrections)
+
+    amended = sorted(
+        StockTransaction.objects
+        .filter(amended_of_id__in=[tx.id for tx in targets])
+        .values_list("amended_of_id", flat=True)
+        .distinct()
+    )
+    if amended:
+        raise AmendError("already_amended", ids=amended)
+
+    amends = [
+        StockTransaction(
+            product_id=tx.product_id,
+            user_id=tx.user_id,
+            transaction_type="CORRECTION",
+            delta=-tx.delta,
+            unit_cost=tx.unit_cost,
+            unit_price=tx.unit_price,
+            description=f"amend of {tx.id}",
+            amended_of=tx,
+        )
+        for tx in targets
+    ]
+    StockTransaction.objects.bulk_create(amends)
+    apply_transactions(amends)
+    return amends
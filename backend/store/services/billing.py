@@ -0,0 +1,148 @@
+# store/services/billing.py
+"""
+月次請求明細
+
+その月の購入（と購入の取消）を (利用者, 商品, 単価) で1回だけ GROUP BY して全員分の明細を作る。
+締め済みの月は MonthlyStatement に CSV を保存し、以降は台帳を読まない。
+締め済みの月の取引を後から変えた・消した場合（管理画面など）は invalidate でその月の保存を捨て、
+次の要求で作り直す。
+"""
+from __future__ import annotations
+
+import csv
+import datetime
+import io
+from typing import Iterable, Iterator, Tuple
+
+from django.db.models import F, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from store.models import MonthlyStatement, StockTransaction
+from store.services.ledger import CHECKPOINT_LAG, archived_until
+from store.services.sales_rollup import SALE
+
+CSV_HEADER = ["student_id", "name", "jan_code", "product_name", "unit_price", "quantity", "amount"]
+CHUNK_SIZE = 64 * 1024  # レスポンスに書き出す単位（文字数）
+
+
+def parse_month(value: str) -> datetime.date:
+    """
+    'YYYY-MM' を月初日にする。不正なら ValueError
+    """
+    return datetime.datetime.strptime(value, "%Y-%m").date().replace(day=1)
+
+
+def month_range(month: datetime.date) -> Tuple[datetime.datetime, datetime.datetime]:
+    """
+    月初 0:00 から翌月初 0:00 まで（TIME_ZONE 基準）
+    """
+    start = timezone.make_aware(datetime.datetime.combine(month, datetime.time.min))
+    next_month = (month.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+    end = timezone.make_aware(datetime.datetime.combine(next_month, datetime.time.min))
+    return start, end
+
+
+def is_closed(month: datetime.date) -> bool:
+    """
+    月末から CHECKPOINT_LAG たったら締め済み（月末直前に INSERT して月をまたいでコミットした取引を取りこぼさない）
+    """
+    _, end = month_range(month)
+    return end + CHECKPOINT_LAG <= timezone.now()
+
+
+def invalidate(created_ats: Iterable[datetime.datetime]) -> None:
+    """
+    取引の created_at を受け取り、締め済みの月なら保存した明細を捨てる（次の要求で台帳から作り直す）。
+    アーカイブ済みの月は作り直すと明細が欠けるので残す
+    """
+    months = {timezone.localtime(created_at).date().replace(day=1) for created_at in created_ats if created_at}
+    months = [month for month in months if is_closed(month) and not _is_archived(month)]
+    if months:
+        MonthlyStatement.objects.filter(month__in=months).delete()
+
+
+def statement_chunks(month: datetime.date, *, refresh: bool = False) -> Iterator[bytes]:
+    """
+    月次明細 CSV をバイト列のチャンクで返す。
+    締め済みの月はキャッシュ (MonthlyStatement) を使い、なければ作って保存する。
+    当月はキャッシュせずにそのまま流す。
+    """
+    if not is_closed(month):
+        yield from _encode(_generate_csv(month))
+        return
+
+    if refresh and _is_archived(month):
+        refresh = False  # 台帳がアーカイブ済みなので作り直すと明細が欠ける
+    cached = None if refresh else MonthlyStatement.objects.filter(month=month).values_list("content", flat=True).first()
+    if cached is None:
+        cached = "".join(_generate_csv(month))
+        MonthlyStatement.objects.update_or_create(month=month, defaults={"content": cached})
+
+    for start in range(0, len(cached), CHUNK_SIZE):
+        yield cached[start:start + CHUNK_SIZE].encode("utf-8")
+
+
+def _is_archived(month: datetime.date) -> bool:
+    until = archived_until()
+    return until is not None and month_range(month)[0] <= until
+
+
+def _generate_csv(month: datetime.date) -> Iterator[str]:
+    """
+    利用者ごとに明細行と合計行を出す
+    """
+    start, end = month_range(month)
+    rows = (
+        StockTransaction.objects
+        .filter(SALE, created_at__gte=start, created_at__lt=end, user__isnull=False)
+        .values("user_id", "user__student_id", "user__name", "product__jan_code", "product__name")
+        .annotate(
+            price=Coalesce("unit_price", "product__price"),
+            quantity=Sum(-F("delta")),
+        )
+        .order_by("user__student_id", "user_id", "product__jan_code", "price")
+        .iterator(chunk_size=2000)
+    )
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_HEADER)
+
+    current_user = None
+    total = 0
+    for row in rows:
+        if not row["quantity"]:
+            # 購入して全部取り消した商品は出さない
+            continue
+        if current_user is not None and row["user_id"] != current_user[0]:
+            writer.writerow([current_user[1], current_user[2], "", "合計", "", "", total])
+            total = 0
+        current_user = (row["user_id"], row["user__student_id"], row["user__name"])
+
+        amount = row["price"] * row["quantity"]
+        total += amount
+        writer.writerow(
+            [
+                row["user__student_id"],
+                row["user__name"],
+                row["product__jan_code"],
+                row["product__name"],
+                row["price"],
+                row["quantity"],
+                amount,
+            ]
+        )
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    if current_user is not None:
+        writer.writerow([current_user[1], current_user[2], "", "合計", "", "", total])
+    yield buffer.getvalue()
+
+
+def _encode(chunks: Iterator[str]) -> Iterator[bytes]:
+    for chunk in chunks:
+        yield chunk.encode("utf-8")
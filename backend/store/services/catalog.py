@@ -0,0 +1,173 @@
+# store/services/catalog.py
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+
+from store.models import Product
+
+# プロセス内キャッシュ。
+# 同じプロセスでの変更はシグナルで invalidate するが、別プロセス（管理画面・run_import_worker・
+# rebuild_stock など）での変更は届かないので、CATALOG_CACHE_TTL 秒たったら作り直す。
+# ETag は一覧の内容のハッシュなので、作り直して中身が同じなら 304 のまま、変わっていれば新しい ETag になる。
+
+_lock = threading.Lock()
+_version = 1
+_tag: Optional[str] = None
+_list_body: Optional[bytes] = None
+_detail_bodies: Dict[str, bytes] = {}
+_built_at = 0.0
+_hits = 0
+_misses = 0
+
+
+def etag() -> Optional[str]:
+    """
+    キャッシュ中のカタログの ETag（キャッシュがない・期限切れなら None）
+    """
+    with _lock:
+        return _tag if _fresh() else None
+
+
+def stats() -> Dict[str, int]:
+    with _lock:
+        return {
+            "version": _version,
+            "hits": _hits,
+            "misses": _misses,
+            "products": len(_detail_bodies) if _fresh() else 0,
+        }
+
+
+def invalidate() -> None:
+    """
+    キャッシュを破棄して版数を進める
+    """
+    global _version, _tag, _list_body, _detail_bodies
+    with _lock:
+        _version += 1
+        _tag = None
+        _list_body = None
+        _detail_bodies = {}
+
+
+def invalidate_on_commit() -> None:
+    """
+    トランザクション確定後に invalidate する。
+    コミット前に破棄すると、別リクエストが古い内容で作り直してしまうため。
+    """
+    transaction.on_commit(invalidate)
+
+
+def get_catalog() -> Tuple[str, bytes]:
+    """
+    全商品の JSON と ETag を返す。キャッシュがあれば DB に触らない。
+    """
+    tag, body, _ = _snapshot()
+    return tag, body
+
+
+def get_product(jan_code: str) -> Tuple[str, Optional[bytes]]:
+    """
+    1商品の JSON と ETag を返す。未登録なら body は None。
+    """
+    tag, _, details = _snapshot()
+    return tag, details.get(jan_code)
+
+
+def _snapshot() -> Tuple[str, bytes, Dict[str, bytes]]:
+    cached = _cached()
+    if cached[1] is not None:
+        return cached
+    return _build(cached[0], _rows_to_items(_catalog_rows()))
+
+
+async def aget_catalog() -> Tuple[str, bytes]:
+    """
+    get_catalog の async 版（キャッシュミス時は async ORM で読む）
+    """
+    tag, body, _ = await _asnapshot()
+    return tag, body
+
+
+async def aget_product(jan_code: str) -> Tuple[str, Optional[bytes]]:
+    tag, _, details = await _asnapshot()
+    return tag, details.get(jan_code)
+
+
+async def _asnapshot() -> Tuple[str, bytes, Dict[str, bytes]]:
+    cached = _cached()
+    if cached[1] is not None:
+        return cached
+    rows = [row async for row in _catalog_rows()]
+    return _build(cached[0], _rows_to_items(rows))
+
+
+def _cached():
+    """
+    期限内のキャッシュがあれば (ETag, 一覧, 詳細)、なければ (現在の版数, None, None)
+    """
+    global _hits, _misses
+    with _lock:
+        if _fresh():
+            _hits += 1
+            return _tag, _list_body, _detail_bodies
+        _misses += 1
+        return _version, None, None
+
+
+def _fresh() -> bool:
+    # _lock を持った状態で呼ぶ
+    return _list_body is not None and time.monotonic() - _built_at < getattr(settings, "CATALOG_CACHE_TTL", 10)
+
+
+def _build(version: int, items: list) -> Tuple[str, bytes, Dict[str, bytes]]:
+    body = _dumps(items)
+    details = {item["jan_code"]: _dumps(item) for item in items}
+    tag = f'"catalog-{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+    _store(version, tag, body, details)
+    return tag, body, details
+
+
+def _store(version: int, tag: str, body: bytes, details: Dict[str, bytes]) -> None:
+    global _tag, _list_body, _detail_bodies, _built_at
+    with _lock:
+        # 作成中に invalidate された場合は古い内容なので保存しない
+        if version == _version:
+            _tag = tag
+            _list_body = body
+            _detail_bodies = details
+            _built_at = time.monotonic()
+
+
+def _catalog_rows():
+    return (
+        Product.objects
+        .with_stock()
+        .order_by("id")
+        .values("jan_code", "name", "price", "image_url", "alert_threshold", "stock_quantity")
+    )
+
+
+def _rows_to_items(rows) -> list:
+    return [
+        {
+            "jan_code": row["jan_code"],
+            "name": row["name"],
+            "price": row["price"],
+            "image_url": row["image_url"],
+            "alert_threshold": row["alert_threshold"],
+            "stock": row["stock_quantity"],
+        }
+        for row in rows
+    ]
+
+
+def _dumps(data) -> bytes:
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
@@ -0,0 +1,107 @@
+# store/services/idempotency.py
+"""
+Idempotency-Key による二重実行の防止
+
+処理とキーの保存を同じトランザクションで行うので、「処理したのにキーがない」「キーだけある」は起きない。
+キーは処理の後に INSERT する（通常の購入で増えるのは1文だけ）。同じキーが同時に来た場合は
+後から来た方の INSERT が一意制約で失敗するので、その処理を丸ごと巻き戻して保存済みの結果を返す。
+"""
+from __future__ import annotations
+
+import datetime
+import hashlib
+import json
+from dataclasses import dataclass
+from typing import Callable, Tuple
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from store.models import IdempotencyKey
+
+MAX_KEY_LENGTH = 255
+
+
+class IdempotencyError(Exception):
+    """
+    キーが不正・別のリクエストに使い回されたなど
+    """
+    def __init__(self, error_code: str):
+        self.code = error_code
+        super().__init__(error_code)
+
+
+@dataclass(frozen=True)
+class IdempotentResult:
+    status: int
+    body: dict
+    replayed: bool
+
+
+class _Duplicate(Exception):
+    """
+    キーの INSERT が一意制約に当たった（処理を巻き戻すために投げる）
+    """
+
+
+def fingerprint(kind: str, data) -> str:
+    """
+    リクエストの同一性チェック用ハッシュ（kind は "purchase" などの処理の種類）
+    """
+    raw = json.dumps([kind, data], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def run_once(key: str, request_hash: str, handler: Callable[[], Tuple[int, dict]]) -> IdempotentResult:
+    """
+    key が未使用なら handler() を実行して結果を保存する。使用済みなら保存した結果を返す。
+    handler は (ステータスコード, 本文) を返す。5xx は保存しない（再送でやり直せるように）
+    """
+    if not key or len(key) > MAX_KEY_LENGTH:
+        raise IdempotencyError("invalid_idempotency_key")
+
+    for _ in range(2):
+        try:
+            return _execute(key, request_hash, handler)
+        except _Duplicate:
+            pass
+
+        stored = IdempotencyKey.objects.filter(key=key).first()
+        if stored is None:
+            # 先に処理していた方が巻き戻った
+            continue
+        if stored.expires_at <= timezone.now():
+            # 期限切れのキーは使い直せる
+            stored.delete()
+            continue
+        if stored.fingerprint != request_hash:
+            raise IdempotencyError("idempotency_key_reused")
+        return IdempotentResult(status=stored.response_status, body=stored.response_body, replayed=True)
+
+    raise IdempotencyError("idempotency_key_conflict")
+
+
+def purge_expired(now=None) -> int:
+    deleted, _ = IdempotencyKey.objects.filter(expires_at__lte=now or timezone.now()).delete()
+    return deleted
+
+
+def _execute(key: str, request_hash: str, handler) -> IdempotentResult:
+    with transaction.atomic():
+        status, body = handler()
+        if status >= 500:
+            return IdempotentResult(status=status, body=body, replayed=False)
+        try:
+            with transaction.atomic():
+                IdempotencyKey.objects.create(
+                    key=key,
+                    fingerprint=request_hash,
+                    response_status=status,
+                    response_body=body,
+                    expires_at=timezone.now() + datetime.timedelta(hours=settings.IDEMPOTENCY_KEY_TTL_HOURS),
+                )
+        except IntegrityError:
+            # 外側の atomic を抜けて handler の書き込みも巻き戻す
+            raise _Duplicate()
+    return IdempotentResult(status=status, body=body, replayed=False)
@@ -0,0 +1,339 @@
+# store/services/import_jobs.py
+"""
+CSV一括入荷のバックグラウンドジョブ（RestockImportJob）
+
+- enqueue() はアップロードされた CSV をスプールファイル（RESTOCK_IMPORT_SPOOL_DIR/<ジョブID>.csv）に
+  チャンクごとに書き、RestockImportJob を作るだけ（HTTP は 202 ですぐ返す）。CSV 全体をメモリに持たない
+- ImportJobWorker が PENDING のジョブを1件ずつ取り出し、スプールファイルをストリームで import_restock_csv に渡す
+  - プロセス内スレッド（RESTOCK_IMPORT_IN_PROCESS_WORKER。Web プロセスの起動時に始める）か
+    run_import_worker コマンドで動かす
+  - スプールファイルは完了・失敗したら消す
+  - 取り込みは1トランザクションなので、進捗は別スレッド（別接続）から PROGRESS_INTERVAL ごとに書く
+  - 処理中に落ちたジョブは lease_until を過ぎたら別のワーカーがやり直す（MAX_ATTEMPTS まで）
+  - lease の延長は別接続なので、SQLite では取り込みの書き込み中に失敗して lease が切れることがある。
+    完了（DONE）は取り込みと同じトランザクションで、取り出したときの attempts のままの場合だけ書くので、
+    やり直された古い方の取り込みは巻き戻り、同じ CSV が二重に入荷されることはない
+"""
+from __future__ import annotations
+
+import logging
+import os
+import shutil
+import threading
+import uuid
+from datetime import timedelta
+from pathlib import Path
+from typing import Optional
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from store.models import RestockImportJob
+from store.services.restock_import import ImportFormatError, import_restock_csv
+
+logger = logging.getLogger(__name__)
+
+LEASE_SECONDS = 300
+PROGRESS_INTERVAL = 1.0  # 秒
+MAX_ATTEMPTS = 3
+
+
+class _LeaseLost(Exception):
+    """
+    処理中に lease が切れて、別のワーカーがジョブを取り出し直した
+    """
+
+
+def enqueue(upload, *, filename: str = "", dry_run: bool = False, merge: bool = False) -> RestockImportJob:
+    """
+    upload は Django の UploadedFile（chunks() で読む）かバイナリのファイルオブジェクト
+    """
+    job_id = uuid.uuid4()
+    path = spool_path(job_id)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_suffix(".part")
+    with open(partial, "wb") as out:
+        if hasattr(upload, "chunks"):
+            for chunk in upload.chunks():
+                out.write(chunk)
+        else:
+            shutil.copyfileobj(upload, out)
+    # 書き終わってから名前を付ける（ワーカーが書きかけのファイルを読まないように）
+    os.replace(partial, path)
+
+    try:
+        job = RestockImportJob.objects.create(id=job_id, filename=filename[:255], dry_run=dry_run, merge=merge)
+    except Exception:
+        path.unlink(missing_ok=True)
+        raise
+    transaction.on_commit(wake)
+    return job
+
+
+def spool_path(job_id) -> Path:
+    return Path(settings.RESTOCK_IMPORT_SPOOL_DIR) / f"{job_id}.csv"
+
+
+def status(job: RestockImportJob) -> dict:
+    """
+    GET /api/restocks/import/jobs/<id> のレスポンス本文
+    """
+    body = {
+        "job_id": str(job.id),
+        "status": job.status,
+        "phase": job.phase or None,
+        "rows_processed": job.rows_processed,
+        "total_rows": job.total_rows,
+        "dry_run": job.dry_run,
+        "merge": job.merge,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+    if job.status == "DONE":
+        body["result_status"] = job.result_status
+        body["result"] = job.result
+    if job.status == "FAILED":
+        body["error"] = "import_failed"
+    return body
+
+
+class ImportJobWorker:
+    """
+    RestockImportJob を処理するワーカー。process_once() は1件だけ処理する
+    """
+
+    def __init__(self, *, lease_seconds: int = LEASE_SECONDS, max_attempts: int = MAX_ATTEMPTS):
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+
+    def wake(self) -> None:
+        self._wakeup.set()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._wakeup.set()
+
+    def run_forever(self, *, poll_interval: float = 30) -> None:
+        while not self._stopped.is_set():
+            close_old_connections()
+            try:
+                processed = self.process_once()
+            except Exception:
+                logger.exception("Restock import worker failed")
+                processed = False
+            finally:
+                close_old_connections()
+
+            if not processed:
+                self._wakeup.wait(poll_interval)
+                self._wakeup.clear()
+
+    def process_once(self) -> bool:
+        """
+        ジョブを1件処理する。処理するジョブがなければ False
+        """
+        job = self._claim()
+        if job is None:
+            return False
+
+        try:
+            fileobj = open(spool_path(job.pk), "rb")
+        except FileNotFoundError:
+            # やり直しても読めないので諦める
+            self._fail(job, "spool file not found", retry=False)
+            return True
+
+        def finish_with_import(result):
+            # 取り込みと同じトランザクションで完了にする（取り出し直されていたら取り込みごと巻き戻す）
+            self._finish(job, result.status, result.body(), result.total_rows)
+
+        reporter = _ProgressReporter(job.pk, job.attempts, self.lease_seconds)
+        reporter.start()
+        try:
+            with fileobj:
+                result = import_restock_csv(
+                    fileobj,
+                    dry_run=job.dry_run,
+                    merge=job.merge,
+                    progress=reporter.update,
+                    before_commit=finish_with_import,
+                )
+        except _LeaseLost:
+            reporter.stop()
+            # 取り出し直したワーカーが処理する（スプールファイルも残す）
+            logger.warning("Restock import job lease was lost", extra={"job_id": str(job.pk)})
+        except ImportFormatError as e:
+            reporter.stop()
+            self._finish_quietly(job, "invalid", {"status": "error", "message": str(e)}, None)
+        except Exception as e:
+            reporter.stop()
+            logger.exception("Restock import job failed", extra={"job_id": str(job.pk)})
+            self._fail(job, repr(e))
+        else:
+            reporter.stop()
+            if result.import_id is None:
+                # 検証エラー・dry_run は書き込みがないので、ここで完了にする
+                self._finish_quietly(job, result.status, result.body(), result.total_rows)
+            else:
+                spool_path(job.pk).unlink(missing_ok=True)
+        return True
+
+    def _claim(self) -> Optional[RestockImportJob]:
+        """
+        待機中のジョブか、lease の切れた処理中のジョブを1件取る
+        """
+        while True:
+            now = timezone.now()
+            with transaction.atomic():
+                job = (
+                    RestockImportJob.objects
+                    .select_for_update(skip_locked=True)
+                    .filter(Q(status="PENDING") | Q(status="RUNNING", lease_until__lt=now))
+                    .order_by("created_at")
+                    .first()
+                )
+                if job is None:
+                    return None
+                if job.attempts >= self.max_attempts:
+                    # 処理中に何度も落ちたジョブ（プロセスごと落ちる CSV など）は諦めて次を見る
+                    RestockImportJob.objects.filter(pk=job.pk).update(
+                        status="FAILED", lease_until=None, finished_at=now,
+                    )
+                    spool_path(job.pk).unlink(missing_ok=True)
+                    continue
+                RestockImportJob.objects.filter(pk=job.pk).update(
+                    status="RUNNING",
+                    phase="",
+                    rows_processed=0,
+                    attempts=F("attempts") + 1,
+                    lease_until=now + timedelta(seconds=self.lease_seconds),
+                    started_at=now,
+                )
+            # attempts はこのワーカーが持っている印にもなる（取り出し直されると変わる）
+            job.attempts += 1
+            return job
+
+    def _finish(self, job: RestockImportJob, result_status: str, body: dict, total_rows: Optional[int]) -> None:
+        """
+        完了にする。取り出し直されていたら _LeaseLost（取り込みのトランザクション内なら巻き戻る）
+        """
+        updated = self._owned(job).update(
+            status="DONE",
+            result_status=result_status,
+            result=body,
+            total_rows=total_rows,
+            rows_processed=total_rows or 0,
+            lease_until=None,
+            finished_at=timezone.now(),
+        )
+        if not updated:
+            raise _LeaseLost()
+
+    def _finish_quietly(self, job: RestockImportJob, result_status: str, body: dict,
+                        total_rows: Optional[int]) -> None:
+        # 書き込みのない結果。取り出し直されていたら何もしない（スプールファイルも新しい方が使う）
+        try:
+            self._finish(job, result_status, body, total_rows)
+        except _LeaseLost:
+            logger.warning("Restock import job lease was lost", extra={"job_id": str(job.pk)})
+        else:
+            spool_path(job.pk).unlink(missing_ok=True)
+
+    def _fail(self, job: RestockImportJob, error: str, *, retry: bool = True) -> None:
+        # attempts は _claim で加算済み。上限まではもう一度待機中に戻す
+        retry = retry and job.attempts < self.max_attempts
+        updated = self._owned(job).update(
+            status="PENDING" if retry else "FAILED",
+            last_error=error,
+            lease_until=None,
+            finished_at=None if retry else timezone.now(),
+        )
+        if updated and not retry:
+            spool_path(job.pk).unlink(missing_ok=True)
+
+    @staticmethod
+    def _owned(job: RestockImportJob):
+        return RestockImportJob.objects.filter(pk=job.pk, status="RUNNING", attempts=job.attempts)
+
+
+class _ProgressReporter:
+    """
+    進捗を別スレッドから書く。取り込み中の接続はトランザクションの中なので、
+    同じ接続で書くとコミットまでポーリング側から見えない
+    """
+
+    def __init__(self, job_id, attempts: int, lease_seconds: int):
+        self.job_id = job_id
+        self.attempts = attempts
+        self.lease_seconds = lease_seconds
+        self._phase = ""
+        self._rows = 0
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="restock-import-progress", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def update(self, phase: str, rows: int) -> None:
+        with self._lock:
+            self._phase, self._rows = phase, rows
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        written = None
+        try:
+            while not self._stopped.wait(PROGRESS_INTERVAL):
+                with self._lock:
+                    current = (self._phase, self._rows)
+                if current == written:
+                    continue
+                try:
+                    RestockImportJob.objects.filter(pk=self.job_id, status="RUNNING", attempts=self.attempts).update(
+                        phase=current[0],
+                        rows_processed=current[1],
+                        lease_until=timezone.now() + timedelta(seconds=self.lease_seconds),
+                    )
+                    written = current
+                except Exception:
+                    # SQLite では取り込み中の書き込みロックで失敗する。進捗は次の回に書く
+                    logger.debug("Failed to write import progress", exc_info=True)
+        finally:
+            connection.close()
+
+
+# プロセス内ワーカー（起動時の start_workers か最初の enqueue で起動する）
+_worker: Optional[ImportJobWorker] = None
+_worker_lock = threading.Lock()
+
+
+def wake() -> None:
+    """
+    プロセス内ワーカーを起こす。未起動なら起動する。
+    RESTOCK_IMPORT_IN_PROCESS_WORKER = False の場合は run_import_worker に任せる。
+    """
+    if not getattr(settings, "RESTOCK_IMPORT_IN_PROCESS_WORKER", True):
+        return
+    start_worker().wake()
+
+
+def start_worker() -> ImportJobWorker:
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = ImportJobWorker()
+            thread = threading.Thread(
+                target=_worker.run_forever,
+                name="restock-import",
+                daemon=True,
+            )
+            thread.start()
+        return _worker
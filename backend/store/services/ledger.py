@@ -0,0 +1,191 @@
+# store/services/ledger.py
+"""
+取引履歴のチェックポイントとアーカイブ
+
+- チェックポイント (StockCheckpoint): ある時刻 as_of より前の delta の合計を全商品分まとめて持つ。
+  時刻 T の在庫 = T 以前で最も新しいチェックポイント + [as_of, T) の delta
+- アーカイブ (LedgerArchive): 保存期間より古い取引を NDJSON + zlib にして移し、元の行は消す。
+  消す前に境界のチェックポイントを作るので、在庫の再計算は消した行を読まずに済む。
+
+created_at は INSERT 時刻でコミットはその後なので、チェックポイントは CHECKPOINT_LAG より前の時刻にしか作らない
+（遅れてコミットされた行がチェックポイントから漏れないように）。
+"""
+from __future__ import annotations
+
+import datetime
+import json
+import zlib
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Exists, Max, OuterRef, Sum
+from django.utils import timezone
+
+from store.models import LedgerArchive, Product, StockCheckpoint, StockTransaction
+from store.services import catalog
+
+CHECKPOINT_LAG = datetime.timedelta(hours=1)
+ARCHIVE_BATCH_SIZE = 50_000
+ARCHIVE_COLUMNS = (
+    "id",
+    "created_at",
+    "transaction_type",
+    "product_id",
+    "user_id",
+    "delta",
+    "unit_cost",
+    "unit_price",
+    "description",
+    "amended_of_id",
+    "checkout_id",
+    "import_id",
+)
+
+
+class LedgerArchivedError(Exception):
+    """
+    指定時刻の在庫を求めるのに必要な取引がアーカイブ済みで、使えるチェックポイントもない
+    """
+
+
+def latest_checkpoint(before: Optional[datetime.datetime] = None) -> Optional[datetime.datetime]:
+    """
+    before 以前で最も新しいチェックポイントの時刻
+    """
+    queryset = StockCheckpoint.objects.all()
+    if before is not None:
+        queryset = queryset.filter(as_of__lte=before)
+    return queryset.aggregate(as_of=Max("as_of"))["as_of"]
+
+
+def archived_until() -> Optional[datetime.datetime]:
+    """
+    アーカイブ済みの取引で最も新しい created_at（アーカイブがなければ None）。
+    これ以前の日の集計（ロールアップ・月次明細）は作り直せない
+    """
+    return LedgerArchive.objects.aggregate(until=Max("period_end"))["until"]
+
+
+def balances_as_of(as_of: Optional[datetime.datetime] = None,
+                   product_ids: Optional[Iterable[int]] = None) -> Dict[int, int]:
+    """
+    時刻 as_of より前の取引から商品ごとの在庫数を求める（None なら全取引）。
+    直近のチェックポイントから始めるので、読むのはそれ以降の取引だけ（2クエリ）
+    """
+    checkpoint_at = latest_checkpoint(before=as_of)
+
+    checkpoints = StockCheckpoint.objects.none()
+    ledger = StockTransaction.objects.all()
+    if checkpoint_at is not None:
+        checkpoints = StockCheckpoint.objects.filter(as_of=checkpoint_at)
+        ledger = ledger.filter(created_at__gte=checkpoint_at)
+    elif LedgerArchive.objects.filter(period_start__lt=as_of or timezone.now()).exists():
+        raise LedgerArchivedError("ledger is archived and no checkpoint covers it")
+    if as_of is not None:
+        ledger = ledger.filter(created_at__lt=as_of)
+    if product_ids is not None:
+        product_ids = list(product_ids)
+        checkpoints = checkpoints.filter(product_id__in=product_ids)
+        ledger = ledger.filter(product_id__in=product_ids)
+
+    balances = dict(checkpoints.values_list("product_id", "quantity"))
+    for product_id, total in ledger.values("product_id").annotate(total=Sum("delta")).order_by().values_list(
+        "product_id", "total"
+    ):
+        balances[product_id] = balances.get(product_id, 0) + (total or 0)
+    return balances
+
+
+@transaction.atomic
+def create_checkpoint(as_of: Optional[datetime.datetime] = None) -> Tuple[datetime.datetime, int]:
+    """
+    as_of（既定は CHECKPOINT_LAG 前の日の 0:00）の全商品分のチェックポイントを作る。
+    既にあれば作らない。戻り値は (as_of, 作成件数)
+    """
+    limit = timezone.now() - CHECKPOINT_LAG
+    as_of = as_of or _start_of_day(limit)
+    if as_of > limit:
+        raise ValueError("checkpoint must be older than CHECKPOINT_LAG")
+    if StockCheckpoint.objects.filter(as_of=as_of).exists():
+        return as_of, 0
+
+    balances = balances_as_of(as_of)
+    # 在庫 0 の商品も行を作る（行がない = その時点では未登録の商品）
+    product_ids = Product.objects.filter(created_at__lt=as_of).values_list("id", flat=True)
+    rows = [
+        StockCheckpoint(product_id=product_id, as_of=as_of, quantity=balances.get(product_id, 0))
+        for product_id in set(product_ids) | balances.keys()
+    ]
+    StockCheckpoint.objects.bulk_create(rows, batch_size=1000)
+    return as_of, len(rows)
+
+
+def archive_before(cutoff: datetime.datetime, *, batch_size: int = ARCHIVE_BATCH_SIZE) -> Tuple[int, int]:
+    """
+    created_at < cutoff の取引を LedgerArchive に移す。戻り値は (作成したアーカイブ数, 移した件数)
+    保存期間内の取消 (CORRECTION) から参照されている取引は残す（amended_of を保つため）
+    """
+    create_checkpoint(cutoff)
+
+    retained_amendments = StockTransaction.objects.filter(amended_of=OuterRef("pk"), created_at__gte=cutoff)
+    # 新しい方から移す。取消は元の取引より新しいので、元の取引を消す時点で
+    # それを参照する取消は移し済みか同じバッチにあり、amended_of を書き換えずに済む
+    candidates = (
+        StockTransaction.objects
+        .filter(created_at__lt=cutoff)
+        .exclude(Exists(retained_amendments))
+        .order_by("-created_at", "-id")
+    )
+
+    archives = 0
+    moved = 0
+    while True:
+        with transaction.atomic():
+            rows = list(candidates.values_list(*ARCHIVE_COLUMNS)[:batch_size])
+            if not rows:
+                return archives, moved
+            rows.reverse()
+            LedgerArchive.objects.create(
+                period_start=rows[0][1],
+                period_end=rows[-1][1],
+                first_id=min(row[0] for row in rows),
+                last_id=max(row[0] for row in rows),
+                row_count=len(rows),
+                columns=list(ARCHIVE_COLUMNS),
+                data=_compress(rows),
+            )
+            # .delete() だと削除前に全行をモデルに読み込み、post_delete で1行ずつ invalidate_on_commit するので、
+            # _raw_delete（Django の非公開 API、DELETE 1文だけでシグナルも関連の処理もしない）で消す。ここでは安全:
+            # - StockTransaction を参照する外部キーは amended_of だけで、それを持つ取消は移し済みか同じバッチにある
+            #   （SET_NULL する行が残らない）
+            # - post_delete の受け手はカタログの破棄だけなので、バッチごとに1回ここで呼ぶ
+            # 挙動は store.tests.LedgerArchiveTests で確かめている
+            ids = [row[0] for row in rows]
+            StockTransaction.objects.filter(id__in=ids)._raw_delete(StockTransaction.objects.db)
+            catalog.invalidate_on_commit()
+        archives += 1
+        moved += len(rows)
+
+
+def iter_archive_rows(archive: LedgerArchive) -> Iterator[dict]:
+    """
+    アーカイブした取引を1件ずつ dict で返す
+    """
+    for line in zlib.decompress(bytes(archive.data)).decode("utf-8").splitlines():
+        yield json.loads(line)
+
+
+def _compress(rows) -> bytes:
+    lines = (
+        # DjangoJSONEncoder は datetime をミリ秒に丸めるので、created_at は isoformat() で書く
+        json.dumps(dict(zip(ARCHIVE_COLUMNS, (row[0], row[1].isoformat()) + row[2:])),
+                   cls=DjangoJSONEncoder, ensure_ascii=False)
+        for row in rows
+    )
+    return zlib.compress("\n".join(lines).encode("utf-8"), 6)
+
+
+def _start_of_day(value: datetime.datetime) -> datetime.datetime:
+    local = timezone.localtime(value)
+    return local.replace(hour=0, minute=0, second=0, microsecond=0)
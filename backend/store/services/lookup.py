@@ -0,0 +1,131 @@
+# store/services/lookup.py
+"""
+購入経路のホットルックアップ用キャッシュ
+
+student_id → User.id / jan_code → Product.id をプロセス内の LRU に持つ。
+どちらのテーブルも週に数回しか変わらないので、保存・削除のシグナルで丸ごと破棄する
+（store/signals.py）。別プロセスでの変更に備えて TTL でも期限切れにする。
+"""
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Iterable, Optional
+
+from django.conf import settings
+
+from store.models import Product, User
+
+
+class LRUCache:
+    """
+    件数上限と TTL 付きのスレッドセーフな LRU
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key: Hashable, value) -> None:
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def discard(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+            }
+
+
+users = LRUCache(
+    maxsize=getattr(settings, "LOOKUP_CACHE_SIZE", 1024),
+    ttl=getattr(settings, "LOOKUP_CACHE_TTL", 300),
+)
+products = LRUCache(
+    maxsize=getattr(settings, "LOOKUP_CACHE_SIZE", 1024),
+    ttl=getattr(settings, "LOOKUP_CACHE_TTL", 300),
+)
+
+
+def user_id(student_id: str) -> Optional[int]:
+    """
+    学生証番号から User.id を返す。未登録なら None（未登録はキャッシュしない）
+    """
+    cached = users.get(student_id)
+    if cached is not None:
+        return cached
+    pk = User.objects.filter(student_id=student_id).values_list("id", flat=True).first()
+    if pk is not None:
+        users.set(student_id, pk)
+    return pk
+
+
+def product_id(jan_code: str) -> Optional[int]:
+    """
+    JANコードから Product.id を返す。未登録なら None（未登録はキャッシュしない）
+    """
+    cached = products.get(jan_code)
+    if cached is not None:
+        return cached
+    pk = Product.objects.filter(jan_code=jan_code).values_list("id", flat=True).first()
+    if pk is not None:
+        products.set(jan_code, pk)
+    return pk
+
+
+def product_ids(jan_codes: Iterable[str]) -> Dict[str, int]:
+    """
+    複数の JANコードをまとめて Product.id にする（チェックアウト用）。
+    キャッシュにないものは1回の jan_code__in でまとめて引く。未登録の JANコードは戻り値に含めない
+    """
+    found = {}
+    misses = []
+    for jan_code in jan_codes:
+        cached = products.get(jan_code)
+        if cached is not None:
+            found[jan_code] = cached
+        else:
+            misses.append(jan_code)
+    if misses:
+        for jan_code, pk in Product.objects.filter(jan_code__in=misses).values_list("jan_code", "id"):
+            products.set(jan_code, pk)
+            found[jan_code] = pk
+    return found
+
+
+def stats() -> Dict[str, Dict[str, int]]:
+    return {
+        "users": users.stats(),
+        "products": products.stats(),
+    }
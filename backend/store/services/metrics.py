@@ -0,0 +1,179 @@
+# store/services/metrics.py
+"""
+リクエスト単位の性能メトリクス（GET /api/metrics で Prometheus テキスト形式）
+
+- ルート（URL パターン）ごとのレイテンシのヒストグラムとリクエスト数
+- リクエストごとの SQL 件数と DB 時間（execute_wrapper で数える）
+- 遅いリクエストは実行した SQL ごとログに出す
+
+集計はプロセス内のカウンタを足すだけなので、常時有効にしておける。
+ラベルは URL パターン（/api/products/<str:jan_code> など）なので、JAN コードごとに増えたりしない。
+"""
+from __future__ import annotations
+
+import contextvars
+import logging
+import threading
+import time
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+logger = logging.getLogger("store.metrics")
+
+# 秒
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SLOW_LOG_MAX_STATEMENTS = 50  # 遅いリクエストのログに出す SQL の上限
+SLOW_LOG_SQL_CHARS = 500
+
+
+@dataclass
+class RequestStats:
+    queries: int = 0
+    db_seconds: float = 0.0
+    statements: List[Tuple[float, str]] = field(default_factory=list)
+
+
+@dataclass
+class _RouteStats:
+    buckets: List[int] = field(default_factory=lambda: [0] * (len(LATENCY_BUCKETS) + 1))
+    seconds: float = 0.0
+    count: int = 0
+    queries: int = 0
+    db_seconds: float = 0.0
+
+
+_current: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar("request_stats", default=None)
+_lock = threading.Lock()
+_routes: Dict[Tuple[str, str], _RouteStats] = {}
+_responses: Dict[Tuple[str, str, int], int] = {}
+
+
+def start_request() -> Tuple[RequestStats, contextvars.Token]:
+    stats = RequestStats()
+    return stats, _current.set(stats)
+
+
+def finish_request(token: contextvars.Token, stats: RequestStats, *, method: str, route: str,
+                   path: str, status: int, seconds: float) -> None:
+    _current.reset(token)
+    with _lock:
+        route_stats = _routes.get((method, route))
+        if route_stats is None:
+            route_stats = _routes[(method, route)] = _RouteStats()
+        route_stats.buckets[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        route_stats.seconds += seconds
+        route_stats.count += 1
+        route_stats.queries += stats.queries
+        route_stats.db_seconds += stats.db_seconds
+        key = (method, route, status)
+        _responses[key] = _responses.get(key, 0) + 1
+
+    if seconds * 1000 >= settings.METRICS_SLOW_REQUEST_MS:
+        _log_slow_request(stats, method=method, path=path, status=status, seconds=seconds)
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    connection.execute_wrappers に入れる（store/signals.py で接続ごとに登録）
+    """
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - start
+        stats.queries += 1
+        stats.db_seconds += elapsed
+        if len(stats.statements) < SLOW_LOG_MAX_STATEMENTS:
+            stats.statements.append((elapsed, sql))
+
+
+def install(connection) -> None:
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def render(extra: Optional[List[str]] = None) -> str:
+    """
+    Prometheus テキスト形式（0.0.4）
+    """
+    with _lock:
+        routes = {key: (list(value.buckets), value.seconds, value.count, value.queries, value.db_seconds)
+                  for key, value in _routes.items()}
+        responses = dict(_responses)
+
+    lines = [
+        "# HELP lab_kiosk_http_requests_total HTTP requests by route and status.",
+        "# TYPE lab_kiosk_http_requests_total counter",
+    ]
+    for (method, route, status), count in sorted(responses.items()):
+        lines.append(f"lab_kiosk_http_requests_total{_labels(method=method, route=route, status=status)} {count}")
+
+    lines += [
+        "# HELP lab_kiosk_http_request_duration_seconds Time until the view returned a response.",
+        "# TYPE lab_kiosk_http_request_duration_seconds histogram",
+    ]
+    for (method, route), (buckets, seconds, count, _, _) in sorted(routes.items()):
+        cumulative = 0
+        for bound, bucket in zip(LATENCY_BUCKETS + (None,), buckets):
+            cumulative += bucket
+            le = "+Inf" if bound is None else repr(bound)
+            lines.append(
+                f"lab_kiosk_http_request_duration_seconds_bucket{_labels(method=method, route=route, le=le)} {cumulative}"
+            )
+        lines.append(f"lab_kiosk_http_request_duration_seconds_sum{_labels(method=method, route=route)} {seconds:.6f}")
+        lines.append(f"lab_kiosk_http_request_duration_seconds_count{_labels(method=method, route=route)} {count}")
+
+    lines += [
+        "# HELP lab_kiosk_db_queries_total SQL statements executed while handling requests.",
+        "# TYPE lab_kiosk_db_queries_total counter",
+    ]
+    for (method, route), (_, _, _, queries, _) in sorted(routes.items()):
+        lines.append(f"lab_kiosk_db_queries_total{_labels(method=method, route=route)} {queries}")
+
+    lines += [
+        "# HELP lab_kiosk_db_seconds_total Time spent in SQL while handling requests.",
+        "# TYPE lab_kiosk_db_seconds_total counter",
+    ]
+    for (method, route), (_, _, _, _, db_seconds) in sorted(routes.items()):
+        lines.append(f"lab_kiosk_db_seconds_total{_labels(method=method, route=route)} {db_seconds:.6f}")
+
+    lines += extra or []
+    return "\n".join(lines) + "\n"
+
+
+def family(name: str, help_text: str, samples: List[Tuple[dict, float]], kind: str = "gauge") -> List[str]:
+    """
+    キャッシュや outbox など、リクエスト以外の値を render(extra=...) に渡す行にする
+    """
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        lines.append(f"{name}{_labels(**labels)} {value}")
+    return lines
+
+
+def _labels(**labels) -> str:
+    if not labels:
+        return ""
+    parts = []
+    for key, value in labels.items():
+        escaped = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        parts.append(f'{key}="{escaped}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def _log_slow_request(stats: RequestStats, *, method: str, path: str, status: int, seconds: float) -> None:
+    lines = [
+        f"slow request: {method} {path} {status} {seconds * 1000:.0f}ms "
+        f"queries={stats.queries} db={stats.db_seconds * 1000:.0f}ms"
+    ]
+    for elapsed, sql in stats.statements:
+        lines.append(f"  {elapsed * 1000:7.1f}ms  {sql[:SLOW_LOG_SQL_CHARS]}")
+    if stats.queries > len(stats.statements):
+        lines.append(f"  ... {stats.queries - len(stats.statements)} more")
+    logger.warning("\n".join(lines))
@@ -0,0 +1,321 @@
+# store/services/notification/outbox.py
+"""
+Discord 通知の outbox。
+
+- enqueue() は呼び出し元のトランザクション内で NotificationOutbox に1行積むだけ
+  （購入レスポンスが Discord の応答を待たない / コミットされた通知は失われない）
+- OutboxWorker が別スレッド（または run_notification_worker コマンド）で送信する
+  - HTTP セッションは1つを使い回す
+  - 数秒以内に積まれた通知は1回の Webhook 呼び出しにまとめる
+  - 失敗時は指数バックオフで再送、429 / X-RateLimit-* に従って待つ
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from datetime import timedelta
+from itertools import groupby
+from typing import TYPE_CHECKING, List, Optional
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from store.models import NotificationOutbox
+
+if TYPE_CHECKING:
+    import requests
+
+logger = logging.getLogger(__name__)
+
+# Discord の content 上限
+MAX_CONTENT_LENGTH = 2000
+
+
+def enqueue(content: str, *, username: Optional[str] = None) -> Optional[NotificationOutbox]:
+    """
+    通知を outbox に積む。コミット後にワーカーを起こす。
+    Webhook 未設定時は何もしない（local / test 用）
+    """
+    if not getattr(settings, "DISCORD_WEBHOOK_URL", None):
+        logger.debug("DISCORD_WEBHOOK_URL is not set. Skip discord notification.")
+        return None
+
+    entry = NotificationOutbox.objects.create(content=content, username=username or "")
+    transaction.on_commit(wake)
+    return entry
+
+
+def build_payload(content: str, username: Optional[str] = None) -> dict:
+    """
+    Discord Webhook の JSON 本文
+    """
+    payload = {"content": content}
+    if username:
+        payload["username"] = username
+    return payload
+
+
+class OutboxWorker:
+    """
+    NotificationOutbox を送信するワーカー。
+    process_once() は1回分の処理だけを行うので、テストではスタブサーバーに向けて直接呼べる。
+    """
+
+    def __init__(
+        self,
+        webhook_url: str,
+        *,
+        session: Optional[requests.Session] = None,
+        coalesce_seconds: Optional[float] = None,
+        max_attempts: Optional[int] = None,
+        batch_size: int = 50,
+        timeout: float = 5,
+        lease_seconds: int = 60,
+        backoff_base: float = 2,
+        backoff_max: float = 600,
+    ):
+        import requests  # ワーカーを起動するときだけ読み込む
+
+        self.webhook_url = webhook_url
+        self.session = session or requests.Session()
+        self.coalesce_seconds = (
+            coalesce_seconds
+            if coalesce_seconds is not None
+            else getattr(settings, "DISCORD_NOTIFY_COALESCE_SECONDS", 5)
+        )
+        self.max_attempts = (
+            max_attempts
+            if max_attempts is not None
+            else getattr(settings, "DISCORD_NOTIFY_MAX_ATTEMPTS", 8)
+        )
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.lease_seconds = lease_seconds
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self._paused_until = 0.0  # レート制限中は time.monotonic() がこの値を超えるまで送らない
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+
+    def wake(self) -> None:
+        self._wakeup.set()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._wakeup.set()
+
+    def run_forever(self, *, poll_interval: float = 30) -> None:
+        """
+        stop() されるまで送信を続ける
+        """
+        while not self._stopped.is_set():
+            close_old_connections()
+            try:
+                delay = self.process_once()
+            except Exception:
+                logger.exception("Notification outbox worker failed")
+                delay = poll_interval
+            finally:
+                close_old_connections()
+
+            timeout = poll_interval if delay is None else min(max(delay, 0), poll_interval)
+            if timeout > 0:
+                self._wakeup.wait(timeout)
+            self._wakeup.clear()
+
+    def process_once(self, *, now=None) -> Optional[float]:
+        """
+        送信可能な通知を1バッチ処理する。
+        次に処理すべきまでの秒数（送信待ちがなければ None）を返す。
+        """
+        now = now or timezone.now()
+
+        paused = self._paused_until - time.monotonic()
+        if paused > 0:
+            return paused
+
+        pending = NotificationOutbox.objects.filter(status="PENDING")
+        due = pending.filter(next_attempt_at__lte=now)
+
+        oldest = due.order_by("created_at").values_list("created_at", flat=True).first()
+        if oldest is None:
+            next_at = pending.order_by("next_attempt_at").values_list("next_attempt_at", flat=True).first()
+            return None if next_at is None else (next_at - now).total_seconds()
+
+        # 連続して積まれる通知をまとめるため、最古の通知から coalesce_seconds 待つ
+        ready_at = oldest + timedelta(seconds=self.coalesce_seconds)
+        if ready_at > now:
+            return (ready_at - now).total_seconds()
+
+        entries = self._claim(now)
+        batches = [
+            (username, chunk)
+            for username, group in groupby(entries, key=lambda entry: entry.username)
+            for chunk in _chunks(list(group))
+        ]
+        for index, (username, chunk) in enumerate(batches):
+            if not self._deliver(username, chunk, now):
+                # レート制限。残りは試行回数を増やさずに次回へ回す
+                self._release([entry for _, rest in batches[index:] for entry in rest], now)
+                return max(self._paused_until - time.monotonic(), 0)
+        return 0
+
+    def _claim(self, now) -> List[NotificationOutbox]:
+        """
+        送信対象を取得し、lease_seconds の間は他のワーカーから見えなくする
+        """
+        with transaction.atomic():
+            entries = list(
+                NotificationOutbox.objects
+                .select_for_update(skip_locked=True)
+                .filter(status="PENDING", next_attempt_at__lte=now)
+                .order_by("username", "created_at")[: self.batch_size]
+            )
+            NotificationOutbox.objects.filter(pk__in=[entry.pk for entry in entries]).update(
+                next_attempt_at=now + timedelta(seconds=self.lease_seconds),
+            )
+        return entries
+
+    def _deliver(self, username: str, entries: List[NotificationOutbox], now) -> bool:
+        """
+        まとめた通知を1回の Webhook 呼び出しで送る。
+        レート制限で送れなかった場合だけ False を返す。
+        """
+        import requests
+
+        content = "\n".join(entry.content for entry in entries)[:MAX_CONTENT_LENGTH]
+        payload = build_payload(content, username or None)
+
+        try:
+            response = self.session.post(self.webhook_url, json=payload, timeout=self.timeout)
+        except requests.RequestException as e:
+            logger.warning("Failed to send discord notification", exc_info=True)
+            self._retry(entries, now, repr(e))
+            return True
+
+        self._observe_rate_limit(response)
+
+        if 200 <= response.status_code < 300:
+            NotificationOutbox.objects.filter(pk__in=[entry.pk for entry in entries]).update(
+                status="SENT",
+                sent_at=timezone.now(),
+                last_error="",
+            )
+            return True
+
+        if response.status_code == 429:
+            retry_after = _retry_after(response)
+            self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+            logger.warning("Discord webhook rate limited", extra={"retry_after": retry_after})
+            return False
+
+        logger.warning(
+            "Discord webhook returned non-2xx status",
+            extra={
+                "status_code": response.status_code,
+                "response_text": response.text,
+            },
+        )
+        self._retry(entries, now, f"HTTP {response.status_code}: {response.text[:200]}")
+        return True
+
+    def _retry(self, entries: List[NotificationOutbox], now, error: str) -> None:
+        for entry in entries:
+            entry.attempts += 1
+            entry.last_error = error
+            if entry.attempts >= self.max_attempts:
+                entry.status = "FAILED"
+            else:
+                delay = min(self.backoff_base ** entry.attempts, self.backoff_max)
+                entry.next_attempt_at = now + timedelta(seconds=delay)
+        NotificationOutbox.objects.bulk_update(entries, ["attempts", "last_error", "status", "next_attempt_at"])
+
+    def _release(self, entries: List[NotificationOutbox], now) -> None:
+        """
+        未送信のまま lease を解除する（試行回数は増やさない）
+        """
+        resume_at = now + timedelta(seconds=max(self._paused_until - time.monotonic(), 0))
+        NotificationOutbox.objects.filter(pk__in=[entry.pk for entry in entries]).update(
+            next_attempt_at=resume_at,
+        )
+
+    def _observe_rate_limit(self, response) -> None:
+        """
+        Discord の X-RateLimit-* ヘッダを見て、バケットが空なら次の送信を待つ
+        """
+        if response.headers.get("X-RateLimit-Remaining") != "0":
+            return
+        try:
+            reset_after = float(response.headers.get("X-RateLimit-Reset-After", "0"))
+        except ValueError:
+            return
+        self._paused_until = max(self._paused_until, time.monotonic() + reset_after)
+
+
+def _retry_after(response) -> float:
+    try:
+        return float(response.json().get("retry_after"))
+    except Exception:
+        pass
+    try:
+        return float(response.headers.get("Retry-After", "1"))
+    except ValueError:
+        return 1.0
+
+
+def _chunks(entries: List[NotificationOutbox]) -> List[List[NotificationOutbox]]:
+    """
+    改行で連結して MAX_CONTENT_LENGTH に収まる単位に分ける
+    """
+    chunks: List[List[NotificationOutbox]] = []
+    current: List[NotificationOutbox] = []
+    length = 0
+    for entry in entries:
+        added = len(entry.content) + (1 if current else 0)
+        if current and length + added > MAX_CONTENT_LENGTH:
+            chunks.append(current)
+            current, length = [], 0
+            added = len(entry.content)
+        current.append(entry)
+        length += added
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+# プロセス内ワーカー（起動時の start_workers か最初の enqueue で起動する）
+_worker: Optional[OutboxWorker] = None
+_worker_lock = threading.Lock()
+
+
+def wake() -> None:
+    """
+    プロセス内ワーカーを起こす。未起動なら起動する。
+    DISCORD_NOTIFY_IN_PROCESS_WORKER = False の場合は run_notification_worker に任せる。
+    """
+    if not getattr(settings, "DISCORD_NOTIFY_IN_PROCESS_WORKER", True):
+        return
+    worker = start_worker()
+    if worker is not None:
+        worker.wake()
+
+
+def start_worker() -> Optional[OutboxWorker]:
+    global _worker
+    webhook_url = getattr(settings, "DISCORD_WEBHOOK_URL", None)
+    if not webhook_url:
+        return None
+
+    with _worker_lock:
+        if _worker is None:
+            _worker = OutboxWorker(webhook_url)
+            thread = threading.Thread(
+                target=_worker.run_forever,
+                name="notification-outbox",
+                daemon=True,
+            )
+            thread.start()
+        return _worker
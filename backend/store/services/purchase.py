@@ -1,18 +1,23 @@
+import uuid
+from collections import OrderedDict
 from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
 from django.db import transaction
-from django.db.models import Sum
 
-from store.models import Product, User, StockTransaction
-from store.services.notification.discord import send
-from django.conf import settings
+from store.models import Product, ProductStock, StockTransaction, User
+from store.services import lookup
+from store.services.stock import apply_deltas, apply_transactions
 
 class PurchaseError(Exception):
     """
     service層の例外。
     API層はこれを捕まえてHTTPのエラーに変換する。
     """
-    def __init__(self, error_code: str):
+    def __init__(self, error_code: str, *, jan_code: Optional[str] = None):
         self.code = error_code
+        # カート購入時、どの商品でエラーになったかを返すため
+        self.jan_code = jan_code
         super().__init__(error_code)
 
 @dataclass(frozen=True)
@@ -22,26 +27,23 @@ class PurchaseResult:
 
 @transaction.atomic
 def purchase_one(*, student_id: str, jan_code: str) -> PurchaseResult:
-    # 購入者の特定
-    try:
-        user = User.objects.get(student_id=student_id)
-        print(f"{user=}")
-    except User.DoesNotExist:
-        raise PurchaseError("user_not_found")
+    # 購入者・商品の特定（プロセス内キャッシュ。利用者は存在だけ主キーで確かめる）
+    user_id = _user_id(student_id)
 
-    # 商品特定
-    try:
-        product = Product.objects.select_for_update().get(jan_code=jan_code)
-    except Product.DoesNotExist:
+    product_id = lookup.product_id(jan_code)
+    if product_id is None:
         raise PurchaseError("product_not_found")
 
-    # 現在在庫の確認
-    current = (
-        StockTransaction.objects
-        .filter(product=product)
-        .aggregate(total=Sum("delta"))
-        .get("total")
-    ) or 0
+    # 在庫行と商品行を主キーでロックして読む（コミットまで他の更新を待たせる）
+    stock = _lock_stocks([product_id]).get(product_id)
+    if stock is None:
+        # 在庫行がない = 一度も入荷していない商品
+        if not Product.objects.filter(pk=product_id).exists():
+            raise PurchaseError("product_not_found")
+        raise PurchaseError("out_of_stock")
+
+    product = stock.product
+    current = stock.quantity
 
     if current <= 0:
         raise PurchaseError("out_of_stock")
@@ -49,16 +51,119 @@ def purchase_one(*, student_id: str, jan_code: str) -> PurchaseResult:
     # 購入確定 
     StockTransaction.objects.create(
         product=product,
-        user=user,
+        user_id=user_id,
         delta=-1,
         transaction_type="PURCHASE",
+        unit_price=product.price,
     )
-
-    remaining = current - 1
-    threshold = getattr(settings, "LOW_STOCK_THRESHOLD", None)
-    if remaining <= threshold:
-        message = f"在庫低下: {product.name} (JAN:{product.jan_code}) 残り {remaining}"
-        transaction.on_commit(lambda: send(message, username="Lab-Kiosk"))
+    # 在庫低下の通知も apply_deltas の中で判定する（store.services.stock_alerts）
+    apply_deltas({product.id: -1}, ensure_rows=False)
 
     return PurchaseResult(product=product, remaining=current - 1)
-    # return PurchaseResult(product=Product(), remaing=0)
+
+
+@dataclass(frozen=True)
+class CheckoutLine:
+    product: Product
+    quantity: int
+    remaining: int
+
+
+@dataclass(frozen=True)
+class CheckoutResult:
+    checkout_id: uuid.UUID
+    lines: List[CheckoutLine]
+
+
+@transaction.atomic
+def checkout(*, student_id: str, items: Iterable[Tuple[str, int]]) -> CheckoutResult:
+    """
+    カート内の複数商品をまとめて購入する。
+
+    items は (jan_code, 数量) の並び。同じ jan_code は合算する。
+    1商品でも在庫不足・未登録があれば全体を失敗とする。
+    """
+    quantities = OrderedDict()
+    for jan_code, quantity in items:
+        quantities[jan_code] = quantities.get(jan_code, 0) + quantity
+
+    if not quantities:
+        raise PurchaseError("empty_cart")
+
+    # 購入者の特定（1回だけ）
+    user_id = _user_id(student_id)
+
+    # キャッシュにない商品はまとめて1クエリで引く
+    product_ids = lookup.product_ids(quantities)
+    for jan_code in quantities:
+        if jan_code not in product_ids:
+            raise PurchaseError("product_not_found", jan_code=jan_code)
+
+    # 在庫行は主キー順にロックする（同時チェックアウト同士のデッドロック防止）
+    stocks = _lock_stocks(product_ids.values())
+
+    # 全商品の在庫を確認してから書き込む
+    for jan_code, quantity in quantities.items():
+        stock = stocks.get(product_ids[jan_code])
+        if stock is None:
+            if not Product.objects.filter(pk=product_ids[jan_code]).exists():
+                raise PurchaseError("product_not_found", jan_code=jan_code)
+            raise PurchaseError("out_of_stock", jan_code=jan_code)
+        if stock.quantity < quantity:
+            raise PurchaseError("out_of_stock", jan_code=jan_code)
+
+    checkout_id = uuid.uuid4()
+    transactions = [
+        StockTransaction(
+            product=stocks[product_ids[jan_code]].product,
+            user_id=user_id,
+            delta=-quantity,
+            transaction_type="PURCHASE",
+            unit_price=stocks[product_ids[jan_code]].product.price,
+            checkout_id=checkout_id,
+        )
+        for jan_code, quantity in quantities.items()
+    ]
+    StockTransaction.objects.bulk_create(transactions)
+    apply_transactions(transactions, ensure_rows=False)
+
+    lines = []
+    for jan_code, quantity in quantities.items():
+        stock = stocks[product_ids[jan_code]]
+        product = stock.product
+        remaining = stock.quantity - quantity
+        lines.append(CheckoutLine(product=product, quantity=quantity, remaining=remaining))
+
+    return CheckoutResult(checkout_id=checkout_id, lines=lines)
+
+
+def _user_id(student_id: str) -> int:
+    """
+    学生証番号から User.id を引き、トランザクション内で存在を確かめる。
+    キャッシュは別プロセスでの利用者削除を TTL まで知らないので、消えた User.id のまま
+    取引を書くとコミット時の外部キー違反（500）になる。主キー1件の確認で user_not_found にする
+    """
+    user_id = lookup.user_id(student_id)
+    if user_id is None:
+        raise PurchaseError("user_not_found")
+    if not User.objects.filter(pk=user_id).exists():
+        lookup.users.discard(student_id)
+        raise PurchaseError("user_not_found")
+    return user_id
+
+
+def _lock_stocks(product_ids: Iterable[int]) -> Dict[int, ProductStock]:
+    """
+    在庫行を主キー順でロックし、商品と一緒に取得する（1クエリ）。
+    ロックするのは在庫行だけ（of=self）。商品行までロックすると、入荷などと
+    商品 → 在庫 / 在庫 → 商品 の逆順でロックし合ってデッドロックになる
+    """
+    stocks = (
+        ProductStock.objects
+        .select_for_update(of=("self",))
+        .select_related("product")
+        .filter(pk__in=list(product_ids))
+        .order_by("pk")
+    )
+    return {stock.pk: stock for stock in stocks}
+
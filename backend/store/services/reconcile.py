@@ -0,0 +1,146 @@
+# store/services/reconcile.py
+"""
+在庫数 (ProductStock) と取引履歴の突き合わせ、取消 (amend) の整合性チェック
+
+- 在庫: 取引履歴から在庫数を求め（直近のチェックポイント以降だけを読む）、ProductStock と比べる。
+  workers > 1 なら商品IDを chunk_size ごとに分けて別スレッド・別接続で集計する。
+  集計中の購入で見かけ上ずれることがあるので、ずれた商品だけ在庫行をロックしてもう一度確かめる。
+- 取消: 取消の取消、2回以上の取消、取消対象のない取消、元の取引と商品・数量が合わない取消を探す。
+  どれも1クエリずつ。
+"""
+from __future__ import annotations
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from django.db import connection, transaction
+from django.db.models import Count, F, Q
+
+from store.models import Product, ProductStock, StockTransaction
+from store.services import ledger
+from store.services.stock import rebuild_balances
+
+CHUNK_SIZE = 5000
+SAMPLE_LIMIT = 100  # 問題ごとにレポートへ載せる件数の上限
+
+
+def reconcile(*, workers: int = 1, chunk_size: int = CHUNK_SIZE, repair: bool = False) -> dict:
+    """
+    突き合わせのレポートを dict で返す。repair=True ならずれていた在庫数を直す。
+    report["ok"] は在庫のずれ・マイナス在庫・取消の不整合がひとつもなければ True
+    """
+    started = time.perf_counter()
+    balances = ledger_balances(workers=workers, chunk_size=chunk_size)
+    stored = dict(ProductStock.objects.values_list("product_id", "quantity"))
+    product_ids = set(Product.objects.values_list("id", flat=True))
+
+    # 在庫行がない商品は在庫 0 とみなす（一度も入出庫のない商品には行がない）
+    suspects = [
+        product_id for product_id in product_ids
+        if stored.get(product_id, 0) != balances.get(product_id, 0)
+    ]
+    mismatches = _confirm_mismatches(suspects)
+    repaired = rebuild_balances(product_ids=[row["product_id"] for row in mismatches]) if repair and mismatches else 0
+
+    negative = sorted(
+        (product_id, balance) for product_id, balance in balances.items() if balance < 0
+    )
+    issues = {
+        "stock_mismatch": _issue(mismatches),
+        "negative_stock": _issue([{"product_id": product_id, "ledger": balance} for product_id, balance in negative]),
+        **amendment_issues(),
+    }
+    return {
+        "ok": not any(issue["count"] for issue in issues.values()),
+        "products": len(product_ids),
+        "checkpoint": _isoformat(ledger.latest_checkpoint()),
+        "workers": workers,
+        "repaired": repaired,
+        "seconds": round(time.perf_counter() - started, 3),
+        "issues": issues,
+    }
+
+
+def ledger_balances(*, workers: int = 1, chunk_size: int = CHUNK_SIZE) -> Dict[int, int]:
+    """
+    取引履歴から求めた商品ごとの在庫数。workers > 1 なら商品IDの範囲ごとに並列で集計する
+    """
+    if workers <= 1:
+        return ledger.balances_as_of()
+
+    product_ids = sorted(Product.objects.values_list("id", flat=True))
+    chunks = [product_ids[start:start + chunk_size] for start in range(0, len(product_ids), chunk_size)]
+    balances: Dict[int, int] = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for result in executor.map(_chunk_balances, chunks):
+            balances.update(result)
+    return balances
+
+
+def amendment_issues() -> Dict[str, dict]:
+    amendments = StockTransaction.objects.filter(amended_of__isnull=False).order_by("id")
+    return {
+        # 取消 (CORRECTION) をさらに取り消している
+        "amendment_of_amendment": _queryset_issue(
+            amendments.filter(amended_of__transaction_type="CORRECTION").values("id", "amended_of_id")
+        ),
+        # 同じ取引が2回以上取り消されている
+        "double_amended": _queryset_issue(
+            amendments.values("amended_of_id").annotate(amendments=Count("id")).filter(amendments__gt=1)
+            .order_by("amended_of_id")
+        ),
+        # 取消対象の行がない（FK を検査しない DB に直接入れた行など）
+        "orphan_amendment": _queryset_issue(
+            amendments.exclude(amended_of_id__in=StockTransaction.objects.values("id")).values("id", "amended_of_id")
+        ),
+        # 取消が CORRECTION でない、または元の取引と商品・数量が合わない
+        "mismatched_amendment": _queryset_issue(
+            amendments.filter(
+                ~Q(transaction_type="CORRECTION")
+                | ~Q(product_id=F("amended_of__product_id"))
+                | ~Q(delta=-F("amended_of__delta"))
+            ).values("id", "amended_of_id", "transaction_type", "product_id", "delta")
+        ),
+    }
+
+
+def _chunk_balances(product_ids: List[int]) -> Dict[int, int]:
+    try:
+        return ledger.balances_as_of(product_ids=product_ids)
+    finally:
+        connection.close()  # スレッドごとの接続を閉じる
+
+
+@transaction.atomic
+def _confirm_mismatches(product_ids: List[int]) -> List[dict]:
+    """
+    在庫行をロックしてから集計し直し、本当にずれている商品だけ返す
+    """
+    if not product_ids:
+        return []
+    stored = dict(
+        ProductStock.objects.select_for_update().filter(product_id__in=product_ids)
+        .order_by("product_id").values_list("product_id", "quantity")
+    )
+    balances = ledger.balances_as_of(product_ids=product_ids)
+    mismatches = []
+    for product_id in sorted(product_ids):
+        expected = balances.get(product_id, 0)
+        if stored.get(product_id, 0) != expected:
+            mismatches.append({"product_id": product_id, "stored": stored.get(product_id), "ledger": expected})
+    return mismatches
+
+
+def _issue(rows: list) -> dict:
+    return {"count": len(rows), "rows": rows[:SAMPLE_LIMIT]}
+
+
+def _queryset_issue(queryset) -> dict:
+    rows = list(queryset[:SAMPLE_LIMIT])
+    count = len(rows) if len(rows) < SAMPLE_LIMIT else queryset.count()
+    return {"count": count, "rows": rows}
+
+
+def _isoformat(value) -> Optional[str]:
+    return value.isoformat() if value is not None else None
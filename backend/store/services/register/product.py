@@ -18,7 +18,7 @@ def register_product(*, validated_data: Dict[str, Any]) -> Product:
     商品を新規登録する。
 
     validated_data は Serializer.is_valid() 済みを想定。
-    ただし同時実行などで unique 制約に引っかかる可能性があるため、
+    JANコードの重複は事前に問い合わせず unique 制約で検出するので、
     IntegrityError はここで ValidationError に変換して返す。
     """
     try:
@@ -26,11 +26,10 @@ def register_product(*, validated_data: Dict[str, Any]) -> Product:
         return product
 
     except IntegrityError as e:
-        # 例: jan_code の unique 制約競合（同時登録など）
-        logger.warning(
+        # 例: jan_code の unique 制約競合（登録済み・同時登録など）
+        logger.info(
             "Failed to register product due to integrity error",
             extra={"validated_data": _safe_log_payload(validated_data)},
-            exc_info=True,
         )
         raise ValidationError({"jan_code": "このJANコードの商品は既に登録されています。"}) from e
 
@@ -0,0 +1,139 @@
+# store/services/register/product_import.py
+"""
+商品マスタの一括登録・更新（POST /api/products/import）
+
+行の検証は API 層（ProductRegisterSerializer、DB を読まない）で済ませてから渡す。
+ここでは既存商品を CHUNK_SIZE 件ずつまとめて引いて 新規 / 更新 / 変更なし を決め、
+jan_code の unique 制約に対する bulk_create(update_conflicts=True) で書き込む。
+数千件でも、既存の読み込みと upsert を合わせて数クエリで終わる。
+
+シグナルが飛ばないので、カタログと JAN コードのキャッシュはここで破棄する。
+"""
+from __future__ import annotations
+
+import csv
+import io
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Tuple
+
+from django.db import transaction
+
+from store.models import Product
+from store.services import catalog, lookup, stock_alerts
+from store.services.restock_import import ImportFormatError
+
+MAX_ROWS = 5000
+CHUNK_SIZE = 1000
+BULK_BATCH_SIZE = 500
+
+REQUIRED_COLUMNS = {"jan_code", "name", "price"}
+# 既存商品で更新する列（行に含まれている列だけ更新する）
+UPSERT_FIELDS = ("name", "price", "image_url", "alert_threshold")
+
+
+@dataclass
+class ProductImportResult:
+    rows: List[dict] = field(default_factory=list)
+    dry_run: bool = False
+
+    def count(self, result: str) -> int:
+        return sum(1 for row in self.rows if row["result"] == result)
+
+    def body(self) -> dict:
+        summary = {
+            "created_count": self.count("created"),
+            "updated_count": self.count("updated"),
+            "unchanged_count": self.count("unchanged"),
+        }
+        if self.dry_run:
+            summary["dry_run"] = True
+        return {"status": "ok", "import": summary, "results": self.rows}
+
+
+def read_csv(fileobj) -> List[Tuple[int, Dict[str, str]]]:
+    """
+    CSV（バイナリ）を (行番号, 列名 → 値) の並びにする。空欄の任意列は省く（更新しない）
+    """
+    text = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+    try:
+        reader = csv.DictReader(text)
+        if reader.fieldnames is None:
+            raise ImportFormatError("csv has no header")
+        missing = REQUIRED_COLUMNS - set(reader.fieldnames)
+        if missing:
+            raise ImportFormatError(f"missing columns: {', '.join(sorted(missing))}")
+
+        records = []
+        for row_index, row in enumerate(reader, start=2):
+            if len(records) >= MAX_ROWS:
+                raise ImportFormatError(f"too many rows (max {MAX_ROWS})")
+            records.append((
+                row_index,
+                {
+                    name: (value or "").strip()
+                    for name, value in row.items()
+                    if name in REQUIRED_COLUMNS or (name in UPSERT_FIELDS and (value or "").strip())
+                },
+            ))
+        return records
+    except (UnicodeDecodeError, csv.Error):
+        raise ImportFormatError("invalid csv")
+    finally:
+        text.detach()
+
+
+@transaction.atomic
+def upsert_products(rows: List[Tuple[int, Dict[str, Any]]], *, dry_run: bool = False) -> ProductImportResult:
+    """
+    rows は (行番号, 検証済みの値) の並び。jan_code は重複していないこと
+    """
+    jan_codes = [data["jan_code"] for _, data in rows]
+    existing: Dict[str, dict] = {}
+    for start in range(0, len(jan_codes), CHUNK_SIZE):
+        for product in Product.objects.filter(jan_code__in=jan_codes[start:start + CHUNK_SIZE]).values(
+            "id", "jan_code", *UPSERT_FIELDS
+        ):
+            existing[product["jan_code"]] = product
+
+    result = ProductImportResult(dry_run=dry_run)
+    # 更新する列の組み合わせごとにまとめて upsert する
+    groups: Dict[Tuple[str, ...], List[Product]] = defaultdict(list)
+    threshold_changed = {}
+    created = []
+    for row_index, data in rows:
+        current = existing.get(data["jan_code"])
+        if current is None:
+            result.rows.append({"row": row_index, "jan_code": data["jan_code"], "result": "created"})
+            created.append(data["jan_code"])
+        else:
+            changed = [name for name in UPSERT_FIELDS if name in data and data[name] != current[name]]
+            if not changed:
+                result.rows.append({"row": row_index, "jan_code": data["jan_code"], "result": "unchanged"})
+                continue
+            result.rows.append(
+                {"row": row_index, "jan_code": data["jan_code"], "result": "updated", "changed": changed}
+            )
+            if "alert_threshold" in changed:
+                threshold_changed[current["id"]] = current["alert_threshold"]
+        groups[tuple(name for name in UPSERT_FIELDS if name in data)].append(Product(**data))
+
+    if dry_run or not groups:
+        return result
+
+    for fields, products in groups.items():
+        Product.objects.bulk_create(
+            products,
+            batch_size=BULK_BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=["jan_code"],
+            update_fields=[*fields, "updated_at"],
+        )
+    catalog.invalidate_on_commit()
+    transaction.on_commit(lookup.products.clear)
+    if created:
+        stock_alerts.ensure_states(Product.objects.filter(jan_code__in=created).values_list("id", flat=True))
+    if threshold_changed:
+        # 閾値を上げて在庫が閾値以下になった商品も通知する
+        stock_alerts.evaluate(dict.fromkeys(threshold_changed, 0), thresholds=threshold_changed)
+    return result
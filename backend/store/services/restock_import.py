@@ -0,0 +1,348 @@
+# store/services/restock_import.py
+"""
+CSV一括入荷（docs/20_restock_import_spec.md）
+
+メモリ使用量を行数に比例させないため、CSV は2回ストリームで読む。
+1. 検証パス: CHUNK_SIZE 行ずつ検証し、商品はチャンクごとにまとめて引く（書き込みなし）
+2. 書き込みパス: エラーが1件もなければ先頭に戻り、1トランザクション内でチャンクごとに bulk_create
+
+どちらのパスも保持するのは「エラー・警告」と「jan_code → 商品」の対応だけ。
+"""
+from __future__ import annotations
+
+import csv
+import io
+import uuid
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from django.db import transaction
+
+from store.models import Product, StockTransaction
+from store.services.stock import apply_deltas
+
+CHUNK_SIZE = 500
+BULK_BATCH_SIZE = 500
+
+REQUIRED_COLUMNS = {"jan_code", "quantity"}
+
+# progress(段階, 処理済み行数)。段階は "validating" / "writing"
+Progress = Callable[[str, int], None]
+
+
+class ImportFormatError(Exception):
+    """
+    CSV として読めない・ヘッダ不正など、行単位の検証以前のエラー
+    """
+
+
+@dataclass
+class ParsedRow:
+    row: int
+    jan_code: str
+    quantity: int
+    unit_cost: Optional[int]
+    name: str
+
+
+@dataclass
+class RestockImportResult:
+    total_rows: int = 0
+    created_count: int = 0
+    errors_400: List[dict] = field(default_factory=list)
+    errors_422: List[dict] = field(default_factory=list)
+    warnings: List[dict] = field(default_factory=list)
+    dry_run: bool = False
+    merged: bool = False
+    import_id: Optional[uuid.UUID] = None
+
+    @property
+    def status(self) -> str:
+        """
+        ok / invalid(400) / unprocessable(422)
+        """
+        if self.errors_400:
+            return "invalid"
+        if self.errors_422:
+            return "unprocessable"
+        return "ok"
+
+    def body(self) -> dict:
+        """
+        API レスポンスの本文（仕様書 6章の形）
+        """
+        if self.status != "ok":
+            return {
+                "status": "error",
+                "import": {
+                    "created_count": 0,
+                    "skipped_count": self.total_rows,
+                },
+                "errors": self.errors_400 or self.errors_422,
+            }
+
+        summary = {
+            "created_count": self.created_count,
+            "skipped_count": 0,
+        }
+        if self.dry_run:
+            summary["dry_run"] = True
+            summary["valid_count"] = self.total_rows
+        if self.merged:
+            summary["merged"] = True
+        if self.import_id:
+            # POST /api/transactions/amend-bulk でまとめて取り消すときに使う
+            summary["import_id"] = str(self.import_id)
+        return {
+            "status": "ok",
+            "import": summary,
+            "warnings": self.warnings,
+        }
+
+
+def import_restock_csv(fileobj, *, dry_run: bool = False, merge: bool = False,
+                       progress: Optional[Progress] = None,
+                       before_commit: Optional[Callable[[RestockImportResult], None]] = None) -> RestockImportResult:
+    """
+    CSV（バイナリのファイルオブジェクト。seek できること）を検証し、問題なければ RESTOCK を作成する。
+
+    - dry_run: 検証と警告の報告だけ行い、書き込まない
+    - merge: 同じ jan_code の行を1件の取引にまとめる（unit_cost は数量での加重平均）
+    - progress: チャンクごとに呼ぶ（バックグラウンドジョブの進捗表示用）
+    - before_commit: 書き込んだトランザクションのコミット直前に結果を渡して呼ぶ。
+      例外を投げると取り込みごと巻き戻る（バックグラウンドジョブの完了記録を取り込みと同時にするため）
+    """
+    progress = progress or _no_progress
+    result = RestockImportResult(dry_run=dry_run, merged=merge)
+    products = _validate(fileobj, result, progress)
+
+    if result.status != "ok" or dry_run:
+        return result
+
+    fileobj.seek(0)
+    import_id = uuid.uuid4()
+    with transaction.atomic():
+        if merge:
+            result.created_count = _write_merged(fileobj, products, progress, import_id)
+        else:
+            result.created_count = _write(fileobj, products, progress, import_id)
+        result.import_id = import_id
+        if before_commit is not None:
+            before_commit(result)
+    return result
+
+
+def _no_progress(phase: str, rows: int) -> None:
+    pass
+
+
+def _validate(fileobj, result: RestockImportResult, progress: Progress) -> Dict[str, Tuple[int, str]]:
+    """
+    検証パス。jan_code → (product_id, name) を返す
+    """
+    products: Dict[str, Tuple[int, str]] = {}
+    missing = set()
+    unknown_errors = []
+
+    for chunk in _chunked(_parse(fileobj, result)):
+        # このチャンクで初めて出てきた jan_code だけまとめて引く
+        new_codes = {row.jan_code for row in chunk} - products.keys() - missing
+        if new_codes:
+            for product_id, jan_code, name in Product.objects.filter(jan_code__in=new_codes).values_list("id", "jan_code", "name"):
+                products[jan_code] = (product_id, name)
+            missing |= new_codes - products.keys()
+
+        for row in chunk:
+            if row.jan_code in missing:
+                unknown_errors.append(
+                    {
+                        "row": row.row,
+                        "code": "UNKNOWN_JAN",
+                        "jan_code": row.jan_code,
+                        "field": "jan_code",
+                        "message": "未登録の商品です。先に商品登録してください",
+                    }
+                )
+                continue
+
+            product_name = products[row.jan_code][1]
+            if row.name and row.name != product_name:
+                result.warnings.append(
+                    {
+                        "row": row.row,
+                        "code": "NAME_MISMATCH",
+                        "jan_code": row.jan_code,
+                        "field": "name",
+                        "message": (
+                            f"CSVの商品名とDBの商品名が一致しません（CSV:{row.name} / DB:{product_name}）"
+                        ),
+                    }
+                )
+        progress("validating", result.total_rows)
+
+    result.errors_422.extend(unknown_errors)
+    return products
+
+
+def _write(fileobj, products: Dict[str, Tuple[int, str]], progress: Progress, import_id: uuid.UUID) -> int:
+    created = 0
+    deltas: Dict[int, int] = {}
+    for chunk in _chunked(_parse(fileobj)):
+        transactions = [
+            StockTransaction(
+                product_id=products[row.jan_code][0],
+                transaction_type="RESTOCK",
+                delta=row.quantity,
+                unit_cost=row.unit_cost,
+                import_id=import_id,
+            )
+            for row in chunk
+        ]
+        StockTransaction.objects.bulk_create(transactions, batch_size=BULK_BATCH_SIZE)
+        created += len(transactions)
+        for tx in transactions:
+            deltas[tx.product_id] = deltas.get(tx.product_id, 0) + tx.delta
+        progress("writing", created)
+
+    apply_deltas(deltas)
+    return created
+
+
+def _write_merged(fileobj, products: Dict[str, Tuple[int, str]], progress: Progress,
+                  import_id: uuid.UUID) -> int:
+    # jan_code → [数量合計, 仕入額合計, 仕入単価ありの数量]
+    totals: Dict[str, List[int]] = {}
+    rows = 0
+    for row in _parse(fileobj):
+        rows += 1
+        total = totals.setdefault(row.jan_code, [0, 0, 0])
+        total[0] += row.quantity
+        if row.unit_cost is not None:
+            total[1] += row.unit_cost * row.quantity
+            total[2] += row.quantity
+
+    transactions = [
+        StockTransaction(
+            product_id=products[jan_code][0],
+            transaction_type="RESTOCK",
+            delta=quantity,
+            unit_cost=round(cost / cost_quantity) if cost_quantity else None,
+            import_id=import_id,
+        )
+        for jan_code, (quantity, cost, cost_quantity) in totals.items()
+    ]
+    StockTransaction.objects.bulk_create(transactions, batch_size=BULK_BATCH_SIZE)
+    apply_deltas({tx.product_id: tx.delta for tx in transactions})
+    progress("writing", rows)
+    return len(transactions)
+
+
+def open_csv(fileobj) -> Tuple[io.TextIOWrapper, csv.DictReader]:
+    """
+    ヘッダを検証して (TextIOWrapper, DictReader) を返す。問題があれば ImportFormatError
+    """
+    text = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+    try:
+        reader = csv.DictReader(text)
+        fieldnames = reader.fieldnames
+    except Exception:
+        text.detach()
+        raise ImportFormatError("invalid csv")
+
+    if fieldnames is None:
+        text.detach()
+        raise ImportFormatError("csv has no header")
+
+    missing = REQUIRED_COLUMNS - set(fieldnames)
+    if missing:
+        text.detach()
+        raise ImportFormatError(f"missing columns: {', '.join(sorted(missing))}")
+    return text, reader
+
+
+def _parse(fileobj, result: Optional[RestockImportResult] = None) -> Iterator[ParsedRow]:
+    """
+    1行ずつ型検証して ParsedRow を返す。
+    result を渡した場合はエラー行を result に記録して読み飛ばす（検証パス）。
+    """
+    text, reader = open_csv(fileobj)
+    try:
+        for row_index, row in enumerate(reader, start=2):
+            if result is not None:
+                result.total_rows += 1
+            parsed, error_400, error_422 = _parse_row(row_index, row)
+            if result is not None:
+                if error_400:
+                    result.errors_400.append(error_400)
+                if error_422:
+                    result.errors_422.append(error_422)
+            if parsed is not None:
+                yield parsed
+    except (UnicodeDecodeError, csv.Error):
+        raise ImportFormatError("invalid csv")
+    finally:
+        # 2回目のパスで読み直すため、元のファイルは閉じずに切り離す
+        text.detach()
+
+
+def _parse_row(row_index: int, row: dict):
+    """
+    (ParsedRow or None, 400エラー or None, 422エラー or None)
+    """
+    jan_code = (row.get("jan_code") or "").strip()
+    quantity_raw = (row.get("quantity") or "").strip()
+    unit_cost_raw = (row.get("unit_cost") or "").strip()
+    name = (row.get("name") or "").strip()
+
+    if not jan_code:
+        return None, {
+            "row": row_index,
+            "code": "MISSING_JAN",
+            "jan_code": "",
+            "field": "jan_code",
+            "message": "jan_codeは必須です",
+        }, None
+
+    try:
+        quantity = int(quantity_raw)
+    except ValueError:
+        return None, {
+            "row": row_index,
+            "code": "INVALID_QUANTITY_TYPE",
+            "jan_code": jan_code,
+            "field": "quantity",
+            "message": "quantityは整数で指定してください",
+        }, None
+
+    if quantity < 0:
+        return None, None, {
+            "row": row_index,
+            "code": "INVALID_QUANTITY",
+            "jan_code": jan_code,
+            "field": "quantity",
+            "message": "quantityは0以上の整数で指定してください",
+        }
+
+    unit_cost = None
+    if unit_cost_raw != "":
+        try:
+            unit_cost = int(unit_cost_raw)
+        except ValueError:
+            return None, {
+                "row": row_index,
+                "code": "INVALID_UNIT_COST_TYPE",
+                "jan_code": jan_code,
+                "field": "unit_cost",
+                "message": "unit_costは整数で指定してください",
+            }, None
+
+    return ParsedRow(row=row_index, jan_code=jan_code, quantity=quantity, unit_cost=unit_cost, name=name), None, None
+
+
+def _chunked(rows: Iterator[ParsedRow]) -> Iterator[List[ParsedRow]]:
+    while True:
+        chunk = list(islice(rows, CHUNK_SIZE))
+        if not chunk:
+            return
+        yield chunk
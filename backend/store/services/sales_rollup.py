@@ -0,0 +1,104 @@
+# store/services/sales_rollup.py
+"""
+日別・商品別の売上/入荷ロールアップ (DailyProductSales)
+
+前回の集計日時を RollupState に持ち、そこから SAFETY_WINDOW さかのぼった日以降だけを
+StockTransaction から作り直す。created_at は INSERT 時刻でコミットはその後なので、
+大きな CSV 取込みのように遅れてコミットされた行も窓の中で拾い直せる。
+"""
+from __future__ import annotations
+
+import datetime
+from typing import Optional
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, Sum, Value, When
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from store.models import DailyProductSales, RollupState, StockTransaction
+from store.services.ledger import archived_until
+
+ROLLUP_NAME = "daily_product_sales"
+SAFETY_WINDOW = datetime.timedelta(hours=1)
+
+# 売上: 購入と、購入の取消（amend）
+SALE = Q(transaction_type="PURCHASE") | Q(transaction_type="CORRECTION", amended_of__transaction_type="PURCHASE")
+# 入荷: 入荷と、入荷の取消
+RESTOCK = Q(transaction_type="RESTOCK") | Q(transaction_type="CORRECTION", amended_of__transaction_type="RESTOCK")
+
+
+@transaction.atomic
+def update_sales_rollup(*, full: bool = False, now: Optional[datetime.datetime] = None) -> int:
+    """
+    ロールアップを更新し、書き込んだ (日付, 商品) の件数を返す。
+    full=True なら全期間（アーカイブ済みの日を除く）を作り直す。
+    """
+    now = now or timezone.now()
+    state, _ = RollupState.objects.get_or_create(name=ROLLUP_NAME)
+    # 同時実行されても二重に書かないよう、状態行をロックする
+    state = RollupState.objects.select_for_update().get(pk=state.pk)
+
+    since = None
+    if not full and state.last_run_at is not None:
+        since = _start_of_day(state.last_run_at - SAFETY_WINDOW)
+    # アーカイブ済みの日は台帳に行が残っていないので、既存の集計をそのまま残す
+    archived = archived_until()
+    if archived is not None:
+        boundary = _start_of_day(archived) + datetime.timedelta(days=1)
+        since = boundary if since is None else max(since, boundary)
+
+    ledger = StockTransaction.objects.filter(created_at__lt=now)
+    existing = DailyProductSales.objects.all()
+    if since is not None:
+        ledger = ledger.filter(created_at__gte=since)
+        existing = existing.filter(date__gte=timezone.localtime(since).date())
+
+    rows = (
+        ledger
+        .annotate(day=TruncDate("created_at"))
+        .values("day", "product_id")
+        .annotate(
+            units_sold=_sum(SALE, -F("delta")),
+            revenue=_sum(SALE, -F("delta") * Coalesce("unit_price", "product__price")),
+            restocked_units=_sum(RESTOCK, F("delta")),
+            restock_cost=_sum(RESTOCK, F("delta") * Coalesce("unit_cost", Value(0))),
+        )
+        .order_by()
+    )
+
+    rollups = [
+        DailyProductSales(
+            date=row["day"],
+            product_id=row["product_id"],
+            units_sold=row["units_sold"],
+            revenue=row["revenue"],
+            restocked_units=row["restocked_units"],
+            restock_cost=row["restock_cost"],
+        )
+        for row in rows
+    ]
+
+    # 対象期間は丸ごと置き換える（何度実行しても同じ結果になる）
+    existing.delete()
+    DailyProductSales.objects.bulk_create(rollups, batch_size=500)
+
+    state.last_run_at = now
+    state.save(update_fields=["last_run_at"])
+    return len(rollups)
+
+
+def last_run_at() -> Optional[datetime.datetime]:
+    return RollupState.objects.filter(name=ROLLUP_NAME).values_list("last_run_at", flat=True).first()
+
+
+def _sum(condition: Q, expression):
+    return Coalesce(
+        Sum(Case(When(condition, then=expression), default=Value(0), output_field=IntegerField())),
+        Value(0),
+    )
+
+
+def _start_of_day(value: datetime.datetime) -> datetime.datetime:
+    local = timezone.localtime(value)
+    return local.replace(hour=0, minute=0, second=0, microsecond=0)
@@ -0,0 +1,123 @@
+# store/services/stock.py
+from __future__ import annotations
+
+from collections import defaultdict
+from typing import Dict, Iterable, Mapping, Optional
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.db.models.functions import Now
+from django.utils import timezone
+
+from store.models import Product, ProductStock, StockTransaction
+from store.services import catalog, ledger, stock_alerts, stock_events
+
+
+def apply_deltas(deltas: Mapping[int, int], *, ensure_rows: bool = True) -> None:
+    """
+    商品ごとの在庫数 (ProductStock) に delta を加算する。
+
+    StockTransaction を作成したのと同じDBトランザクション内で呼ぶこと。
+    商品数によらず INSERT(ON CONFLICT DO NOTHING) と UPDATE の2クエリで済む。
+    在庫行があるとわかっている場合（ロック済みなど）は ensure_rows=False で UPDATE だけにする。
+    """
+    deltas = {product_id: delta for product_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    product_ids = sorted(deltas)
+
+    if ensure_rows:
+        # まだ行がない商品は 0 で作っておく（既存行はそのまま）
+        ProductStock.objects.bulk_create(
+            [ProductStock(product_id=product_id, quantity=0) for product_id in product_ids],
+            ignore_conflicts=True,
+        )
+
+    # F式で加算するので、同時に更新されても値は失われない
+    ProductStock.objects.filter(product_id__in=product_ids).update(
+        quantity=F("quantity") + Case(
+            *[When(product_id=product_id, then=Value(deltas[product_id])) for product_id in product_ids],
+            default=Value(0),
+            output_field=IntegerField(),
+        ),
+        updated_at=Now(),
+    )
+    catalog.invalidate_on_commit()
+    _publish_on_commit(product_ids)
+    stock_alerts.evaluate(deltas)
+
+
+def apply_transactions(transactions: Iterable[StockTransaction], *, ensure_rows: bool = True) -> None:
+    """
+    作成した StockTransaction の delta を商品ごとにまとめて在庫数へ反映する。
+    """
+    deltas: Dict[int, int] = defaultdict(int)
+    for tx in transactions:
+        deltas[tx.product_id] += tx.delta
+    apply_deltas(deltas, ensure_rows=ensure_rows)
+
+
+def ledger_balances() -> Dict[int, int]:
+    """
+    取引履歴から求めた商品ごとの在庫数を返す。
+    直近のチェックポイント (StockCheckpoint) 以降の取引だけを集計する（store.services.ledger）。
+    """
+    return ledger.balances_as_of()
+
+
+@transaction.atomic
+def rebuild_balances(product_ids: Optional[Iterable[int]] = None) -> int:
+    """
+    StockTransaction から在庫数を再計算して ProductStock を上書きする（product_ids 省略時は全商品）。
+    更新した商品数を返す。
+    """
+    products = Product.objects.all()
+    stocks = ProductStock.objects.select_for_update()
+    if product_ids is not None:
+        product_ids = list(product_ids)
+        products = products.filter(id__in=product_ids)
+        stocks = stocks.filter(product_id__in=product_ids)
+    ProductStock.objects.bulk_create(
+        [ProductStock(product_id=product_id, quantity=0) for product_id in products.values_list("id", flat=True)],
+        ignore_conflicts=True,
+    )
+
+    # 先に在庫行をロックしてから集計する。
+    # ロック待ちになった購入などは、解放後に自分の差分を加算するのでずれない。
+    stocks = list(stocks.order_by("product_id"))
+    balances = ledger.balances_as_of(product_ids=product_ids)
+
+    now = timezone.now()
+    changed = []
+    deltas = {}
+    for stock in stocks:
+        expected = balances.get(stock.product_id, 0)
+        if stock.quantity != expected:
+            deltas[stock.product_id] = expected - stock.quantity
+            stock.quantity = expected
+            stock.updated_at = now
+            changed.append(stock)
+
+    ProductStock.objects.bulk_update(changed, ["quantity", "updated_at"], batch_size=500)
+    if changed:
+        catalog.invalidate_on_commit()
+        _publish_on_commit([stock.product_id for stock in changed])
+        stock_alerts.evaluate(deltas)
+    return len(changed)
+
+
+def _publish_on_commit(product_ids) -> None:
+    """
+    SSE の購読者がいれば、更新後の在庫数を読んでコミット後に配信する（いなければ DB を読まない）
+    """
+    if not stock_events.has_subscribers():
+        stock_events.skip()
+        return
+    levels = list(
+        ProductStock.objects
+        .filter(product_id__in=product_ids)
+        .order_by("product_id")
+        .values_list("product__jan_code", "quantity")
+    )
+    transaction.on_commit(lambda: stock_events.publish(levels))
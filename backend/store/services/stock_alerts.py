@@ -0,0 +1,89 @@
+# store/services/stock_alerts.py
+"""
+在庫低下の通知（商品ごとの alert_threshold で判定）
+
+在庫を更新した商品をまとめて1クエリで読み、変更前は閾値より上で変更後に閾値以下になった商品だけ通知する
+（変更前の在庫 = 今の在庫 - 今回の delta）。閾値以下のままの購入や、閾値以下への入荷では通知しない。
+状態は ProductAlertState.is_low に残す（商品を作ったときに通知なしで作り、判定のたびに合わせる）。
+CSV 取込みやカート購入で複数商品が一度に下がっても、通知は1件にまとめて outbox に積む。
+"""
+from __future__ import annotations
+
+from typing import Iterable, List, Mapping, Optional
+
+from store.models import Product, ProductAlertState
+from store.services.notification.outbox import MAX_CONTENT_LENGTH, enqueue
+
+USERNAME = "Lab-Kiosk"
+
+
+def evaluate(deltas: Mapping[int, int], *, thresholds: Optional[Mapping[int, int]] = None) -> List[int]:
+    """
+    在庫を更新したのと同じトランザクション内で呼ぶ（在庫行のロック中なので同じ商品の判定は並ばない）。
+    deltas は商品ID → 今回の在庫の増減。閾値を変えた場合は delta 0 で、thresholds に変更前の閾値を渡す。
+    新たに閾値以下になった商品IDを返す
+    """
+    thresholds = thresholds or {}
+    rows = (
+        Product.objects
+        .with_stock()
+        .filter(id__in=list(deltas))
+        .order_by("id")
+        .values_list("id", "name", "jan_code", "alert_threshold", "stock_quantity", "alert_state__is_low")
+    )
+
+    crossed = []
+    changes = []
+    for product_id, name, jan_code, threshold, quantity, is_low in rows:
+        low = quantity <= threshold
+        was_low = quantity - deltas[product_id] <= thresholds.get(product_id, threshold)
+        if is_low is None or low != is_low:
+            changes.append(ProductAlertState(product_id=product_id, is_low=low))
+        if low and not was_low:
+            crossed.append((product_id, f"在庫低下: {name} (JAN:{jan_code}) 残り {quantity}"))
+
+    if changes:
+        ProductAlertState.objects.bulk_create(
+            changes,
+            update_conflicts=True,
+            unique_fields=["product"],
+            update_fields=["is_low", "changed_at"],
+        )
+    for content in _join([line for _, line in crossed]):
+        enqueue(content, username=USERNAME)
+    return [product_id for product_id, _ in crossed]
+
+
+def ensure_states(product_ids: Iterable[int]) -> None:
+    """
+    状態行がない商品に、今の在庫で判定した状態行を作る（通知はしない）。商品を作ったときに呼ぶ
+    """
+    rows = (
+        Product.objects
+        .with_stock()
+        .filter(id__in=list(product_ids), alert_state__isnull=True)
+        .values_list("id", "alert_threshold", "stock_quantity")
+    )
+    ProductAlertState.objects.bulk_create(
+        [
+            ProductAlertState(product_id=product_id, is_low=quantity <= threshold)
+            for product_id, threshold, quantity in rows
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def _join(lines: List[str]) -> List[str]:
+    """
+    Discord の文字数上限に収まるように行をまとめる
+    """
+    messages = []
+    current = ""
+    for line in lines:
+        if current and len(current) + 1 + len(line) > MAX_CONTENT_LENGTH:
+            messages.append(current)
+            current = ""
+        current = f"{current}\n{line}" if current else line
+    if current:
+        messages.append(current)
+    return messages
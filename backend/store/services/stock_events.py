@@ -0,0 +1,140 @@
+# store/services/stock_events.py
+"""
+在庫変更のプロセス内ブロードキャスト（GET /api/stream/stock の配信元）
+
+在庫を変える処理はすべて stock.apply_deltas を通るので、そこでコミット後に publish する。
+購読者（SSE の接続）がいないときは DB を読まず、番号だけ進めて「この間の履歴はない」と記録する。
+直近 BUFFER_SIZE 件は保持しておき、Last-Event-ID で再接続したクライアントには続きから送る。
+続きを送れない場合（再起動・履歴切れ・取りこぼし）は全商品の在庫スナップショットを送る。
+
+backend は uvicorn 1プロセスで動かす前提（docker-compose.yml）。管理コマンドなど
+別プロセスでの変更は届かないが、再接続時のスナップショットかカタログの ETag で追いつく。
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import threading
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Iterable, List, Optional, Tuple
+
+BUFFER_SIZE = 1000
+QUEUE_SIZE = 256
+MAX_SUBSCRIBERS = 32
+
+_BOOT_TOKEN = uuid.uuid4().hex[:8]
+_lock = threading.Lock()
+_seq = 0
+# この番号より前の変更は _buffer に揃っていない（購読者がいなくて記録しなかった）
+_complete_from = 1
+_buffer: "deque[Tuple[int, str]]" = deque(maxlen=BUFFER_SIZE)
+_subscribers: "set[Subscriber]" = set()
+
+
+class TooManySubscribers(Exception):
+    pass
+
+
+@dataclass(eq=False)
+class Subscriber:
+    loop: asyncio.AbstractEventLoop
+    queue: asyncio.Queue = field(default_factory=lambda: asyncio.Queue(maxsize=QUEUE_SIZE))
+    # キューが溢れて取りこぼした（スナップショットを送り直す）
+    lagged: bool = False
+
+
+def has_subscribers() -> bool:
+    return bool(_subscribers)
+
+
+def subscriber_count() -> int:
+    with _lock:
+        return len(_subscribers)
+
+
+def skip() -> None:
+    """
+    購読者がいないので記録しない変更があった
+    """
+    global _seq, _complete_from
+    with _lock:
+        _seq += 1
+        _complete_from = _seq + 1
+
+
+def publish(levels: Iterable[Tuple[str, int]]) -> None:
+    """
+    (jan_code, 在庫数) を購読者に送る。コミット後に呼ぶこと（任意のスレッドから呼べる）
+    """
+    global _seq
+    events = []
+    with _lock:
+        for jan_code, remaining in levels:
+            _seq += 1
+            data = json.dumps({"jan_code": jan_code, "remaining": remaining}, ensure_ascii=False, separators=(",", ":"))
+            event = (_seq, data)
+            _buffer.append(event)
+            events.append(event)
+        subscribers = list(_subscribers)
+
+    for subscriber in subscribers:
+        for event in events:
+            try:
+                subscriber.loop.call_soon_threadsafe(_deliver, subscriber, event)
+            except RuntimeError:
+                # イベントループが終了している
+                unsubscribe(subscriber)
+                break
+
+
+def subscribe(last_event_id: Optional[str]) -> Tuple[Subscriber, Optional[List[Tuple[int, str]]], int]:
+    """
+    購読を始める。実行中のイベントループから呼ぶこと。
+    戻り値は (購読者, Last-Event-ID の続きのイベント, 購読開始時点の番号)。
+    続きが送れなければイベントは None（スナップショットを送る）
+    """
+    subscriber = Subscriber(loop=asyncio.get_running_loop())
+    with _lock:
+        if len(_subscribers) >= MAX_SUBSCRIBERS:
+            raise TooManySubscribers()
+        _subscribers.add(subscriber)
+        return subscriber, _backlog(last_event_id), _seq
+
+
+def unsubscribe(subscriber: Subscriber) -> None:
+    with _lock:
+        _subscribers.discard(subscriber)
+
+
+def latest_seq() -> int:
+    with _lock:
+        return _seq
+
+
+def event_id(seq: int) -> str:
+    return f"{_BOOT_TOKEN}-{seq}"
+
+
+def _backlog(last_event_id: Optional[str]) -> Optional[List[Tuple[int, str]]]:
+    if not last_event_id:
+        return None
+    boot, _, seq_raw = last_event_id.partition("-")
+    if boot != _BOOT_TOKEN or not seq_raw.isdigit():
+        return None
+    seq = int(seq_raw)
+    oldest = _buffer[0][0] if _buffer else _seq + 1
+    if seq + 1 < max(oldest, _complete_from) or seq > _seq:
+        return None
+    return [event for event in _buffer if event[0] > seq]
+
+
+def _deliver(subscriber: Subscriber, event: Tuple[int, str]) -> None:
+    # イベントループのスレッドで動く
+    if subscriber.lagged:
+        return
+    try:
+        subscriber.queue.put_nowait(event)
+    except asyncio.QueueFull:
+        subscriber.lagged = True
@@ -0,0 +1,125 @@
+# store/services/stocktake.py
+"""
+棚卸し（POST /api/stocktakes）
+
+数えた時刻 counted_at 時点の帳簿上の在庫数（ledger.balances_as_of、チェックポイント + 1回の集計）と
+数えた数を比べ、差がある商品だけ CORRECTION（amended_of なし）を bulk_create で作る。
+
+- 差分は counted_at 時点の在庫に対して求めるので、数えている間や数えた後の購入はそのまま残る
+  （現在の在庫数 = 現在の在庫数 + 差分）
+- 在庫行を主キー順にロックしてから集計する。購入・チェックアウトは在庫行をロックしてから取引を作るので、
+  集計中に購入が割り込んでも差分はずれない
+"""
+from __future__ import annotations
+
+import datetime
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from django.db import transaction
+from django.utils import timezone
+
+from store.models import Product, ProductStock, StockTransaction
+from store.services import ledger
+from store.services.stock import apply_transactions
+
+MAX_ITEMS = 5000
+DEFAULT_DESCRIPTION = "stocktake"
+
+
+class StocktakeError(Exception):
+    """
+    API層はこれを捕まえてHTTPのエラーに変換する
+    """
+    def __init__(self, error_code: str, *, jan_codes: Optional[List[str]] = None):
+        self.code = error_code
+        self.jan_codes = jan_codes or []
+        super().__init__(error_code)
+
+
+@dataclass
+class StocktakeResult:
+    counted_at: datetime.datetime
+    rows: List[dict] = field(default_factory=list)
+    dry_run: bool = False
+
+    def body(self) -> dict:
+        summary = {
+            "counted_at": self.counted_at,
+            "product_count": len(self.rows),
+            "variance_count": sum(1 for row in self.rows if row["variance"]),
+            # 数え間違いの確認用（プラスとマイナスを相殺しない）
+            "surplus": sum(row["variance"] for row in self.rows if row["variance"] > 0),
+            "shortage": -sum(row["variance"] for row in self.rows if row["variance"] < 0),
+        }
+        if self.dry_run:
+            summary["dry_run"] = True
+        return {"status": "ok", "stocktake": summary, "results": self.rows}
+
+
+@transaction.atomic
+def take_stock(counts: Dict[str, int], *, counted_at: Optional[datetime.datetime] = None,
+               description: str = "", dry_run: bool = False) -> StocktakeResult:
+    """
+    counts は jan_code → 数えた数。counted_at を省略すると今数えたものとして扱う。
+    counted_at 以前の取引履歴がアーカイブ済みでチェックポイントもない場合は ledger.LedgerArchivedError
+    """
+    now = timezone.now()
+    counted_at = counted_at or now
+    if counted_at > now:
+        raise StocktakeError("counted_at_in_future")
+
+    products = {
+        jan_code: (product_id, name)
+        for product_id, jan_code, name in Product.objects.filter(jan_code__in=list(counts)).values_list(
+            "id", "jan_code", "name"
+        )
+    }
+    missing = [jan_code for jan_code in counts if jan_code not in products]
+    if missing:
+        raise StocktakeError("product_not_found", jan_codes=missing)
+
+    product_ids = sorted(product_id for product_id, _ in products.values())
+    if not dry_run:
+        # 一度も入荷していない商品も在庫行を作ってからロックする
+        ProductStock.objects.bulk_create(
+            [ProductStock(product_id=product_id, quantity=0) for product_id in product_ids],
+            ignore_conflicts=True,
+        )
+        list(
+            ProductStock.objects.select_for_update().filter(product_id__in=product_ids)
+            .order_by("product_id").values_list("product_id", flat=True)
+        )
+    balances = ledger.balances_as_of(counted_at, product_ids=product_ids)
+
+    result = StocktakeResult(counted_at=counted_at, dry_run=dry_run)
+    corrections = []
+    for jan_code, counted in counts.items():
+        product_id, name = products[jan_code]
+        expected = balances.get(product_id, 0)
+        variance = counted - expected
+        result.rows.append({
+            "jan_code": jan_code,
+            "name": name,
+            "expected": expected,
+            "counted": counted,
+            "variance": variance,
+            "transaction_id": None,
+        })
+        if variance:
+            corrections.append(StockTransaction(
+                product_id=product_id,
+                transaction_type="CORRECTION",
+                delta=variance,
+                description=description or DEFAULT_DESCRIPTION,
+            ))
+
+    if dry_run or not corrections:
+        return result
+
+    StockTransaction.objects.bulk_create(corrections)
+    apply_transactions(corrections, ensure_rows=False)
+    transaction_ids = {tx.product_id: tx.id for tx in corrections}
+    for row in result.rows:
+        row["transaction_id"] = transaction_ids.get(products[row["jan_code"]][0])
+    return result
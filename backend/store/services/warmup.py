@@ -0,0 +1,58 @@
+# store/services/warmup.py
+"""
+起動時の処理（config/asgi.py・config/wsgi.py から呼ぶ）
+
+- warm_up(): STARTUP_WARMUP = True のとき。最初の購入・商品一覧が「接続確立 + URL 解決の構築 +
+  カタログ作成 + ルックアップのミス」をまとめて払わないように、起動時に済ませておく。
+  DB がまだ起動していなくても失敗はログだけにする。
+- start_workers(): プロセス内ワーカーを起動する。再起動前に積まれた通知や CSV 取込みジョブ
+  （lease の切れた処理中のものも）は、新しい通知・アップロードを待たずに処理する。
+"""
+from __future__ import annotations
+
+import logging
+import time
+
+from django.conf import settings
+from django.db import connection
+from django.urls import get_resolver
+
+from store.models import Product, User
+from store.services import catalog, lookup
+
+logger = logging.getLogger(__name__)
+
+
+def warm_up() -> dict:
+    started = time.perf_counter()
+    # URL 設定を読み込む（ビューのモジュールもここで import される）
+    get_resolver().url_patterns
+    try:
+        connection.ensure_connection()
+        catalog.get_catalog()
+        limit = getattr(settings, "LOOKUP_CACHE_SIZE", 1024)
+        for jan_code, product_id in Product.objects.order_by("-updated_at").values_list("jan_code", "id")[:limit]:
+            lookup.products.set(jan_code, product_id)
+        for student_id, user_id in User.objects.order_by("-created_at").values_list("student_id", "id")[:limit]:
+            lookup.users.set(student_id, user_id)
+    except Exception:
+        logger.warning("Startup warm-up failed", exc_info=True)
+        return {"ok": False, "seconds": round(time.perf_counter() - started, 3)}
+    finally:
+        # リクエストは別スレッド（ASGI のスレッドプールなど）で処理されるので、この接続は使われない
+        connection.close()
+
+    seconds = round(time.perf_counter() - started, 3)
+    logger.info("Startup warm-up done in %.3fs", seconds)
+    return {"ok": True, "seconds": seconds}
+
+
+def start_workers() -> None:
+    """
+    プロセス内ワーカーを起動する（設定で無効なら何もしない）
+    """
+    from store.services import import_jobs
+    from store.services.notification import outbox
+
+    outbox.wake()
+    import_jobs.wake()
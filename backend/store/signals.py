@@ -0,0 +1,56 @@
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from store.models import Product, StockTransaction, User
+from store.services import billing, catalog, lookup, metrics, stock_alerts
+
+
+@receiver(connection_created)
+def install_query_metrics(sender, connection, **kwargs):
+    """
+    リクエストごとの SQL 件数・DB 時間を数える（store.services.metrics）
+    """
+    metrics.install(connection)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=StockTransaction)
+@receiver(post_delete, sender=StockTransaction)
+def invalidate_catalog(sender, **kwargs):
+    """
+    商品・取引が変わったらカタログキャッシュを破棄する
+    （bulk_create などシグナルが飛ばない経路は apply_deltas 側で破棄する）
+    """
+    catalog.invalidate_on_commit()
+
+
+@receiver(post_save, sender=StockTransaction)
+@receiver(post_delete, sender=StockTransaction)
+def invalidate_monthly_statement(sender, instance, **kwargs):
+    """
+    締め済みの月の取引を変えた・消した（管理画面など）ら、その月の請求明細のキャッシュを捨てる
+    """
+    billing.invalidate([instance.created_at])
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_lookup(sender, **kwargs):
+    lookup.users.clear()
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_product_lookup(sender, **kwargs):
+    lookup.products.clear()
+
+
+@receiver(post_save, sender=Product)
+def create_alert_state(sender, instance, created, **kwargs):
+    """
+    新しい商品は在庫 0 の状態行を通知なしで作る（最初の入荷を「在庫低下」と誤判定しない）
+    """
+    if created:
+        stock_alerts.ensure_states([instance.pk])
@@ -1,3 +1,1316 @@
-from django.test import TestCase
+import csv
+import json
+import tempfile
+import threading
+import uuid
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.db.models import F
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from store.models import (
+    DailyProductSales,
+    IdempotencyKey,
+    LedgerArchive,
+    MonthlyStatement,
+    NotificationOutbox,
+    Product,
+    ProductAlertState,
+    ProductStock,
+    RestockImportJob,
+    StockTransaction,
+    User,
+)
+from store.services import billing, catalog, import_jobs, ledger, lookup, restock_import, sales_rollup, stock_alerts
+from store.services.amend import amend_transactions
+from store.services.notification.outbox import OutboxWorker, enqueue
+from store.services.purchase import PurchaseError, checkout, purchase_one
+from store.services.stock import apply_deltas
+
+THREADS = 8
+
+
+class ConcurrentPurchaseTests(TransactionTestCase):
+    """
+    同時購入で在庫数より多く売らないこと（PostgreSQL は在庫行のロック、SQLite は BEGIN IMMEDIATE）
+    """
+
+    def setUp(self):
+        if connection.vendor == "sqlite" and connection.is_in_memory_db():
+            self.skipTest("スレッドごとの接続で同じ DB を使うため、ファイルの SQLite が必要（SQLITE_PATH）")
+        lookup.products.clear()
+        lookup.users.clear()
+        self.user = User.objects.create(student_id="s-concurrent", name="concurrent")
+        self.product = Product.objects.create(jan_code="4900000000001", name="concurrent", price=100, alert_threshold=0)
+
+    def restock(self, quantity):
+        StockTransaction.objects.create(product=self.product, transaction_type="RESTOCK", delta=quantity)
+        apply_deltas({self.product.id: quantity})
+
+    def run_threads(self, attempts, buy):
+        """
+        attempts 回の購入を THREADS 本のスレッドで同時に始め、(成功数, 在庫切れ数, その他の例外) を返す
+        """
+        barrier = threading.Barrier(THREADS)
+        lock = threading.Lock()
+        counts = {"ok": 0, "out_of_stock": 0}
+        errors = []
+
+        def worker(count):
+            try:
+                barrier.wait()
+                for _ in range(count):
+                    try:
+                        units = buy()
+                    except PurchaseError as e:
+                        if e.code != "out_of_stock":
+                            raise
+                        with lock:
+                            counts["out_of_stock"] += 1
+                    else:
+                        with lock:
+                            counts["ok"] += units
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=worker, args=(attempts // THREADS + (i < attempts % THREADS),))
+            for i in range(THREADS)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return counts["ok"], counts["out_of_stock"], errors
+
+    def assert_sold_exactly(self, stock, sold):
+        self.assertEqual(sold, stock)
+        self.assertEqual(ProductStock.objects.get(product=self.product).quantity, 0)
+        purchased = StockTransaction.objects.filter(product=self.product, transaction_type="PURCHASE")
+        self.assertEqual(-sum(purchased.values_list("delta", flat=True)), stock)
+
+    def test_purchase_one_does_not_oversell(self):
+        self.restock(20)
+
+        def buy():
+            purchase_one(student_id=self.user.student_id, jan_code=self.product.jan_code)
+            return 1
+
+        sold, out_of_stock, errors = self.run_threads(60, buy)
+
+        self.assertEqual(errors, [])
+        self.assert_sold_exactly(20, sold)
+        self.assertEqual(out_of_stock, 40)
+
+    def test_checkout_does_not_oversell(self):
+        self.restock(21)
+
+        def buy():
+            checkout(student_id=self.user.student_id, items=[(self.product.jan_code, 2)])
+            return 2
+
+        sold, out_of_stock, errors = self.run_threads(30, buy)
+
+        self.assertEqual(errors, [])
+        # 残り1個は2個ずつのチェックアウトでは買えない
+        self.assertEqual(sold, 20)
+        self.assertEqual(ProductStock.objects.get(product=self.product).quantity, 1)
+        self.assertEqual(out_of_stock, 20)
+
+
+class _StubWebhookHandler(BaseHTTPRequestHandler):
+    """
+    Discord Webhook のスタブ。server.responses の先頭から (ステータス, ヘッダ) を返す（空なら 204）
+    """
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.server.payloads.append(json.loads(self.rfile.read(length)))
+        status, headers = self.server.responses.pop(0) if self.server.responses else (204, {})
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+@override_settings(DISCORD_NOTIFY_IN_PROCESS_WORKER=False)
+class OutboxWorkerTests(TestCase):
+    """
+    OutboxWorker.process_once をローカルのスタブサーバーに向けて動かす
+    """
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _StubWebhookHandler)
+        self.server.payloads = []
+        self.server.responses = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/webhook"
+
+    def worker(self, **kwargs):
+        kwargs.setdefault("coalesce_seconds", 0)
+        return OutboxWorker(self.url, **kwargs)
+
+    def enqueue(self, *contents, username="Lab-Kiosk"):
+        with self.settings(DISCORD_WEBHOOK_URL=self.url):
+            return [enqueue(content, username=username) for content in contents]
+
+    def test_coalesces_notifications_into_one_call(self):
+        self.enqueue("a", "b", "c")
+        worker = self.worker(coalesce_seconds=5)
+        now = timezone.now()
+
+        # 最古の通知から coalesce_seconds たつまでは送らない
+        self.assertGreater(worker.process_once(now=now), 0)
+        self.assertEqual(self.server.payloads, [])
+
+        worker.process_once(now=now + timedelta(seconds=6))
+
+        self.assertEqual(self.server.payloads, [{"content": "a\nb\nc", "username": "Lab-Kiosk"}])
+        self.assertEqual(NotificationOutbox.objects.filter(status="SENT").count(), 3)
+
+    def test_rate_limit_waits_for_retry_after_without_counting_attempts(self):
+        (entry,) = self.enqueue("low stock")
+        self.server.responses.append((429, {"Retry-After": "30"}))
+        worker = self.worker()
+        now = timezone.now()
+
+        self.assertGreater(worker.process_once(now=now), 29)
+
+        entry.refresh_from_db()
+        self.assertEqual((entry.status, entry.attempts), ("PENDING", 0))
+        self.assertGreaterEqual(entry.next_attempt_at, now + timedelta(seconds=29))
+        # 待っている間はサーバーに送らない
+        self.assertGreater(worker.process_once(now=now + timedelta(seconds=60)), 0)
+        self.assertEqual(len(self.server.payloads), 1)
+
+    def test_backs_off_and_gives_up_after_max_attempts(self):
+        (entry,) = self.enqueue("low stock")
+        self.server.responses.extend([(500, {})] * 3)
+        worker = self.worker(max_attempts=3, backoff_base=2)
+        now = timezone.now()
+
+        worker.process_once(now=now)
+        entry.refresh_from_db()
+        self.assertEqual((entry.status, entry.attempts), ("PENDING", 1))
+        self.assertEqual(entry.next_attempt_at, now + timedelta(seconds=2))
+
+        # バックオフ中は送らない
+        self.assertAlmostEqual(worker.process_once(now=now + timedelta(seconds=1)), 1, places=3)
+        self.assertEqual(len(self.server.payloads), 1)
+
+        worker.process_once(now=now + timedelta(seconds=2))
+        entry.refresh_from_db()
+        self.assertEqual((entry.status, entry.attempts), ("PENDING", 2))
+        self.assertEqual(entry.next_attempt_at, now + timedelta(seconds=2 + 4))
+
+        worker.process_once(now=now + timedelta(seconds=6))
+        entry.refresh_from_db()
+        self.assertEqual((entry.status, entry.attempts), ("FAILED", 3))
+        self.assertIn("HTTP 500", entry.last_error)
+        self.assertIsNone(worker.process_once(now=now + timedelta(days=1)))
+        self.assertEqual(len(self.server.payloads), 3)
+
+
+def _restock(product, quantity):
+    tx = StockTransaction.objects.create(product=product, transaction_type="RESTOCK", delta=quantity)
+    apply_deltas({product.id: quantity})
+    return tx
+
+
+def _quantity(product):
+    return ProductStock.objects.get(product=product).quantity
+
+
+class IdempotentPurchaseTests(TestCase):
+    """
+    POST /api/purchases の Idempotency-Key
+    """
+
+    def setUp(self):
+        lookup.products.clear()
+        lookup.users.clear()
+        self.client = Client(HTTP_HOST="localhost")
+        self.user = User.objects.create(student_id="s-idem", name="idem")
+        self.product = Product.objects.create(jan_code="4900000000101", name="idem", price=100, alert_threshold=0)
+        _restock(self.product, 5)
+
+    def purchase(self, key, jan_code=None):
+        return self.client.post(
+            "/api/purchases",
+            {"student_id": self.user.student_id, "jan_code": jan_code or self.product.jan_code},
+            content_type="application/json",
+            HTTP_IDEMPOTENCY_KEY=key,
+        )
+
+    def test_replay_returns_stored_result_without_buying_again(self):
+        first = self.purchase("key-1")
+        second = self.purchase("key-1")
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.json(), first.json())
+        self.assertNotIn("Idempotent-Replayed", first)
+        self.assertEqual(second["Idempotent-Replayed"], "true")
+        self.assertEqual(StockTransaction.objects.filter(transaction_type="PURCHASE").count(), 1)
+        self.assertEqual(_quantity(self.product), 4)
+
+    def test_same_key_with_different_body_is_rejected(self):
+        other = Product.objects.create(jan_code="4900000000102", name="other", price=100, alert_threshold=0)
+        _restock(other, 5)
+        self.purchase("key-1")
+
+        response = self.purchase("key-1", jan_code=other.jan_code)
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(response.json(), {"error": "idempotency_key_reused"})
+        self.assertEqual(_quantity(other), 5)
+        self.assertEqual(StockTransaction.objects.filter(transaction_type="PURCHASE").count(), 1)
+
+
+class ConcurrentIdempotentPurchaseTests(TransactionTestCase):
+    """
+    同じ Idempotency-Key の購入が同時に届いても、取引は1件だけ作られること
+    """
+
+    def setUp(self):
+        if connection.vendor == "sqlite" and connection.is_in_memory_db():
+            self.skipTest("スレッドごとの接続で同じ DB を使うため、ファイルの SQLite が必要（SQLITE_PATH）")
+        lookup.products.clear()
+        lookup.users.clear()
+        self.user = User.objects.create(student_id="s-idem-concurrent", name="idem")
+        self.product = Product.objects.create(jan_code="4900000000111", name="idem", price=100, alert_threshold=0)
+        _restock(self.product, 20)
+
+    def test_concurrent_same_key_writes_ledger_once(self):
+        barrier = threading.Barrier(THREADS)
+        responses = []
+        errors = []
+
+        def worker():
+            try:
+                client = Client(HTTP_HOST="localhost")
+                barrier.wait()
+                responses.append(client.post(
+                    "/api/purchases",
+                    {"student_id": self.user.student_id, "jan_code": self.product.jan_code},
+                    content_type="application/json",
+                    HTTP_IDEMPOTENCY_KEY="same-key",
+                ))
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual([r.status_code for r in responses], [200] * THREADS)
+        self.assertEqual({r.content for r in responses}, {responses[0].content})
+        self.assertEqual(sum(r.has_header("Idempotent-Replayed") for r in responses), THREADS - 1)
+        self.assertEqual(StockTransaction.objects.filter(transaction_type="PURCHASE").count(), 1)
+        self.assertEqual(IdempotencyKey.objects.count(), 1)
+        self.assertEqual(_quantity(self.product), 19)
+
+
+class AmendBulkTests(TestCase):
+    """
+    POST /api/transactions/amend-bulk は1件でも取り消せなければ何も作らない
+    """
+
+    def setUp(self):
+        self.client = Client(HTTP_HOST="localhost")
+        self.product = Product.objects.create(jan_code="4900000000201", name="amend", price=100, alert_threshold=0)
+        self.first = _restock(self.product, 10)
+        self.second = _restock(self.product, 5)
+
+    def amend_bulk(self, ids=None, **selector):
+        if ids is not None:
+            selector["ids"] = ids
+        return self.client.post("/api/transactions/amend-bulk", selector, content_type="application/json")
+
+    def test_amends_all_transactions(self):
+        response = self.amend_bulk([self.first.id, self.second.id])
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["amended_count"], 2)
+        self.assertEqual(
+            set(StockTransaction.objects.filter(transaction_type="CORRECTION").values_list("amended_of_id", "delta")),
+            {(self.first.id, -10), (self.second.id, -5)},
+        )
+        self.assertEqual(_quantity(self.product), 0)
+
+    def test_unknown_id_fails_whole_request(self):
+        response = self.amend_bulk([self.first.id, self.second.id + 1000])
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json(), {"error": "transaction_not_found", "ids": [self.second.id + 1000]})
+        self.assertFalse(StockTransaction.objects.filter(transaction_type="CORRECTION").exists())
+        self.assertEqual(_quantity(self.product), 15)
+
+    def test_already_amended_returns_409_and_writes_nothing(self):
+        self.assertEqual(self.amend_bulk([self.first.id]).status_code, 201)
+
+        response = self.amend_bulk([self.first.id, self.second.id])
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json(), {"error": "already_amended", "ids": [self.first.id]})
+        self.assertFalse(StockTransaction.objects.filter(amended_of=self.second).exists())
+        self.assertEqual(StockTransaction.objects.filter(transaction_type="CORRECTION").count(), 1)
+        self.assertEqual(_quantity(self.product), 5)
+
+    def test_amends_checkout_by_checkout_id(self):
+        lookup.products.clear()
+        lookup.users.clear()
+        user = User.objects.create(student_id="s-amend", name="amend")
+        other = Product.objects.create(jan_code="4900000000202", name="other", price=50, alert_threshold=0)
+        _restock(other, 3)
+        result = checkout(student_id=user.student_id, items=[(self.product.jan_code, 2), (other.jan_code, 1)])
+
+        response = self.amend_bulk(checkout_id=str(result.checkout_id))
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["amended_count"], 2)
+        self.assertEqual(_quantity(self.product), 15)
+        self.assertEqual(_quantity(other), 3)
+        # 入荷は取り消さない
+        self.assertFalse(StockTransaction.objects.filter(amended_of__in=[self.first, self.second]).exists())
+
+    def test_amends_import_by_import_id(self):
+        import_id = uuid.uuid4()
+        imported = [
+            StockTransaction.objects.create(
+                product=self.product, transaction_type="RESTOCK", delta=delta, import_id=import_id,
+            )
+            for delta in (4, 6)
+        ]
+        apply_deltas({self.product.id: 10})
+
+        response = self.amend_bulk(import_id=str(import_id))
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            set(StockTransaction.objects.filter(transaction_type="CORRECTION").values_list("amended_of_id", flat=True)),
+            {tx.id for tx in imported},
+        )
+        self.assertEqual(_quantity(self.product), 15)
+
+    def test_unknown_checkout_id_returns_404(self):
+        response = self.amend_bulk(checkout_id=str(uuid.uuid4()))
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json()["error"], "transaction_not_found")
+
+    def test_correction_fails_whole_request(self):
+        self.assertEqual(self.amend_bulk([self.first.id]).status_code, 201)
+        correction = StockTransaction.objects.get(amended_of=self.first)
+
+        response = self.amend_bulk([self.second.id, correction.id])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"error": "cannot_amend_correction", "ids": [correction.id]})
+        self.assertFalse(StockTransaction.objects.filter(amended_of=self.second).exists())
+
+    def test_selector_must_be_exactly_one(self):
+        for selector in ({}, {"ids": [self.first.id], "checkout_id": str(uuid.uuid4())}, {"ids": []}):
+            with self.subTest(selector=selector):
+                response = self.client.post(
+                    "/api/transactions/amend-bulk", selector, content_type="application/json",
+                )
+                self.assertEqual(response.status_code, 400)
+        self.assertFalse(StockTransaction.objects.filter(transaction_type="CORRECTION").exists())
+
+
+
+class StocktakeTests(TestCase):
+    """
+    POST /api/stocktakes は counted_at 時点の在庫と比べる
+    """
+
+    def setUp(self):
+        lookup.products.clear()
+        lookup.users.clear()
+        self.client = Client(HTTP_HOST="localhost")
+        self.user = User.objects.create(student_id="s-stocktake", name="stocktake")
+        self.counted = Product.objects.create(jan_code="4900000000301", name="a", price=100, alert_threshold=0)
+        self.short = Product.objects.create(jan_code="4900000000302", name="b", price=100, alert_threshold=0)
+        _restock(self.counted, 10)
+        _restock(self.short, 10)
+
+    def stocktake(self, counts, **data):
+        items = [{"jan_code": jan_code, "quantity": quantity} for jan_code, quantity in counts.items()]
+        return self.client.post("/api/stocktakes", {"items": items, **data}, content_type="application/json")
+
+    def backdate(self, days):
+        """
+        商品と入荷をまとめて days 日前のものにする（アーカイブ・チェックポイントの対象にするため）
+        """
+        past = timezone.now() - timedelta(days=days)
+        Product.objects.update(created_at=past)
+        StockTransaction.objects.update(created_at=past)
+        return past
+
+    def test_purchase_during_count_is_kept(self):
+        counted_at = timezone.now()
+        # 数え終わってから棚卸しを送るまでの間に売れた分
+        purchase_one(student_id=self.user.student_id, jan_code=self.counted.jan_code)
+        purchase_one(student_id=self.user.student_id, jan_code=self.short.jan_code)
+
+        response = self.stocktake(
+            {self.counted.jan_code: 10, self.short.jan_code: 7}, counted_at=counted_at.isoformat(),
+        )
+
+        self.assertEqual(response.status_code, 201)
+        rows = {row["jan_code"]: row for row in response.json()["results"]}
+        self.assertEqual((rows[self.counted.jan_code]["expected"], rows[self.counted.jan_code]["variance"]), (10, 0))
+        self.assertEqual((rows[self.short.jan_code]["expected"], rows[self.short.jan_code]["variance"]), (10, -3))
+        # 数えた後の購入は打ち消さない
+        self.assertEqual(_quantity(self.counted), 9)
+        self.assertEqual(_quantity(self.short), 6)
+        self.assertEqual(
+            list(StockTransaction.objects.filter(transaction_type="CORRECTION").values_list("product_id", "delta")),
+            [(self.short.id, -3)],
+        )
+
+    def test_matching_count_creates_no_correction(self):
+        response = self.stocktake({self.counted.jan_code: 10, self.short.jan_code: 10})
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["stocktake"]["variance_count"], 0)
+        self.assertEqual([row["transaction_id"] for row in response.json()["results"]], [None, None])
+        self.assertFalse(StockTransaction.objects.filter(transaction_type="CORRECTION").exists())
+        self.assertEqual((_quantity(self.counted), _quantity(self.short)), (10, 10))
+
+    def test_counted_at_after_archive_uses_checkpoint(self):
+        self.backdate(days=10)
+        ledger.archive_before(timezone.now() - timedelta(days=5))
+        self.assertFalse(StockTransaction.objects.exists())
+        purchase_one(student_id=self.user.student_id, jan_code=self.short.jan_code)
+
+        response = self.stocktake(
+            {self.counted.jan_code: 10, self.short.jan_code: 8},
+            counted_at=(timezone.now() - timedelta(days=1)).isoformat(),
+        )
+
+        self.assertEqual(response.status_code, 201)
+        rows = {row["jan_code"]: row for row in response.json()["results"]}
+        self.assertEqual(rows[self.counted.jan_code]["expected"], 10)
+        self.assertEqual((rows[self.short.jan_code]["expected"], rows[self.short.jan_code]["variance"]), (10, -2))
+        self.assertEqual(_quantity(self.short), 7)
+
+    def test_counted_at_inside_archived_range_is_rejected(self):
+        past = self.backdate(days=10)
+        ledger.archive_before(timezone.now() - timedelta(days=5))
+
+        response = self.stocktake(
+            {self.counted.jan_code: 3}, counted_at=(past + timedelta(days=1)).isoformat(),
+        )
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json(), {"error": "ledger_archived"})
+        self.assertFalse(StockTransaction.objects.exists())
+        self.assertEqual(_quantity(self.counted), 10)
+
+
+class LedgerArchiveTests(TestCase):
+    """
+    ledger.archive_before は取引を LedgerArchive に移して元の行を消す
+    """
+
+    def setUp(self):
+        self.now = timezone.now()
+        self.cutoff = self.now - timedelta(days=5)
+        self.product = Product.objects.create(jan_code="4900000000401", name="archive", price=100, alert_threshold=0)
+        Product.objects.update(created_at=self.now - timedelta(days=30))
+        self.user = User.objects.create(student_id="s-archive", name="archive")
+
+        self.restock = self.add("RESTOCK", 10, days=20, microsecond=123456, import_id=uuid.uuid4())
+        self.sold = self.add("PURCHASE", -2, days=15, microsecond=1, checkout_id=uuid.uuid4())
+        self.voided = self.add("PURCHASE", -1, days=12, microsecond=999999)
+        self.voided_amend = self.add("CORRECTION", 1, days=11, microsecond=500, amended_of=self.voided)
+        # 保存期間内の取消から参照されている取引は残す
+        self.kept = self.add("PURCHASE", -3, days=8, microsecond=42)
+        self.kept_amend = self.add("CORRECTION", 3, days=1, microsecond=7, amended_of=self.kept)
+        self.recent = self.add("PURCHASE", -1, days=2, microsecond=250)
+
+    def add(self, transaction_type, delta, *, days, microsecond, **fields):
+        tx = StockTransaction.objects.create(
+            product=self.product, user=self.user, transaction_type=transaction_type, delta=delta,
+            unit_price=100 if transaction_type == "PURCHASE" else None, description=transaction_type.lower(),
+            **fields,
+        )
+        created_at = (self.now - timedelta(days=days)).replace(microsecond=microsecond)
+        StockTransaction.objects.filter(pk=tx.pk).update(created_at=created_at)
+        tx.refresh_from_db()
+        return tx
+
+    def archived_rows(self):
+        return [row for archive in LedgerArchive.objects.order_by("first_id") for row in ledger.iter_archive_rows(archive)]
+
+    def expected_rows(self, *transactions):
+        return [
+            {
+                **dict(zip(ledger.ARCHIVE_COLUMNS, row)),
+                "checkout_id": row[-2] and str(row[-2]),
+                "import_id": row[-1] and str(row[-1]),
+            }
+            for row in StockTransaction.objects.filter(id__in=[tx.id for tx in transactions])
+            .order_by("created_at", "id").values_list(*ledger.ARCHIVE_COLUMNS)
+        ]
+
+    def test_archived_rows_match_deleted_rows(self):
+        expected = self.expected_rows(self.restock, self.sold, self.voided, self.voided_amend)
+
+        self.assertEqual(ledger.archive_before(self.cutoff), (1, 4))
+
+        rows = self.archived_rows()
+        for row in rows:
+            row["created_at"] = parse_datetime(row["created_at"])
+        self.assertEqual(rows, expected)
+        self.assertEqual(
+            [row["created_at"].microsecond for row in rows], [123456, 1, 999999, 500],
+        )
+        self.assertFalse(
+            StockTransaction.objects.filter(id__in=[self.restock.id, self.sold.id, self.voided.id]).exists()
+        )
+
+    def test_transactions_with_retained_amendments_are_kept(self):
+        ledger.archive_before(self.cutoff)
+
+        self.assertEqual(
+            set(StockTransaction.objects.values_list("id", flat=True)),
+            {self.kept.id, self.kept_amend.id, self.recent.id},
+        )
+        self.assertNotIn(self.kept.id, {row["id"] for row in self.archived_rows()})
+        self.assertEqual(StockTransaction.objects.get(pk=self.kept_amend.pk).amended_of_id, self.kept.id)
+
+    def test_balances_are_unchanged_by_archiving(self):
+        points = [None, self.now, self.cutoff + timedelta(hours=1), self.now - timedelta(days=1, hours=12)]
+        before = [ledger.balances_as_of(as_of, product_ids=[self.product.id]) for as_of in points]
+
+        ledger.archive_before(self.cutoff, batch_size=2)
+
+        self.assertEqual(LedgerArchive.objects.count(), 2)
+        after = [ledger.balances_as_of(as_of, product_ids=[self.product.id]) for as_of in points]
+        self.assertEqual(after, before)
+        self.assertEqual(before[0], {self.product.id: 10 - 2 - 1 + 1 - 3 + 3 - 1})
+
+    def test_failure_in_a_batch_rolls_back_its_delete(self):
+        remaining = set(StockTransaction.objects.values_list("id", flat=True))
+
+        with mock.patch.object(catalog, "invalidate_on_commit", side_effect=[None, RuntimeError("boom")]):
+            with self.assertRaises(RuntimeError):
+                ledger.archive_before(self.cutoff, batch_size=2)
+
+        # 1バッチ目（新しい方の2件）は移り、失敗した2バッチ目はアーカイブも削除も残らない
+        (archive,) = LedgerArchive.objects.all()
+        moved = {row["id"] for row in ledger.iter_archive_rows(archive)}
+        self.assertEqual(moved, {self.voided.id, self.voided_amend.id})
+        self.assertEqual(set(StockTransaction.objects.values_list("id", flat=True)), remaining - moved)
+
+
+@override_settings(DISCORD_WEBHOOK_URL="http://127.0.0.1:9/webhook", DISCORD_NOTIFY_IN_PROCESS_WORKER=False)
+class StockAlertTests(TestCase):
+    """
+    在庫低下の通知は閾値を下回ったときに1回だけ
+    """
+
+    def setUp(self):
+        lookup.products.clear()
+        lookup.users.clear()
+        self.user = User.objects.create(student_id="s-alert", name="alert")
+        self.product = Product.objects.create(jan_code="4900000000501", name="alert", price=100, alert_threshold=3)
+
+    def buy(self, times=1):
+        for _ in range(times):
+            purchase_one(student_id=self.user.student_id, jan_code=self.product.jan_code)
+
+    def alerts(self):
+        return list(NotificationOutbox.objects.order_by("id").values_list("content", flat=True))
+
+    def is_low(self):
+        return ProductAlertState.objects.get(product=self.product).is_low
+
+    def test_new_product_restocked_below_threshold_does_not_notify(self):
+        # 在庫 0 の新商品は閾値以下として状態行を作る
+        self.assertTrue(self.is_low())
+
+        _restock(self.product, 2)
+
+        self.assertEqual(self.alerts(), [])
+        self.assertTrue(self.is_low())
+
+    def test_downward_crossing_notifies_once(self):
+        _restock(self.product, 5)
+        self.assertFalse(self.is_low())
+
+        self.buy(2)
+
+        self.assertEqual(self.alerts(), ["在庫低下: alert (JAN:4900000000501) 残り 3"])
+        self.assertTrue(self.is_low())
+
+    def test_purchases_while_low_stay_silent(self):
+        _restock(self.product, 4)
+        self.buy(4)
+
+        self.assertEqual(len(self.alerts()), 1)
+        self.assertEqual(_quantity(self.product), 0)
+
+    def test_restock_above_threshold_rearms_alert(self):
+        _restock(self.product, 4)
+        self.buy()
+        _restock(self.product, 6)
+        self.assertFalse(self.is_low())
+
+        self.buy(6)
+
+        self.assertEqual(
+            self.alerts(),
+            ["在庫低下: alert (JAN:4900000000501) 残り 3", "在庫低下: alert (JAN:4900000000501) 残り 3"],
+        )
+
+    def test_raising_threshold_notifies(self):
+        _restock(self.product, 5)
+        Product.objects.filter(pk=self.product.pk).update(alert_threshold=5)
+
+        self.assertEqual(stock_alerts.evaluate({self.product.pk: 0}, thresholds={self.product.pk: 3}), [self.product.pk])
+        self.assertEqual(stock_alerts.evaluate({self.product.pk: 0}), [])
+        self.assertEqual(len(self.alerts()), 1)
+        self.assertTrue(self.is_low())
+
+
+@override_settings(RESTOCK_IMPORT_IN_PROCESS_WORKER=False)
+class ImportJobWorkerTests(TestCase):
+    """
+    ImportJobWorker の取り出し・lease 切れの取り出し直し・試行回数の上限
+    """
+
+    def setUp(self):
+        spool_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(spool_dir.cleanup)
+        self.enterContext(self.settings(RESTOCK_IMPORT_SPOOL_DIR=spool_dir.name))
+        # 進捗スレッドはテストのトランザクション中に書けないので、書く前に止める
+        self.enterContext(mock.patch.object(import_jobs, "PROGRESS_INTERVAL", 60))
+        self.product = Product.objects.create(jan_code="4900000000601", name="import", price=100, alert_threshold=0)
+        self.worker = import_jobs.ImportJobWorker(max_attempts=3)
+
+    def job(self, **fields):
+        job = RestockImportJob.objects.create(**fields)
+        path = import_jobs.spool_path(job.pk)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(f"jan_code,quantity\n{self.product.jan_code},4\n".encode())
+        return job
+
+    def restocked(self):
+        return list(StockTransaction.objects.filter(transaction_type="RESTOCK").values_list("delta", flat=True))
+
+    def test_claims_pending_job(self):
+        job = self.job()
+
+        self.assertTrue(self.worker.process_once())
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result_status, job.attempts), ("DONE", "ok", 1))
+        self.assertEqual(job.result["import"]["created_count"], 1)
+        self.assertEqual(self.restocked(), [4])
+        self.assertFalse(import_jobs.spool_path(job.pk).exists())
+        self.assertFalse(self.worker.process_once())
+
+    def test_running_job_with_live_lease_is_not_claimed(self):
+        self.job(status="RUNNING", attempts=1, lease_until=timezone.now() + timedelta(minutes=5))
+
+        self.assertFalse(self.worker.process_once())
+        self.assertEqual(self.restocked(), [])
+
+    def test_reclaims_job_whose_lease_expired(self):
+        job = self.job(status="RUNNING", attempts=1, lease_until=timezone.now() - timedelta(seconds=1))
+
+        self.assertTrue(self.worker.process_once())
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ("DONE", 2))
+        self.assertEqual(self.restocked(), [4])
+
+    def test_import_is_rolled_back_when_lease_was_lost(self):
+        job = self.job()
+        real_import = import_jobs.import_restock_csv
+
+        def reclaimed_during_import(*args, **kwargs):
+            # 取り込み中に lease が切れ、別のワーカーが取り出し直した
+            RestockImportJob.objects.filter(pk=job.pk).update(attempts=F("attempts") + 1)
+            return real_import(*args, **kwargs)
+
+        with mock.patch.object(import_jobs, "import_restock_csv", reclaimed_during_import), \
+                self.assertLogs("store.services.import_jobs", "WARNING"):
+            self.assertTrue(self.worker.process_once())
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ("RUNNING", 2))
+        self.assertEqual(self.restocked(), [])
+        self.assertFalse(ProductStock.objects.filter(product=self.product, quantity__gt=0).exists())
+        self.assertTrue(import_jobs.spool_path(job.pk).exists())
+
+    def test_gives_up_after_max_attempts(self):
+        job = self.job(status="RUNNING", attempts=3, lease_until=timezone.now() - timedelta(seconds=1))
+
+        self.assertFalse(self.worker.process_once())
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, "FAILED")
+        self.assertIsNotNone(job.finished_at)
+        self.assertEqual(self.restocked(), [])
+        self.assertFalse(import_jobs.spool_path(job.pk).exists())
+
+    def test_failure_is_retried_until_max_attempts(self):
+        job = self.job()
+
+        with mock.patch.object(import_jobs, "import_restock_csv", side_effect=RuntimeError("boom")), \
+                self.assertLogs("store.services.import_jobs", "ERROR"):
+            for expected in ("PENDING", "PENDING", "FAILED"):
+                self.assertTrue(self.worker.process_once())
+                job.refresh_from_db()
+                self.assertEqual(job.status, expected)
+
+        self.assertEqual(job.attempts, 3)
+        self.assertIn("boom", job.last_error)
+        self.assertFalse(import_jobs.spool_path(job.pk).exists())
+
+
+class RestockImportApiTests(TestCase):
+    """
+    POST /api/restocks/import（同期）のステータス・エラー本文・全件か0件か
+    """
+
+    def setUp(self):
+        self.client = Client(HTTP_HOST="localhost")
+        self.apple = Product.objects.create(jan_code="4900000000701", name="apple", price=100, alert_threshold=0)
+        self.melon = Product.objects.create(jan_code="4900000000702", name="melon", price=300, alert_threshold=0)
+
+    def upload(self, lines, query=""):
+        content = "\n".join(lines).encode("utf-8") + b"\n"
+        return self.client.post(
+            f"/api/restocks/import{query}",
+            {"file": SimpleUploadedFile("restock.csv", content, content_type="text/csv")},
+        )
+
+    def assert_nothing_written(self):
+        self.assertFalse(StockTransaction.objects.exists())
+        self.assertFalse(ProductStock.objects.filter(quantity__gt=0).exists())
+
+    def test_bad_header_returns_400(self):
+        response = self.upload(["jan_code,qty", f"{self.apple.jan_code},1"])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"status": "error", "message": "missing columns: quantity"})
+        self.assert_nothing_written()
+
+    def test_row_type_error_returns_400(self):
+        response = self.upload(["jan_code,quantity", f"{self.apple.jan_code},1", f"{self.melon.jan_code},many"])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {
+            "status": "error",
+            "import": {"created_count": 0, "skipped_count": 2},
+            "errors": [{
+                "row": 3,
+                "code": "INVALID_QUANTITY_TYPE",
+                "jan_code": self.melon.jan_code,
+                "field": "quantity",
+                "message": "quantityは整数で指定してください",
+            }],
+        })
+        self.assert_nothing_written()
+
+    def test_row_errors_return_422_and_write_nothing(self):
+        response = self.upload([
+            "jan_code,quantity,unit_cost",
+            f"{self.apple.jan_code},5,80",
+            "4900000000799,2,",
+            f"{self.melon.jan_code},-1,",
+        ])
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(response.json(), {
+            "status": "error",
+            "import": {"created_count": 0, "skipped_count": 3},
+            "errors": [
+                {
+                    "row": 4,
+                    "code": "INVALID_QUANTITY",
+                    "jan_code": self.melon.jan_code,
+                    "field": "quantity",
+                    "message": "quantityは0以上の整数で指定してください",
+                },
+                {
+                    "row": 3,
+                    "code": "UNKNOWN_JAN",
+                    "jan_code": "4900000000799",
+                    "field": "jan_code",
+                    "message": "未登録の商品です。先に商品登録してください",
+                },
+            ],
+        })
+        self.assert_nothing_written()
+
+    def test_file_larger_than_chunk_imports_every_row(self):
+        rows = restock_import.CHUNK_SIZE * 2 + 7
+        lines = ["jan_code,quantity"] + [
+            f"{(self.apple if i % 3 else self.melon).jan_code},1" for i in range(rows)
+        ]
+
+        response = self.upload(lines)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["import"]["created_count"], rows)
+        self.assertEqual(StockTransaction.objects.count(), rows)
+        self.assertEqual(_quantity(self.apple) + _quantity(self.melon), rows)
+        self.assertEqual(_quantity(self.melon), len(range(0, rows, 3)))
+
+    def test_unknown_jan_after_first_chunk_fails_whole_file(self):
+        lines = ["jan_code,quantity"] + [f"{self.apple.jan_code},1"] * restock_import.CHUNK_SIZE + ["4900000000799,1"]
+
+        response = self.upload(lines)
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(
+            [(error["row"], error["code"]) for error in response.json()["errors"]],
+            [(restock_import.CHUNK_SIZE + 2, "UNKNOWN_JAN")],
+        )
+        self.assert_nothing_written()
+
+    def test_dry_run_writes_nothing(self):
+        response = self.upload(
+            ["jan_code,quantity,name", f"{self.apple.jan_code},5,apple", f"{self.melon.jan_code},2,water melon"],
+            query="?dry_run=1",
+        )
+
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body["import"], {"created_count": 0, "skipped_count": 0, "dry_run": True, "valid_count": 2})
+        self.assertEqual([warning["code"] for warning in body["warnings"]], ["NAME_MISMATCH"])
+        self.assert_nothing_written()
+
+    def test_merge_uses_quantity_weighted_unit_cost(self):
+        response = self.upload(
+            [
+                "jan_code,quantity,unit_cost",
+                f"{self.apple.jan_code},2,100",
+                f"{self.melon.jan_code},1,",
+                f"{self.apple.jan_code},3,110",
+                f"{self.apple.jan_code},5,",
+            ],
+            query="?merge=1",
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["import"]["created_count"], 2)
+        self.assertTrue(response.json()["import"]["merged"])
+        # 仕入単価のある 5 個で加重平均: (2*100 + 3*110) / 5 = 106
+        self.assertEqual(
+            dict(StockTransaction.objects.values_list("product_id", "unit_cost")),
+            {self.apple.id: 106, self.melon.id: None},
+        )
+        self.assertEqual((_quantity(self.apple), _quantity(self.melon)), (10, 1))
+
+
+class SalesRollupTests(TestCase):
+    """
+    DailyProductSales は購入・入荷とその取消から作る
+    """
+
+    def setUp(self):
+        lookup.products.clear()
+        lookup.users.clear()
+        self.user = User.objects.create(student_id="s-rollup", name="rollup")
+        self.product = Product.objects.create(jan_code="4900000000801", name="rollup", price=120, alert_threshold=0)
+        self.restock = StockTransaction.objects.create(
+            product=self.product, transaction_type="RESTOCK", delta=10, unit_cost=50,
+        )
+        apply_deltas({self.product.id: 10})
+        self.checkout = checkout(student_id=self.user.student_id, items=[(self.product.jan_code, 3)])
+        purchase_one(student_id=self.user.student_id, jan_code=self.product.jan_code)
+
+    def rollup(self, **kwargs):
+        sales_rollup.update_sales_rollup(now=timezone.now() + timedelta(seconds=1), **kwargs)
+        return {
+            (row.date, row.product_id): (row.units_sold, row.revenue, row.restocked_units, row.restock_cost)
+            for row in DailyProductSales.objects.all()
+        }
+
+    def test_rollup_counts_sales_and_restocks(self):
+        self.assertEqual(self.rollup(), {(timezone.localdate(), self.product.id): (4, 480, 10, 500)})
+
+    def test_amended_purchase_is_subtracted(self):
+        amend_transactions(checkout_id=self.checkout.checkout_id)
+
+        self.assertEqual(self.rollup(), {(timezone.localdate(), self.product.id): (1, 120, 10, 500)})
+
+    def test_amended_purchase_on_a_later_day_counts_on_that_day(self):
+        yesterday = timezone.now() - timedelta(days=1)
+        StockTransaction.objects.update(created_at=yesterday)
+        # 購入後に値上げしても、取消は購入時の単価で差し引く
+        Product.objects.filter(pk=self.product.pk).update(price=200)
+        amend_transactions(checkout_id=self.checkout.checkout_id)
+
+        self.assertEqual(self.rollup(), {
+            (timezone.localdate(yesterday), self.product.id): (4, 480, 10, 500),
+            (timezone.localdate(), self.product.id): (-3, -360, 0, 0),
+        })
+
+    def test_amended_restock_and_plain_correction(self):
+        amend_transactions(ids=[self.restock.id])
+        # 棚卸しの CORRECTION（取消ではない）は売上にも入荷にも入れない
+        StockTransaction.objects.create(product=self.product, transaction_type="CORRECTION", delta=-2)
+
+        self.assertEqual(self.rollup(), {(timezone.localdate(), self.product.id): (4, 480, 0, 0)})
+
+    def test_rerunning_is_idempotent(self):
+        first = self.rollup()
+        self.assertEqual(self.rollup(), first)
+        self.assertEqual(self.rollup(full=True), first)
+        self.assertEqual(DailyProductSales.objects.count(), 1)
+
+
+class BillingStatementTests(TestCase):
+    """
+    GET /api/billing/statements/YYYY-MM は台帳と一致し、締め済みの月の取引が変わったら作り直す
+    """
+
+    def setUp(self):
+        lookup.products.clear()
+        lookup.users.clear()
+        self.client = Client(HTTP_HOST="localhost")
+        # 先々月（月初の CHECKPOINT_LAG の間も締め済み）
+        self.month = (timezone.localdate().replace(day=1) - timedelta(days=32)).replace(day=1)
+        self.in_month = billing.month_range(self.month)[0] + timedelta(days=10)
+        self.alice = User.objects.create(student_id="s-bill-a", name="alice")
+        self.bob = User.objects.create(student_id="s-bill-b", name="bob")
+        self.tea = Product.objects.create(jan_code="4900000000901", name="tea", price=120, alert_threshold=0)
+        self.cake = Product.objects.create(jan_code="4900000000902", name="cake", price=300, alert_threshold=0)
+        _restock(self.tea, 20)
+        _restock(self.cake, 20)
+
+        checkout(student_id=self.alice.student_id, items=[(self.tea.jan_code, 2), (self.cake.jan_code, 1)])
+        purchase_one(student_id=self.bob.student_id, jan_code=self.tea.jan_code)
+        # 値上げ後の購入は別の単価の行になる
+        Product.objects.filter(pk=self.tea.pk).update(price=150)
+        lookup.products.clear()
+        purchase_one(student_id=self.bob.student_id, jan_code=self.tea.jan_code)
+        StockTransaction.objects.update(created_at=self.in_month)
+        # 当月の購入は含めない
+        purchase_one(student_id=self.alice.student_id, jan_code=self.cake.jan_code)
+
+    def statement(self):
+        response = self.client.get(f"/api/billing/statements/{self.month:%Y-%m}")
+        self.assertEqual(response.status_code, 200)
+        rows = list(csv.reader(b"".join(response.streaming_content).decode("utf-8").splitlines()))
+        self.assertEqual(rows[0], billing.CSV_HEADER)
+        return rows[1:]
+
+    def ledger_lines(self):
+        """
+        台帳から (student_id, jan_code, 単価) ごとの数量を数え直す
+        """
+        start, end = billing.month_range(self.month)
+        quantities = {}
+        for tx in StockTransaction.objects.filter(
+            created_at__gte=start, created_at__lt=end, user__isnull=False,
+        ).select_related("user", "product", "amended_of"):
+            original = tx.amended_of or tx
+            if original.transaction_type != "PURCHASE":
+                continue
+            key = (tx.user.student_id, tx.product.jan_code, tx.unit_price)
+            quantities[key] = quantities.get(key, 0) - tx.delta
+        return sorted(
+            [student_id, jan_code, str(price), str(quantity), str(price * quantity)]
+            for (student_id, jan_code, price), quantity in quantities.items()
+            if quantity
+        )
+
+    def assert_matches_ledger(self, rows):
+        lines = sorted([row[0], row[2], row[4], row[5], row[6]] for row in rows if row[3] != "合計")
+        self.assertEqual(lines, self.ledger_lines())
+        totals = {row[0]: int(row[6]) for row in rows if row[3] == "合計"}
+        for student_id, total in totals.items():
+            self.assertEqual(total, sum(int(line[4]) for line in lines if line[0] == student_id))
+
+    def test_statement_matches_ledger_and_is_cached(self):
+        rows = self.statement()
+
+        self.assert_matches_ledger(rows)
+        self.assertEqual(
+            [(row[0], row[3], row[6]) for row in rows if row[3] == "合計"],
+            [("s-bill-a", "合計", "540"), ("s-bill-b", "合計", "270")],
+        )
+        self.assertTrue(MonthlyStatement.objects.filter(month=self.month).exists())
+        self.assertEqual(self.statement(), rows)
+
+    def test_amendment_dated_in_closed_month_recomputes_statement(self):
+        self.statement()
+        amendment = StockTransaction.objects.create(
+            product=self.tea, user=self.bob, transaction_type="CORRECTION", delta=1, unit_price=150,
+            amended_of=StockTransaction.objects.get(user=self.bob, unit_price=150),
+        )
+        amendment.created_at = self.in_month
+        amendment.save()
+
+        self.assertFalse(MonthlyStatement.objects.filter(month=self.month).exists())
+        rows = self.statement()
+        self.assert_matches_ledger(rows)
+        self.assertNotIn("150", [row[4] for row in rows])
+
+    def test_deleting_closed_month_purchase_recomputes_statement(self):
+        self.statement()
+
+        StockTransaction.objects.get(user=self.alice, product=self.cake, created_at=self.in_month).delete()
+
+        rows = self.statement()
+        self.assert_matches_ledger(rows)
+        self.assertNotIn(self.cake.jan_code, [row[2] for row in rows])
+
+    def test_current_month_is_not_cached(self):
+        response = self.client.get(f"/api/billing/statements/{timezone.localdate():%Y-%m}")
+
+        self.assertIn(self.cake.jan_code.encode(), b"".join(response.streaming_content))
+        self.assertFalse(MonthlyStatement.objects.exists())
+
+
+class CheckoutTests(TestCase):
+    """
+    POST /api/checkouts は全商品を買えるときだけ書き込む
+    """
+
+    def setUp(self):
+        lookup.products.clear()
+        lookup.users.clear()
+        self.client = Client(HTTP_HOST="localhost")
+        self.user = User.objects.create(student_id="s-checkout", name="checkout")
+        self.tea = Product.objects.create(jan_code="4900000001001", name="tea", price=120, alert_threshold=0)
+        self.cake = Product.objects.create(jan_code="4900000001002", name="cake", price=300, alert_threshold=0)
+        _restock(self.tea, 5)
+        _restock(self.cake, 1)
+
+    def checkout(self, *items, student_id=None):
+        return self.client.post(
+            "/api/checkouts",
+            {
+                "student_id": student_id or self.user.student_id,
+                "items": [{"jan_code": jan_code, "qty": qty} for jan_code, qty in items],
+            },
+            content_type="application/json",
+        )
+
+    def purchases(self):
+        purchases = StockTransaction.objects.filter(transaction_type="PURCHASE").order_by("id")
+        return list(purchases.values_list("product_id", "delta"))
+
+    def assert_nothing_bought(self):
+        self.assertEqual(self.purchases(), [])
+        self.assertEqual((_quantity(self.tea), _quantity(self.cake)), (5, 1))
+
+    def test_duplicate_jan_codes_are_merged(self):
+        response = self.checkout((self.tea.jan_code, 1), (self.cake.jan_code, 1), (self.tea.jan_code, 2))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(line["jan_code"], line["qty"], line["remaining"]) for line in response.json()["lines"]],
+            [(self.tea.jan_code, 3, 2), (self.cake.jan_code, 1, 0)],
+        )
+        self.assertEqual(self.purchases(), [(self.tea.id, -3), (self.cake.id, -1)])
+        self.assertEqual(
+            set(StockTransaction.objects.filter(transaction_type="PURCHASE").values_list("checkout_id", flat=True)),
+            {uuid.UUID(response.json()["checkout_id"])},
+        )
+
+    def test_unknown_jan_code_fails_whole_checkout(self):
+        response = self.checkout((self.tea.jan_code, 1), ("4900000001099", 1))
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json(), {"error": "product_not_found", "jan_code": "4900000001099"})
+        self.assert_nothing_bought()
+
+    def test_one_line_out_of_stock_rolls_back_whole_checkout(self):
+        # 合算すると在庫を超える
+        response = self.checkout((self.tea.jan_code, 2), (self.cake.jan_code, 1), (self.cake.jan_code, 1))
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json(), {"error": "out_of_stock", "jan_code": self.cake.jan_code})
+        self.assert_nothing_bought()
+
+    def test_never_restocked_product_is_out_of_stock(self):
+        fresh = Product.objects.create(jan_code="4900000001003", name="fresh", price=100, alert_threshold=0)
+
+        response = self.checkout((self.tea.jan_code, 1), (fresh.jan_code, 1))
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json(), {"error": "out_of_stock", "jan_code": fresh.jan_code})
+        self.assert_nothing_bought()
+
+    def test_unknown_user_returns_404(self):
+        response = self.checkout((self.tea.jan_code, 1), student_id="s-nobody")
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json(), {"error": "user_not_found"})
+        self.assert_nothing_bought()
+
+
+class CatalogCacheTests(TestCase):
+    """
+    GET /api/products の ETag（一覧の内容のハッシュ）と 304
+    """
+
+    def setUp(self):
+        lookup.products.clear()
+        lookup.users.clear()
+        catalog.invalidate()
+        self.addCleanup(catalog.invalidate)
+        self.client = Client(HTTP_HOST="localhost")
+        self.user = User.objects.create(student_id="s-catalog", name="catalog")
+        self.product = Product.objects.create(jan_code="4900000001101", name="catalog", price=100, alert_threshold=0)
+        with self.captureOnCommitCallbacks(execute=True):
+            _restock(self.product, 5)
+
+    def get(self, path="/api/products", etag=None):
+        headers = {"HTTP_IF_NONE_MATCH": etag} if etag else {}
+        return self.client.get(path, **headers)
+
+    def test_unchanged_catalog_returns_304(self):
+        first = self.get()
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(json.loads(first.content)[0]["stock"], 5)
+
+        response = self.get(etag=first["ETag"])
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], first["ETag"])
+        self.assertEqual(response.content, b"")
+        self.assertEqual(self.get(f"/api/products/{self.product.jan_code}", etag=first["ETag"]).status_code, 304)
+
+    def test_purchase_changes_etag(self):
+        etag = self.get()["ETag"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            purchase_one(student_id=self.user.student_id, jan_code=self.product.jan_code)
+        response = self.get(etag=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(json.loads(response.content)[0]["stock"], 4)
+        self.assertEqual(self.get(etag=response["ETag"]).status_code, 304)
+
+    def test_rebuild_with_same_content_keeps_etag(self):
+        etag = self.get()["ETag"]
+
+        catalog.invalidate()
+
+        self.assertEqual(self.get(etag=etag).status_code, 304)
+
+    def test_change_from_another_process_shows_up_after_ttl(self):
+        etag = self.get()["ETag"]
+        # シグナルの届かない書き込み（別プロセスでの変更）
+        ProductStock.objects.filter(product=self.product).update(quantity=2)
+
+        self.assertEqual(self.get(etag=etag).status_code, 304)
+        with self.settings(CATALOG_CACHE_TTL=0):
+            response = self.get(etag=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)[0]["stock"], 2)
+
+
+class TransactionKeysetTests(TestCase):
+    """
+    GET /api/transactions のキーセットページネーション（created_at が同時刻の行）
+    """
+
+    def setUp(self):
+        self.client = Client(HTTP_HOST="localhost")
+        product = Product.objects.create(jan_code="4900000001201", name="keyset", price=100)
+        base = timezone.now().replace(microsecond=123456) - timedelta(hours=1)
+        # 前後に1件ずつ、間に同時刻の5件（ページ境界をまたぐ）
+        times = [base + timedelta(seconds=1)] + [base] * 5 + [base - timedelta(seconds=1)]
+        for created_at in times:
+            tx = _restock(product, 1)
+            StockTransaction.objects.filter(pk=tx.pk).update(created_at=created_at)
+        self.expected = list(
+            StockTransaction.objects.order_by("-created_at", "-id").values_list("id", flat=True)
+        )
+
+    def walk(self, page_size):
+        ids = []
+        url = f"/api/transactions?page_size={page_size}"
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            body = json.loads(response.content)
+            ids += [row["id"] for row in body["results"]]
+            url = body["next"]
+        return ids
+
+    def test_tied_timestamps_are_neither_skipped_nor_duplicated(self):
+        self.assertEqual(len(self.expected), 7)
+        for page_size in (1, 2, 3, 4, 7):
+            with self.subTest(page_size=page_size):
+                self.assertEqual(self.walk(page_size), self.expected)
+
+
+class DeletedUserPurchaseTests(TransactionTestCase):
+    """
+    別プロセスで削除された利用者（lookup キャッシュに残っている）での購入。
+    外部キー違反はコミット時に出るので TransactionTestCase で確かめる
+    """
+
+    def setUp(self):
+        lookup.products.clear()
+        lookup.users.clear()
+        self.client = Client(HTTP_HOST="localhost")
+        self.user = User.objects.create(student_id="s-deleted", name="deleted")
+        self.product = Product.objects.create(jan_code="4900000001301", name="deleted", price=100, alert_threshold=0)
+        _restock(self.product, 5)
+        self.assertEqual(lookup.user_id(self.user.student_id), self.user.pk)
+        # シグナルの届かない削除（別プロセス）の代わりに、削除後にキャッシュを戻す
+        user_id = self.user.pk
+        self.user.delete()
+        lookup.users.set(self.user.student_id, user_id)
+
+    def test_purchase_returns_404_and_writes_nothing(self):
+        response = self.client.post(
+            "/api/purchases",
+            {"student_id": self.user.student_id, "jan_code": self.product.jan_code},
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json()["error"], "user_not_found")
+        self.assertEqual(_quantity(self.product), 5)
+        self.assertFalse(StockTransaction.objects.filter(transaction_type="PURCHASE").exists())
+        self.assertIsNone(lookup.users.get(self.user.student_id))
+
+    def test_checkout_returns_404_and_writes_nothing(self):
+        response = self.client.post(
+            "/api/checkouts",
+            {"student_id": self.user.student_id, "items": [{"jan_code": self.product.jan_code, "qty": 2}]},
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json()["error"], "user_not_found")
+        self.assertEqual(_quantity(self.product), 5)
+        self.assertFalse(StockTransaction.objects.filter(transaction_type="PURCHASE").exists())
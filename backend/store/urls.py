@@ -1,22 +1,57 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
+from store.api.async_views import (
+    product_catalog,
+    product_detail,
+    stock_detail,
+    stock_list,
+    stock_stream,
+    transaction_list,
+)
 from store.api.views import (
+    billing_statement,
+    cache_stats,
     csrf,
+    CheckoutView,
+    ProductImportView,
     ProductRegisterView,
+    prometheus_metrics,
+    PurchaseReplayView,
     PurchaseView,
+    restock_import_job,
     RestockImportView,
+    SalesStatsView,
+    StocktakeView,
     StockTransactionViewSet,
+    transaction_export,
 )
 
 router = DefaultRouter(trailing_slash=False)
 router.register(r"transactions", StockTransactionViewSet, basename="transaction")
 
 urlpatterns = [
+    # router の transactions/<pk> より先に置く
+    path("transactions", transaction_list, name="transaction-list"),
+    path("transactions/export", transaction_export, name="transaction_export"),
     path("", include(router.urls)),
     path("csrf", csrf, name="csrf"),
     path("purchases", PurchaseView.as_view(), name="purchases"),
+    path("purchases/batch-replay", PurchaseReplayView.as_view(), name="purchase_batch_replay"),
+    path("checkouts", CheckoutView.as_view(), name="checkouts"),
+    path("products", product_catalog, name="products"),
     path("products/register", ProductRegisterView.as_view(), name="product_register"),
+    path("products/import", ProductImportView.as_view(), name="product_import"),
+    path("products/<str:jan_code>", product_detail, name="product_detail"),
+    path("stock", stock_list, name="stock"),
+    path("stock/<str:jan_code>", stock_detail, name="stock_detail"),
+    path("stream/stock", stock_stream, name="stock_stream"),
+    path("stocktakes", StocktakeView.as_view(), name="stocktakes"),
     path("restocks/import", RestockImportView.as_view(), name="restock_import"),
+    path("restocks/import/jobs/<uuid:job_id>", restock_import_job, name="restock_import_job"),
+    path("stats/sales", SalesStatsView.as_view(), name="sales_stats"),
+    path("stats/cache", cache_stats, name="cache_stats"),
+    path("metrics", prometheus_metrics, name="metrics"),
+    path("billing/statements/<str:month>", billing_statement, name="billing_statement"),
 
 ]